@@ -0,0 +1,937 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ConvertCN 性能基准测试
+用法: python benchmark.py            运行全部测试
+      python benchmark.py startup    只运行指定的测试
+"""
+
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_SCRIPT = os.path.join(SCRIPT_DIR, "encoding_gui_4.py")
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """注册基准测试，测试函数返回报告行列表"""
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+def run_app(*args):
+    """运行主程序并返回 (退出码, 标准输出, 标准错误)"""
+    result = subprocess.run([sys.executable, APP_SCRIPT, *args], cwd=SCRIPT_DIR,
+                            capture_output=True, text=True, encoding='utf-8')
+    return result.returncode, result.stdout, result.stderr
+
+
+@benchmark("startup")
+def bench_startup(runs=5):
+    """启动耗时：模块导入时间与首个窗口显示时间"""
+    lines = []
+
+    # 模块导入耗时
+    import_times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import encoding_gui_4"], cwd=SCRIPT_DIR, check=True)
+        import_times.append(time.perf_counter() - start)
+    lines.append(f"解释器启动 + 模块导入: {statistics.median(import_times) * 1000:.1f} ms (中位数, {runs} 次)")
+
+    # 首个窗口显示耗时（需要图形界面）
+    window_times = []
+    for _ in range(runs):
+        code, stdout, stderr = run_app("--startup-time")
+        match = re.search(r"首个窗口显示耗时: ([\d.]+) ms \(模块导入 ([\d.]+) ms\)", stdout)
+        if code != 0 or not match:
+            lines.append("首个窗口显示耗时: 跳过 (无法创建窗口: "
+                         f"{stderr.strip().splitlines()[-1] if stderr.strip() else '未知错误'})")
+            return lines
+        window_times.append(float(match.group(1)))
+    lines.append(f"首个窗口显示耗时: {statistics.median(window_times):.1f} ms (中位数, {runs} 次)")
+    return lines
+
+
+def make_corpus(chars):
+    """生成包含多种换行和分隔符的简体中文测试文本"""
+    import random
+    rng = random.Random(2025)
+    sample = ("计算机软件的发展非常迅速，简体中文转换为繁体中文时需要处理词组，"
+              "例如头发、发展、干燥、干部、后来、皇后、里面、公里。")
+    separators = ["\n", "\r\n", " ", "。", "-", "abc ", "", ""]
+    parts = []
+    size = 0
+    while size < chars:
+        part = sample[rng.randrange(len(sample) // 2):] + rng.choice(separators)
+        parts.append(part)
+        size += len(part)
+    return "".join(parts)
+
+
+@benchmark("parallel-convert")
+def bench_parallel_convert(chars=2000000):
+    """大文件分块并行简繁转换：与串行结果逐字节比较并统计耗时"""
+    sys.path.insert(0, SCRIPT_DIR)
+    import encoding_gui_4 as app
+    try:
+        import opencc
+    except ImportError:
+        return ["跳过 (未安装 opencc-python-reimplemented)"]
+
+    text = make_corpus(chars)
+    lines = [f"测试文本: {len(text)} 个字符, CPU 数: {os.cpu_count()}"]
+    for config in ("s2t", "t2s"):
+        converter = opencc.OpenCC(config)
+        start = time.perf_counter()
+        serial = converter.convert(text)
+        serial_time = time.perf_counter() - start
+
+        # 强制使用进程池（即使只有一个 CPU），验证分块拼接结果
+        parallel = app.ParallelConverter(max_workers=max(2, os.cpu_count() or 1), min_chars=0,
+                                         chunk_chars=app.PARALLEL_CONVERT_CHUNK_CHARS // 4)
+        try:
+            start = time.perf_counter()
+            result = parallel.convert("opencc", config, text, converter)
+            parallel_time = time.perf_counter() - start
+        finally:
+            parallel.shutdown()
+
+        if result.encode("utf-8") != serial.encode("utf-8"):
+            raise AssertionError(f"{config}: 并行转换结果与串行结果不一致")
+        lines.append(f"{config}: 串行 {serial_time:.2f} s, 并行 {parallel_time:.2f} s "
+                     f"(加速 {serial_time / parallel_time:.2f}x), 结果一致")
+    return lines
+
+
+def make_dictionary_corpus(app, config, count=60000):
+    """用词典词条、词条片段和转换结果拼成的测试文本，覆盖词条重叠和最长匹配的各种情况"""
+    import random
+    rng = random.Random(2025)
+    package_dir = os.path.dirname(sys.modules["opencc"].__file__)
+    keys, values = [], []
+    with open(os.path.join(package_dir, "config", config + ".json"), "r", encoding="utf-8") as f:
+        setting = json.load(f)
+    for item in setting["conversion_chain"]:
+        entries = item["dict"]["dicts"] if item["dict"].get("type") == "group" else [item["dict"]]
+        for entry in entries:
+            mapping = app.read_opencc_dictionary(os.path.join(package_dir, "dictionary", entry["file"]))
+            keys.extend(mapping)
+            values.extend(mapping.values())
+    separators = ["\n", "\r\n", "，", " ", "-", "abc", "x1"]
+    parts = []
+    for _ in range(count):
+        choice = rng.random()
+        key = rng.choice(keys)
+        if choice < 0.5:
+            parts.append(key)
+        elif choice < 0.7:
+            parts.append(key[rng.randrange(len(key)):])
+        elif choice < 0.85:
+            parts.append(rng.choice(values))
+        else:
+            parts.append(rng.choice(separators))
+    return "".join(parts)
+
+
+@benchmark("trie-convert")
+def bench_trie_convert(chars=1000000):
+    """内置 Trie 简繁转换引擎与 OpenCC 的结果比较及速度 (MB/s)"""
+    sys.path.insert(0, SCRIPT_DIR)
+    import encoding_gui_4 as app
+    try:
+        import opencc
+    except ImportError:
+        return ["跳过 (未安装 opencc-python-reimplemented)"]
+
+    lines = []
+    for config in ("s2t", "t2s"):
+        start = time.perf_counter()
+        app.TrieConverter(config)
+        lines.append(f"{config}: 加载词典 {(time.perf_counter() - start) * 1000:.1f} ms (缓存不存在时包括编译)")
+
+        corpora = {"普通文本": make_corpus(chars), "词典词条": make_dictionary_corpus(app, config)}
+        backends = {"OpenCC": opencc.OpenCC(config), "内置Trie": app.TrieConverter(config)}
+        for corpus_name, text in corpora.items():
+            megabytes = len(text.encode("utf-8")) / 1024 / 1024
+            results = {}
+            speeds = []
+            for backend_name, converter in backends.items():
+                start = time.perf_counter()
+                results[backend_name] = converter.convert(text)
+                elapsed = time.perf_counter() - start
+                speeds.append(f"{backend_name} {megabytes / elapsed:.2f} MB/s")
+            if len(set(results.values())) != 1:
+                raise AssertionError(f"{config} {corpus_name}: 内置Trie 与 OpenCC 的转换结果不一致")
+            lines.append(f"{config} {corpus_name} ({megabytes:.1f} MB): {', '.join(speeds)}, 结果一致")
+    return lines
+
+
+
+@benchmark("transcode")
+def bench_transcode(megabytes=64):
+    """不需要简繁转换时的转码：整文件文本模式读写与流式转码的速度 (MB/s)"""
+    import tempfile
+    sys.path.insert(0, SCRIPT_DIR)
+    import encoding_gui_4 as app
+
+    lines = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        source = os.path.join(temp_dir, "source.txt")
+        line = "计算机软件的发展非常迅速，mixed ASCII text 123。\r\n".encode("gbk")
+        with open(source, "wb") as f:
+            f.write(line * (megabytes * 1024 * 1024 // len(line)))
+        size = os.path.getsize(source) / 1024 / 1024
+
+        outputs = {name: os.path.join(temp_dir, name + ".txt") for name in ("text", "stream")}
+        start = time.perf_counter()
+        with open(source, "r", encoding="gbk", newline="") as f:
+            content = f.read()
+        with open(outputs["text"], "w", encoding="utf-8", newline="") as f:
+            f.write(content)
+        del content
+        text_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        app.transcode_file(source, outputs["stream"], "gbk", "utf-8")
+        stream_time = time.perf_counter() - start
+
+        with open(outputs["text"], "rb") as f1, open(outputs["stream"], "rb") as f2:
+            if f1.read() != f2.read():
+                raise AssertionError("流式转码结果与整文件读写结果不一致")
+        lines.append(f"gbk→utf-8 ({size:.0f} MB): 整文件读写 {size / text_time:.1f} MB/s, "
+                     f"流式转码 {size / stream_time:.1f} MB/s, 结果一致")
+    return lines
+
+
+class LatencyFile:
+    """模拟网络文件系统上的文件：每次 read 调用多一次往返延迟"""
+
+    def __init__(self, path, latency):
+        self.latency = latency
+        time.sleep(latency)  # open 的往返
+        self.f = open(path, "rb")
+
+    def read(self, size=-1):
+        time.sleep(self.latency)
+        return self.f.read(size)
+
+    read1 = read
+
+    def __getattr__(self, name):
+        return getattr(self.f, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.f.close()
+
+
+@benchmark("scan-read")
+def bench_scan_read(files=200, latencies=(0.0, 0.002, 0.01)):
+    """高延迟文件系统上扫描读取的吞吐量：串行读取与并发读取调度的比较"""
+    import random
+    import tempfile
+    sys.path.insert(0, SCRIPT_DIR)
+    import encoding_gui_4 as app
+
+    rng = random.Random(2025)
+    lines = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = []
+        for i in range(files):
+            path = os.path.join(temp_dir, f"{i}.txt")
+            with open(path, "wb") as f:
+                f.write("计算机软件的发展。\n".encode("gbk") * rng.randrange(100, 20000))
+            paths.append(path)
+        total_mb = sum(os.path.getsize(path) for path in paths) / 1024 / 1024
+        expected = [open(path, "rb").read() for path in paths]
+        lines.append(f"测试文件: {files} 个, {total_mb:.1f} MB")
+
+        for latency in latencies:
+            def opener(path, mode, latency=latency):
+                return LatencyFile(path, latency)
+
+            results = []
+            # 串行、并发但固定 64 KB 读取、并发且自适应读取大小
+            variants = (("并发 1", 1, app.SCAN_READ_MAX),
+                        (f"并发 {app.SCAN_READ_CONCURRENCY} 固定 64KB", app.SCAN_READ_CONCURRENCY, app.SCAN_READ_MIN),
+                        (f"并发 {app.SCAN_READ_CONCURRENCY}", app.SCAN_READ_CONCURRENCY, app.SCAN_READ_MAX))
+            for name, concurrency, max_read in variants:
+                scheduler = app.ReadScheduler(concurrency, opener=opener, max_read=max_read)
+                start = time.perf_counter()
+                data = list(scheduler.map(scheduler.read_file, paths))
+                elapsed = time.perf_counter() - start
+                if data != expected:
+                    raise AssertionError("并发读取结果与直接读取不一致")
+                results.append(f"{name}: {files / elapsed:.0f} 文件/s ({total_mb / elapsed:.1f} MB/s)")
+            lines.append(f"延迟 {latency * 1000:.0f} ms: {', '.join(results)}, 结果一致")
+    return lines
+
+
+@benchmark("detect-memory")
+def bench_detect_memory(megabytes=32):
+    """大文件编码检测的 Python 堆内存峰值与耗时：整文件读入后逐个解码与内存映射共享缓冲区的比较"""
+    import tempfile
+    import tracemalloc
+    import chardet
+    sys.path.insert(0, SCRIPT_DIR)
+    import encoding_gui_4 as app
+
+    def read_and_decode(path):
+        # 原来的方式：读入整个文件，每个候选编码解码出整个字符串
+        with open(path, "rb") as f:
+            raw_data = f.read()
+        chardet.detect(raw_data)
+        for encoding in app.TEST_ENCODINGS:
+            try:
+                raw_data.decode(encoding)
+            except UnicodeDecodeError:
+                pass
+
+    gui = app.EncodingUnifierGUI.__new__(app.EncodingUnifierGUI)
+    gui.input_archive = None
+    lines = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "large.txt")
+        line = "计算机软件的发展非常迅速，mixed ASCII text 123。\n".encode("gbk")
+        with open(path, "wb") as f:
+            f.write(line * (megabytes * 1024 * 1024 // len(line)))
+
+        for name, func in (("整文件读入", read_and_decode), ("内存映射", gui.detect_file_encoding)):
+            tracemalloc.start()
+            start = time.perf_counter()
+            func(path)
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            lines.append(f"{name} ({megabytes} MB gbk): 堆内存峰值 {peak / 1024 / 1024:.1f} MB, 耗时 {elapsed:.2f} s")
+    return lines
+
+
+def reference_detect(raw_data, encodings):
+    """逐块优化之前的检测方式：chardet.detect 整个文件，再用每个候选编码解码整个文件并评分"""
+    import chardet
+    chardet.detect(raw_data)
+    best_score, best_encoding, has_chinese = -1, "unknown", False
+    for encoding in encodings:
+        try:
+            content = raw_data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+        chinese = any("\u4e00" <= char <= "\u9fff" for char in content)
+        mojibake = any(char in content for char in ["锟", "烫", "屯", "�"])
+        score = (0 if mojibake else 10) + (5 if chinese else 0)
+        has_chinese = has_chinese or chinese
+        if score > best_score:
+            best_score, best_encoding = score, encoding
+    return best_encoding, has_chinese
+
+
+@benchmark("detect-utf8")
+def bench_detect_utf8(megabytes=32):
+    """大的 UTF-8 文件：chardet 逐块检测提前结束、跳过不可能胜出的候选编码前后的检测耗时"""
+    import tempfile
+    sys.path.insert(0, SCRIPT_DIR)
+    import encoding_gui_4 as app
+
+    gui = app.EncodingUnifierGUI.__new__(app.EncodingUnifierGUI)
+    gui.input_archive = None
+    lines = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "utf8.txt")
+        line = "计算机软件的发展非常迅速，mixed ASCII text 123。\n".encode("utf-8")
+        with open(path, "wb") as f:
+            f.write(line * (megabytes * 1024 * 1024 // len(line)))
+
+        with open(path, "rb") as f:
+            raw_data = f.read()
+        start = time.perf_counter()
+        expected = reference_detect(raw_data, app.TEST_ENCODINGS)
+        reference_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = gui.detect_file_encoding(path)
+        elapsed = time.perf_counter() - start
+        if (result["best_encoding"], result["has_chinese"]) != expected:
+            raise AssertionError("逐块检测的推荐编码与原来的检测方式不一致")
+        lines.append(f"{megabytes} MB UTF-8: 原检测 {reference_time:.2f} s, 逐块检测 {elapsed:.3f} s "
+                     f"(加速 {reference_time / elapsed:.0f}x), 结果一致")
+        lines.append(f"chardet 检查 {result['chardet_bytes'] / 1024:.0f} KB / {len(raw_data) / 1024 / 1024:.0f} MB, "
+                     f"试解码 {len(result['encodings_test'])} / {len(app.TEST_ENCODINGS)} 个编码")
+    return lines
+
+
+def make_directory_corpus(files_per_dir=60):
+    """按目录分组的测试语料：每个目录以一种编码为主，混有少量其他编码和纯 ASCII 文件"""
+    import random
+    rng = random.Random(2025)
+    simplified = "计算机软件的发展非常迅速，简体中文转换为繁体中文时需要处理词组。\n"
+    traditional = "計算機軟體的發展非常迅速，繁體中文轉換時需要處理詞組。\n"
+    directories = {"drivers": ("gbk", simplified), "docs/tw": ("big5", traditional),
+                   "src": ("utf-8", simplified), "legacy": ("gb18030", simplified)}
+    corpus = []
+    for directory, (encoding, text) in directories.items():
+        for i in range(files_per_dir):
+            choice = rng.random()
+            if choice < 0.1:
+                data = b"plain ascii line\n" * rng.randrange(1, 50)
+            elif choice < 0.15:
+                data = (simplified * rng.randrange(1, 50)).encode("utf-8")  # 与目录编码冲突的文件
+            else:
+                data = (text * rng.randrange(1, 50)).encode(encoding)
+            corpus.append((f"/corpus/{directory}/{i}.txt", data))
+    return corpus
+
+
+@benchmark("detect-priors")
+def bench_detect_priors():
+    """目录编码先验：检测结果与不使用先验时一致，每个文件的试解码次数减少"""
+    sys.path.insert(0, SCRIPT_DIR)
+    import encoding_gui_4 as app
+
+    gui = app.EncodingUnifierGUI.__new__(app.EncodingUnifierGUI)
+    corpus = make_directory_corpus()
+    app.detect_chardet(corpus[0][1])  # 预先导入 chardet，不计入耗时
+    runs = {}
+    for name, priors in (("不使用先验", None), ("目录先验", app.EncodingPriors())):
+        results, attempts = [], 0
+        start = time.perf_counter()
+        for path, data in corpus:
+            result = {"encodings_test": {}, "has_chinese": False}
+            gui.detect_text_encoding(data, result, priors, os.path.dirname(path))
+            results.append((result["best_encoding"], result["has_chinese"], result.get("chardet_encoding")))
+            if app.NON_ASCII_PATTERN.search(data):
+                attempts += len(result["encodings_test"])
+        runs[name] = (results, attempts, time.perf_counter() - start)
+
+    baseline = runs["不使用先验"][0]
+    if runs["目录先验"][0] != baseline:
+        raise AssertionError("使用目录先验后的检测结果与完整检测不一致")
+    non_ascii = sum(1 for path, data in corpus if app.NON_ASCII_PATTERN.search(data))
+    lines = [f"测试文件: {len(corpus)} 个 ({non_ascii} 个含非 ASCII 内容), 结果一致"]
+    for name, (results, attempts, elapsed) in runs.items():
+        lines.append(f"{name}: 平均每个文件试解码 {attempts / non_ascii:.2f} 次, 耗时 {elapsed * 1000:.0f} ms")
+    return lines
+
+
+def read_tree(root):
+    """读取目录下所有文件的内容，返回 相对路径 -> 内容"""
+    contents = {}
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            with open(path, "rb") as f:
+                contents[os.path.relpath(path, root)] = f.read()
+    return contents
+
+
+@benchmark("dedup")
+def bench_dedup(unique=40, copies=10):
+    """内容去重：大量重复文件时扫描和转换的耗时，输出与不去重时一致"""
+    import random
+    import tempfile
+    sys.path.insert(0, SCRIPT_DIR)
+    import encoding_gui_4 as app
+
+    rng = random.Random(43)
+    lines = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_dir = os.path.join(temp_dir, "in")
+        contents = [(f"第 {i} 份\n" + "计算机软件的发展。\n" * rng.randrange(2000, 20000)).encode(
+            rng.choice(("gbk", "utf-8"))) for i in range(unique)]
+        for copy in range(copies):
+            os.makedirs(os.path.join(input_dir, f"copy{copy}"))
+            for i, data in enumerate(contents):
+                with open(os.path.join(input_dir, f"copy{copy}", f"{i}.txt"), "wb") as f:
+                    f.write(data)
+        total_mb = sum(map(len, contents)) * copies / 1024 / 1024
+        lines.append(f"测试文件: {unique * copies} 个 ({unique} 种内容), {total_mb:.1f} MB")
+        app.detect_chardet(contents[0])  # 预先导入 chardet，不计入耗时
+
+        outputs = {}
+        for name, dedup in (("不去重", False), ("内容去重", True)):
+            output_dir = os.path.join(temp_dir, name)
+            gui = app.BatchSession(input_dir, output_dir, ".txt", "UTF-8(无BOM)", dedup=dedup)
+            start = time.perf_counter()
+            gui._scan_files_thread({".txt"})
+            scanned = time.perf_counter()
+            gui._process_files_thread()
+            done = time.perf_counter()
+            outputs[name] = read_tree(output_dir)
+            detail = ""
+            if dedup:
+                stats = gui.dedup_stats
+                detail = (f", 唯一内容 {stats['unique_bytes'] / 1024 / 1024:.1f} MB, "
+                          f"链接 {dict(gui.dedup_links)}")
+            lines.append(f"{name}: 扫描 {(scanned - start) * 1000:.0f} ms, "
+                         f"转换 {(done - scanned) * 1000:.0f} ms{detail}")
+        if outputs["不去重"] != outputs["内容去重"] or len(outputs["不去重"]) != unique * copies:
+            raise AssertionError("去重后的输出与不去重时不一致")
+        lines.append("输出一致")
+    return lines
+
+
+@benchmark("shard")
+def bench_shard(dirs=40, files_per_dir=25, shards=4):
+    """分片执行：各分片的文件数和耗时是否均衡，合并后的统计与不分片时一致"""
+    import random
+    import tempfile
+    sys.path.insert(0, SCRIPT_DIR)
+    import encoding_gui_4 as app
+
+    rng = random.Random(44)
+    lines = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_dir = os.path.join(temp_dir, "in")
+        for d in range(dirs):
+            os.makedirs(os.path.join(input_dir, f"dir{d}"))
+            for i in range(files_per_dir):
+                text = f"第 {d}-{i} 份\n" + "计算机软件的发展。\n" * rng.randrange(10, 500)
+                with open(os.path.join(input_dir, f"dir{d}", f"{i}.txt"), "wb") as f:
+                    f.write(text.encode(rng.choice(("gbk", "utf-8"))))
+        lines.append(f"测试文件: {dirs * files_per_dir} 个, {dirs} 个目录, {shards} 个分片")
+
+        output_dir = os.path.join(temp_dir, "out")
+        session = app.BatchSession(input_dir, output_dir, ".txt", dedup=False)
+        start = time.perf_counter()
+        scan, process = session.run()
+        single = time.perf_counter() - start
+        # 处理统计中的用时和并行效率每次运行都不同，只比较文件计数
+        expected = app.format_scan_summary(scan), process["counts"], process["normalize"]
+        expected_output = read_tree(output_dir)
+
+        for by in app.SHARD_MODES:
+            report_dir = os.path.join(temp_dir, f"reports-{by}")
+            output_dir = os.path.join(temp_dir, f"out-{by}")
+            sizes, times = [], []
+            for index in range(1, shards + 1):
+                session = app.BatchSession(input_dir, output_dir, ".txt", dedup=False,
+                                           shard=app.Shard(index, shards, by))
+                start = time.perf_counter()
+                session.run()
+                times.append(time.perf_counter() - start)
+                sizes.append(len(session.encoding_results))
+                session.write_report(report_dir)
+            scan, process = app.merge_shard_reports(report_dir)
+            merged = (app.format_scan_summary(scan).replace(output_dir, os.path.join(temp_dir, "out")),
+                      dict(process["counts"]), dict(process["normalize"]))
+            if merged != expected:
+                raise AssertionError("合并后的统计与不分片时不一致")
+            if read_tree(output_dir) != expected_output:
+                raise AssertionError("分片处理的输出与不分片时不一致")
+            lines.append(f"{app.SHARD_MODES[by]}: 各分片文件数 {sizes}, 最慢分片 {max(times) * 1000:.0f} ms "
+                         f"(不分片 {single * 1000:.0f} ms, 并行时加速 {single / max(times):.1f}x), 统计和输出一致")
+    return lines
+
+
+@benchmark("plan")
+def bench_plan(dirs=40, files_per_dir=50):
+    """扫描计划：保存和加载计划与重新扫描的耗时，计划大小，按计划处理的输出与扫描后处理一致"""
+    import random
+    import tempfile
+    sys.path.insert(0, SCRIPT_DIR)
+    import encoding_gui_4 as app
+
+    rng = random.Random(45)
+    lines = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_dir = os.path.join(temp_dir, "in")
+        for d in range(dirs):
+            os.makedirs(os.path.join(input_dir, f"dir{d}"))
+            for i in range(files_per_dir):
+                text = f"第 {d}-{i} 份\n" + "计算机软件的发展。\n" * rng.randrange(10, 200)
+                with open(os.path.join(input_dir, f"dir{d}", f"{i}.txt"), "wb") as f:
+                    f.write(text.encode(rng.choice(("gbk", "utf-8"))))
+        plan_path = os.path.join(temp_dir, "scan" + app.PLAN_EXTENSION)
+
+        session = app.BatchSession(input_dir, os.path.join(temp_dir, "scanned"), ".txt")
+        start = time.perf_counter()
+        session.run(scan_only=True)
+        scanned = time.perf_counter()
+        app.write_jsonl(plan_path, session.plan_header(), session.plan_records())
+        saved = time.perf_counter()
+        session._process_files_thread()
+        expected = read_tree(os.path.join(temp_dir, "scanned"))
+
+        loaded = app.BatchSession("", os.path.join(temp_dir, "planned"), ".txt")
+        header, records = app.read_plan(plan_path)
+        header["output"] = os.path.join(temp_dir, "planned")
+        start_load = time.perf_counter()
+        loaded.run((header, records), scan_only=True)
+        load_time = time.perf_counter() - start_load
+        if loaded.plan_records() != session.plan_records():
+            raise AssertionError("加载的计划与保存前的扫描结果不一致")
+        loaded._process_files_thread()
+        if read_tree(os.path.join(temp_dir, "planned")) != expected:
+            raise AssertionError("按计划处理的输出与扫描后处理不一致")
+
+        files = dirs * files_per_dir
+        size = os.path.getsize(plan_path)
+        lines.append(f"测试文件: {files} 个, 计划 {size / 1024:.0f} KB (平均每个文件 {size / files:.0f} 字节)")
+        lines.append(f"扫描 {(scanned - start) * 1000:.0f} ms, 保存计划 {(saved - scanned) * 1000:.0f} ms, "
+                     f"加载计划 {load_time * 1000:.0f} ms, 结果和输出一致")
+    return lines
+
+
+@benchmark("pipeline")
+def bench_pipeline(files=300, latency=0.02):
+    """扫描并转换：模拟高延迟文件系统时先扫描后处理与流水线方式的总耗时，输出一致"""
+    import random
+    import tempfile
+    sys.path.insert(0, SCRIPT_DIR)
+    import encoding_gui_4 as app
+
+    rng = random.Random(46)
+    lines = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_dir = os.path.join(temp_dir, "in")
+        os.makedirs(input_dir)
+        for i in range(files):
+            text = f"第 {i} 份\n" + "计算机软件的发展。\n" * rng.randrange(10, 300)
+            with open(os.path.join(input_dir, f"{i}.txt"), "wb") as f:
+                f.write(text.encode(rng.choice(("gbk", "utf-8"))))
+        lines.append(f"测试文件: {files} 个, 每次读取延迟 {latency * 1000:.0f} ms, 转换为 UTF-8")
+        app.detect_chardet("计算机".encode("gbk"))  # 预先导入 chardet，不计入耗时
+
+        outputs = {}
+        for name, pipeline in (("先扫描后处理", False), ("扫描并转换", True)):
+            output_dir = os.path.join(temp_dir, name)
+            session = app.BatchSession(input_dir, output_dir, ".txt", "UTF-8(无BOM)", dedup=False)
+            reads = []
+
+            def opener(path, mode):
+                reads.append(path)
+                return LatencyFile(path, latency)
+            session.input_opener = opener
+            start = time.perf_counter()
+            session.run(pipeline=pipeline)
+            elapsed = time.perf_counter() - start
+            outputs[name] = read_tree(output_dir)
+            lines.append(f"{name}: {elapsed * 1000:.0f} ms, 打开输入文件 {len(reads)} 次")
+        if outputs["先扫描后处理"] != outputs["扫描并转换"]:
+            raise AssertionError("扫描并转换的输出与先扫描后处理不一致")
+        lines.append("输出一致")
+    return lines
+
+
+# 运行 argv 中的脚本，退出前输出本进程的常驻内存峰值（VmHWM）
+PEAK_RSS_WRAPPER = """
+import runpy, sys
+sys.argv = sys.argv[1:]
+try:
+    runpy.run_path(sys.argv[0], run_name="__main__")
+finally:
+    with open("/proc/self/status") as f:
+        print(next(line for line in f if line.startswith("VmHWM:")).strip(), flush=True)
+"""
+
+
+@benchmark("schedule")
+def bench_schedule(small_files=40, big_megabytes=12, latency=0.05, workers=4, convert_megabytes=8):
+    """处理顺序：大文件最后处理与大文件先处理的处理耗时和并行效率；
+    内存预算：整文件简繁转换与超出预算时分块流式转换的进程内存峰值，输出一致"""
+    import random
+    import tempfile
+    sys.path.insert(0, SCRIPT_DIR)
+    import encoding_gui_4 as app
+
+    rng = random.Random(47)
+    lines = []
+    process_workers = app.PROCESS_WORKERS
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_dir = os.path.join(temp_dir, "in")
+        os.makedirs(input_dir)
+        for i in range(small_files):
+            with open(os.path.join(input_dir, f"{i:03d}.txt"), "wb") as f:
+                f.write(("计算机软件的发展。\n" * rng.randrange(100, 1000)).encode("gbk"))
+        line = "软件开发过程中的编码问题需要统一处理。\n"
+        with open(os.path.join(input_dir, "zz_big.txt"), "wb") as f:
+            f.write((line * (big_megabytes * 1024 * 1024 // len(line.encode("gbk")))).encode("gbk"))
+        lines.append(f"测试文件: {small_files} 个小文件 + 1 个 {big_megabytes} MB 的文件, "
+                     f"{workers} 个线程, 每次读取延迟 {latency * 1000:.0f} ms, 转换为 UTF-8")
+
+        outputs = {}
+        for name, ordered in (("大文件最后处理", False), ("大文件先处理", True)):
+            output_dir = os.path.join(temp_dir, name)
+            session = app.BatchSession(input_dir, output_dir, ".txt", "UTF-8(无BOM)", dedup=False)
+            session.input_opener = lambda path, mode: LatencyFile(path, latency)
+            if not ordered:
+                # 小文件先处理：与按路径顺序时大文件恰好排在最后的情况相同
+                session.task_size = lambda task, store=session.encoding_results: -store.size(task[1])
+            app.PROCESS_WORKERS = workers  # 读取延迟期间线程不占用 CPU，单核上也能体现调度的差别
+            try:
+                _, report = session.run()
+            finally:
+                app.PROCESS_WORKERS = process_workers
+            schedule = report["schedule"]
+            outputs[name] = read_tree(output_dir)
+            lines.append(f"{name}: 处理 {schedule['wall'] * 1000:.0f} ms, "
+                         f"并行效率 {schedule['busy'] / schedule['capacity']:.0%}")
+        if outputs["大文件最后处理"] != outputs["大文件先处理"]:
+            raise AssertionError("大文件先处理的输出与大文件最后处理不一致")
+
+        # 简繁转换需要整文件转换：比较默认预算和很小的预算（大文件改为分块流式转换），各在一个进程中运行
+        memory_dir = os.path.join(temp_dir, "memory")
+        os.makedirs(memory_dir)
+        with open(os.path.join(memory_dir, "big.txt"), "wb") as f:
+            f.write((line * (convert_megabytes * 1024 * 1024 // len(line.encode("gbk")))).encode("gbk"))
+        outputs = {}
+        for name, budget in (("整文件转换", None), ("分块流式转换", 32)):
+            output_dir = os.path.join(temp_dir, name)
+            # 在子进程退出前读取它自己的 VmHWM：wait4 的 ru_maxrss 会继承 fork 时父进程（基准测试进程）的内存峰值
+            args = [sys.executable, "-c", PEAK_RSS_WRAPPER, APP_SCRIPT, "--input", memory_dir,
+                    "--extensions", ".txt", "--output", output_dir, "--encoding", "繁体UTF-8"]
+            if budget:
+                args += ["--memory-budget", str(budget)]
+            start = time.perf_counter()
+            process = subprocess.Popen(args, stdout=subprocess.PIPE, text=True, encoding="utf-8")
+            output = process.stdout.read()
+            status = process.wait()
+            elapsed = time.perf_counter() - start
+            if status != 0:
+                raise AssertionError(f"{name} 失败:\n{output}")
+            peak_rss = int(re.search(r"VmHWM:\s+(\d+) kB", output).group(1))
+            peak = re.search(r"估算内存峰值: (.+) /", output).group(1)
+            outputs[name] = read_tree(output_dir)
+            lines.append(f"{name}: {convert_megabytes} MB 转为繁体, 估算峰值 {peak}, "
+                         f"进程最大常驻内存 {peak_rss / 1024:.0f} MB, {elapsed * 1000:.0f} ms")
+        if outputs["整文件转换"] != outputs["分块流式转换"]:
+            raise AssertionError("分块流式转换的输出与整文件转换不一致")
+        lines.append("输出一致")
+    return lines
+
+
+@benchmark("sniff")
+def bench_sniff(files=60, kilobytes=256):
+    """内容嗅探：扩展名是文本、内容是二进制或 UTF-16 的文件，嗅探前后的扫描耗时和检测结果"""
+    import gzip
+    import random
+    import tempfile
+    sys.path.insert(0, SCRIPT_DIR)
+    import encoding_gui_4 as app
+
+    rng = random.Random(48)
+    text = "日志记录：计算机软件的发展，status=ok\r\n" * (kilobytes * 1024 // 60)
+    kinds = {
+        ".log": lambda: gzip.compress(text.encode("utf-8"), compresslevel=1),  # 压缩过的日志
+        ".txt": lambda: bytes(rng.randrange(256) for _ in range(kilobytes * 1024)),  # 数据转储
+        ".csv": lambda: text.encode("utf-16"),  # 导出为 UTF-16 的表格
+    }
+    lines = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_dir = os.path.join(temp_dir, "in")
+        os.makedirs(input_dir)
+        for i in range(files):
+            extension = list(kinds)[i % len(kinds)]
+            with open(os.path.join(input_dir, f"{i}{extension}"), "wb") as f:
+                f.write(kinds[extension]())
+        lines.append(f"测试文件: {files} 个 (gzip 的 .log、随机数据的 .txt、UTF-16 的 .csv 各 1/3), "
+                     f"每个约 {kilobytes} KB (gzip 压缩后较小)")
+        app.detect_chardet("计算机".encode("gbk"))  # 预先导入 chardet，不计入耗时
+
+        sniff_content = app.sniff_content
+        for name, sniff in (("不嗅探", lambda head: ("text", None)), ("嗅探", sniff_content)):
+            app.sniff_content = sniff
+            try:
+                session = app.BatchSession(input_dir, "", ".txt,.log,.csv", "UTF-8(无BOM)", dedup=False)
+                start = time.perf_counter()
+                session.run(scan_only=True)
+                elapsed = time.perf_counter() - start
+            finally:
+                app.sniff_content = sniff_content
+            csv_encodings = sorted({info.get("best_encoding") for file_path, info in session.encoding_results.items()
+                                    if file_path.endswith(".csv")})
+            lines.append(f"{name}: 扫描 {elapsed * 1000:.0f} ms, 编码检测 {len(session.encoding_results)} 个, "
+                         f"直接复制 {len(session.copy_files)} 个, UTF-16 文件的推荐编码 {', '.join(csv_encodings)}")
+    return lines
+
+
+@benchmark("watch")
+def bench_watch(dirs=40, files_per_dir=50, changed=(1, 20)):
+    """监视模式：修改少量文件后只重新转换这些文件，与重新完整处理比较耗时，并检查输出"""
+    import tempfile
+    import threading
+    sys.path.insert(0, SCRIPT_DIR)
+    import encoding_gui_4 as app
+
+    lines = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_dir = os.path.join(temp_dir, "in")
+        for d in range(dirs):
+            os.makedirs(os.path.join(input_dir, f"d{d}"))
+            for i in range(files_per_dir):
+                with open(os.path.join(input_dir, f"d{d}", f"{i}.txt"), "wb") as f:
+                    f.write(f"第{d}组第{i}个文件：计算机软件的发展\n".encode("gbk") * 40)
+        lines.append(f"测试目录: {dirs * files_per_dir} 个 GBK 文件 ({dirs} 个目录)")
+
+        start = time.perf_counter()
+        app.BatchSession(input_dir, os.path.join(temp_dir, "full"), ".txt", "简体UTF-8").run()
+        lines.append(f"重新完整处理: {(time.perf_counter() - start) * 1000:.0f} ms")
+
+        for polling in (False, True):
+            output_dir = os.path.join(temp_dir, "poll" if polling else "inotify")
+            session = app.WatchSession(input_dir, output_dir, ".txt", "简体UTF-8", polling=polling)
+            session.start_watch()
+            session.run()
+            stop = threading.Event()
+            thread = threading.Thread(target=session.watch, args=(stop,))
+            thread.start()
+            try:
+                for round_number, count in enumerate(changed):
+                    paths = [os.path.join(input_dir, f"d{i % dirs}", f"{i // dirs}.txt") for i in range(count)]
+                    for path in paths:
+                        with open(path, "wb") as f:
+                            f.write(f"修改{round_number}：{path}\n".encode("gbk"))
+                    batches = session.status["batches"]
+                    deadline = time.monotonic() + 10
+                    while session.status["batches"] == batches and time.monotonic() < deadline:
+                        time.sleep(0.01)
+                    batch = session.status["last_batch"]
+                    correct = all(
+                        open(os.path.join(output_dir, os.path.relpath(path, input_dir)), encoding="utf-8").read()
+                        == f"修改{round_number}：{path}\n" for path in paths)
+                    lines.append(f"{session.watcher.backend} 修改 {count} 个文件: 转换 {batch['convert']} 个, "
+                                 f"处理 {batch['handle_ms']:.1f} ms, 事件到完成 {batch['latency_ms']:.0f} ms "
+                                 f"(含合并事件的等待 {app.WATCH_DEBOUNCE * 1000:.0f} ms), 输出正确: {correct}")
+            finally:
+                stop.set()
+                thread.join()
+    return lines
+
+
+@benchmark("service")
+def bench_service(snippets=300, cold_runs=5, batch_size=100, burst=20):
+    """本地转换服务：每个片段一次命令行调用与常驻服务的每次请求、批量请求的耗时，以及队列满时的拒绝"""
+    import base64
+    import http.client
+    import tempfile
+    import threading
+    from collections import Counter
+    sys.path.insert(0, SCRIPT_DIR)
+    import encoding_gui_4 as app
+
+    def headers(service, content_type):
+        return {"Content-Type": content_type, app.SERVICE_TOKEN_HEADER: service.token}
+
+    option = "繁体UTF-8"
+    texts = [f"第{i}条构建日志：计算机软件的发展与应用\n" for i in range(snippets)]
+    lines = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # 冷启动：每个片段启动一次命令行批处理
+        input_dir = os.path.join(temp_dir, "in")
+        os.makedirs(input_dir)
+        with open(os.path.join(input_dir, "snippet.txt"), "wb") as f:
+            f.write(texts[0].encode("gbk"))
+        cold = []
+        for i in range(cold_runs):
+            output_dir = os.path.join(temp_dir, f"out{i}")
+            start = time.perf_counter()
+            subprocess.run([sys.executable, os.path.join(SCRIPT_DIR, "encoding_gui_4.py"), "--input", input_dir,
+                            "--output", output_dir, "--encoding", option], check=True, capture_output=True)
+            cold.append(time.perf_counter() - start)
+        with open(os.path.join(temp_dir, "out0", "snippet.txt"), "rb") as f:
+            cold_output = f.read()
+        lines.append(f"冷启动命令行: 每次 {sum(cold) / len(cold) * 1000:.0f} ms ({cold_runs} 次平均)")
+
+        service = app.ConversionService(option)
+        start = time.perf_counter()
+        service.warm_up()
+        warm_up = time.perf_counter() - start
+        server = app.create_service_server(service)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            port = server.server_address[1]
+            connection = http.client.HTTPConnection("127.0.0.1", port)
+            latencies = []
+            outputs = []
+            for text in texts:
+                start = time.perf_counter()
+                connection.request("POST", "/convert", text.encode("gbk"), headers(service, "application/octet-stream"))
+                response = connection.getresponse()
+                outputs.append(response.read())
+                latencies.append(time.perf_counter() - start)
+            latencies.sort()
+            lines.append(f"常驻服务 (预热 {warm_up * 1000:.0f} ms): 每次请求平均 "
+                         f"{sum(latencies) / len(latencies) * 1000:.2f} ms, "
+                         f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.2f} ms ({snippets} 次), "
+                         f"与命令行输出相同: {outputs[0] == cold_output}")
+
+            start = time.perf_counter()
+            for first in range(0, snippets, batch_size):
+                items = [{"op": "convert", "data": base64.b64encode(text.encode("gbk")).decode("ascii")}
+                         for text in texts[first:first + batch_size]]
+                connection.request("POST", "/batch", json.dumps({"requests": items}),
+                                   headers(service, "application/json"))
+                results = json.loads(connection.getresponse().read())["results"]
+                assert all(base64.b64decode(result["data"]) == outputs[first + i]
+                           for i, result in enumerate(results))
+            elapsed = time.perf_counter() - start
+            lines.append(f"批量请求 (每次 {batch_size} 个): 每个片段 {elapsed / snippets * 1000:.3f} ms")
+            connection.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+            service.close()
+
+        # 队列上限：同时到达的请求超过队列容量时立即拒绝，不无限排队
+        service = app.ConversionService(option, workers=1, queue_size=2)
+        server = app.create_service_server(service)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        statuses = Counter()
+        body = ("计算机软件的发展\n" * 20000).encode("gbk")
+
+        def post():
+            connection = http.client.HTTPConnection("127.0.0.1", server.server_address[1])
+            connection.request("POST", "/convert", body, headers(service, "application/octet-stream"))
+            response = connection.getresponse()
+            response.read()
+            statuses[response.status] += 1
+            connection.close()
+
+        try:
+            clients = [threading.Thread(target=post) for _ in range(burst)]
+            for client in clients:
+                client.start()
+            for client in clients:
+                client.join()
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+            service.close()
+        lines.append(f"同时 {burst} 个请求 (1 个工作线程, 队列上限 2): 完成 {statuses[200]} 个, "
+                     f"返回 503 {statuses[503]} 个")
+    return lines
+
+
+def main():
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"未知的测试: {name} (可用: {', '.join(BENCHMARKS)})")
+            return 1
+
+    for name in names:
+        print(f"== {name} ==")
+        for line in BENCHMARKS[name]():
+            print(f"  {line}")
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -13,6 +13,14 @@ pyinstaller --onedir --windowed ^
   --name ConvertCN ^
   --collect-data opencc ^
   --collect-submodules chardet ^
+  --hidden-import opencc ^
+  --hidden-import tkinter.ttk ^
+  --hidden-import tkinter.filedialog ^
+  --hidden-import tkinter.messagebox ^
+  --hidden-import tkinter.scrolledtext ^
+  --hidden-import xml.etree.ElementTree ^
+  --hidden-import difflib ^
+  --hidden-import concurrent.futures ^
   encoding_gui_4.py
 
 echo [3/3] 打包完成！
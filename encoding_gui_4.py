@@ -7,67 +7,2901 @@
 优化了预览窗口的交互体验
 """
 
+import time
+_START_TIME = time.perf_counter()  # 用于统计启动耗时
+
 import os
-import tkinter as tk
-from tkinter import ttk, filedialog, messagebox, scrolledtext
-import chardet
+import sys
+import io
 import codecs
-import shutil
-from pathlib import Path
-from collections import Counter
+import importlib
+import importlib.util
+from collections import Counter, OrderedDict, deque
 import threading
-import zipfile
-import xml.etree.ElementTree as ET
-import tempfile
+import queue
+import itertools
+import re
+import bisect
+import struct
+import mmap
+import zlib
+import errno
+from array import array
+
+
+class LazyModule:
+    """延迟导入的模块 - 首次访问属性时才真正导入，缩短启动时间"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+    
+    def __getattr__(self, attr):
+        module = self._module
+        if module is None:
+            module = importlib.import_module(self._name)
+            self._module = module
+        return getattr(module, attr)
+    
+    @property
+    def loaded(self):
+        return self._module is not None
+
+
+# 启动时不需要的模块在首次使用时才加载
+# (打包时需要用 --hidden-import 声明这些模块，见 build_*.bat)
+tk = LazyModule('tkinter')
+ttk = LazyModule('tkinter.ttk')
+filedialog = LazyModule('tkinter.filedialog')
+messagebox = LazyModule('tkinter.messagebox')
+scrolledtext = LazyModule('tkinter.scrolledtext')
+chardet = LazyModule('chardet')
+shutil = LazyModule('shutil')
+zipfile = LazyModule('zipfile')
+ET = LazyModule('xml.etree.ElementTree')
+difflib = LazyModule('difflib')
+futures = LazyModule('concurrent.futures')
+json = LazyModule('json')
+tarfile = LazyModule('tarfile')
+tempfile = LazyModule('tempfile')
+hashlib = LazyModule('hashlib')
+ctypes = LazyModule('ctypes')
+select = LazyModule('select')
+base64 = LazyModule('base64')
+secrets = LazyModule('secrets')
+hmac = LazyModule('hmac')
+
+# 版本信息
+VERSION = "1.4.1"
+BUILD_DATE = "2025-07"
+AUTHOR = "SaberOnGo"
+
+# 输出编码选项
+OUTPUT_ENCODINGS = {
+    "简体GB18030": {
+        "encoding": "gb18030",
+        "charset": "simplified",
+        "name": "简体GB18030"
+    },
+    "简体GB2312": {
+        "encoding": "gb2312", 
+        "charset": "simplified",
+        "name": "简体GB2312"
+    },
+    "简体UTF-8": {
+        "encoding": "utf-8",
+        "charset": "simplified", 
+        "name": "简体UTF-8"
+    },
+    "繁体BIG5": {
+        "encoding": "big5",
+        "charset": "traditional",
+        "name": "繁体BIG5"
+    },
+    "繁体UTF-8": {
+        "encoding": "utf-8",
+        "charset": "traditional",
+        "name": "繁体UTF-8"
+    },
+    "简体GBK": {
+        "encoding": "gbk",
+        "charset": "simplified",
+        "name": "简体GBK"
+    },
+    "UTF-8(无BOM)": {
+        "encoding": "utf-8",
+        "charset": "auto",
+        "name": "UTF-8(无BOM)"
+    },
+    "UTF-8(带BOM)": {
+        "encoding": "utf-8-sig",
+        "charset": "auto", 
+        "name": "UTF-8(带BOM)"
+    }
+}
+
+# 无法用目标编码表示的字符的处理策略
+ERROR_POLICIES = {
+    "fail": {"name": "转换失败", "errors": "strict"},
+    "replace": {"name": "替换为?", "errors": "replace"},
+    "xmlcharref": {"name": "XML字符引用", "errors": "xmlcharrefreplace"},
+    "fallback": {"name": "改用后备编码", "errors": "strict"}
+}
+
+# 后备编码：目标编码无法表示某些字符时改用的编码
+FALLBACK_ENCODINGS = {
+    "gb2312": "gb18030",
+    "gbk": "gb18030",
+    "big5": "utf-8"
+}
+
+# 每个文件最多记录的无法编码字符位置数
+MAX_LOSSY_POSITIONS = 100
+
+
+class CodecCoverage:
+    """编码覆盖位图 - 预先计算编码能表示的全部字符，检查文本时无需逐字试编码"""
+
+    _cache = {}
+    _lock = threading.Lock()
+    _handler_lock = threading.Lock()
+    _recorder = None
+
+    def __init__(self, encoding):
+        self.encoding = codecs.lookup(encoding).name
+        self.bitmap = bytearray(0x110000 // 8)
+        
+        # 一次编码整个 BMP，无法编码的字符由错误处理器记录并跳过
+        bmp = ''.join(chr(c) for c in range(0x10000) if not 0xD800 <= c <= 0xDFFF)
+        unencodable = []
+        def record(error):
+            unencodable.extend(range(error.start, error.end))
+            return ('', error.end)
+        with CodecCoverage._handler_lock:
+            CodecCoverage._recorder = record
+            bmp.encode(self.encoding, errors='convertcn-coverage')
+            CodecCoverage._recorder = None
+        
+        covered = bytearray(b'\x01') * len(bmp)
+        for pos in unencodable:
+            covered[pos] = 0
+        for i, char in enumerate(bmp):
+            if covered[i]:
+                code = ord(char)
+                self.bitmap[code >> 3] |= 1 << (code & 7)
+        
+        # 中文编码对补充平面要么全部支持（GB18030、UTF），要么全部不支持
+        self.covers_astral = self._can_encode('\U00020000') and self._can_encode('\U0001F600')
+        if self.covers_astral:
+            for byte in range(0x10000 >> 3, len(self.bitmap)):
+                self.bitmap[byte] = 0xFF
+        
+        self.pattern = self._build_pattern()
+    
+    @staticmethod
+    def _record_error(error):
+        """编码错误处理器，转交给正在计算的覆盖位图"""
+        return CodecCoverage._recorder(error)
+    
+    @classmethod
+    def get(cls, encoding):
+        """获取编码的覆盖位图（每个编码只计算一次）"""
+        name = codecs.lookup(encoding).name
+        with cls._lock:
+            coverage = cls._cache.get(name)
+            if coverage is None:
+                coverage = cls(name)
+                cls._cache[name] = coverage
+            return coverage
+    
+    def _can_encode(self, char):
+        try:
+            char.encode(self.encoding)
+            return True
+        except UnicodeEncodeError:
+            return False
+    
+    def _build_pattern(self):
+        """把未覆盖的字符区间编译成正则字符类，由正则引擎在 C 层扫描文本"""
+        ranges = []
+        start = None
+        for code in range(0x80, 0x10000):
+            if 0xD800 <= code <= 0xDFFF or self.covers(code):
+                if start is not None:
+                    ranges.append((start, code - 1))
+                    start = None
+            elif start is None:
+                start = code
+        if start is not None:
+            ranges.append((start, 0xFFFF))
+        if not self.covers_astral:
+            ranges.append((0x10000, 0x10FFFF))
+        if not ranges:
+            return None
+        
+        parts = []
+        for start, end in ranges:
+            if start == end:
+                parts.append(re.escape(chr(start)))
+            else:
+                parts.append(f"{re.escape(chr(start))}-{re.escape(chr(end))}")
+        return re.compile('[' + ''.join(parts) + ']+')
+    
+    @property
+    def lossless(self):
+        """编码是否能表示所有字符"""
+        return self.pattern is None
+    
+    def covers(self, code):
+        """判断码位是否能被编码"""
+        return bool(self.bitmap[code >> 3] & (1 << (code & 7)))
+    
+    def find_unencodable(self, text):
+        """返回无法编码的字符区间列表 [(起始, 结束), ...]"""
+        if self.pattern is None or text.isascii():
+            return []
+        return [match.span() for match in self.pattern.finditer(text)]
+    
+    def has_unencodable(self, text):
+        """判断文本中是否有无法编码的字符"""
+        if self.pattern is None or text.isascii():
+            return False
+        return self.pattern.search(text) is not None
+
+
+codecs.register_error('convertcn-coverage', CodecCoverage._record_error)
+
+
+def analyze_encodability(text, coverage, max_positions=MAX_LOSSY_POSITIONS):
+    """分析文本中无法编码的字符，返回数量、字符统计和位置 (行, 列, 字符)"""
+    spans = coverage.find_unencodable(text)
+    count = 0
+    chars = Counter()
+    positions = []
+    line = 1
+    line_start = 0
+    last = 0
+    for start, end in spans:
+        count += end - start
+        chars.update(text[start:end])
+        if len(positions) < max_positions:
+            # 只统计两个位置之间的换行，避免重复扫描
+            newlines = text.count('\n', last, start)
+            if newlines:
+                line += newlines
+                line_start = text.rfind('\n', last, start) + 1
+            last = start
+            for pos in range(start, min(end, start + max_positions - len(positions))):
+                positions.append((line, pos - line_start + 1, text[pos]))
+    return {'count': count, 'chars': chars, 'positions': positions}
+
+
+# 编码检测时依次尝试的编码
+TEST_ENCODINGS = ('utf-8', 'gb18030', 'gbk', 'gb2312', 'big5', 'utf-8-sig', 'ascii')
+
+# 扫描结果中的文件类型（以小整数存储）
+FILE_TYPES = ('text', 'document')
+
+# 扫描结果的状态
+STATUS_DELETED = 0
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+# 每个编码的测试结果占 4 位：已测试、成功、含中文、乱码
+TEST_TESTED = 1
+TEST_SUCCESS = 2
+TEST_CHINESE = 4
+TEST_MOJIBAKE = 8
+
+
+def format_size(size):
+    """格式化文件大小"""
+    if size < 1024:
+        return f"{size} B"
+    elif size < 1024 * 1024:
+        return f"{size/1024:.1f} KB"
+    else:
+        return f"{size/(1024*1024):.1f} MB"
+
+
+class StringTable:
+    """字符串驻留表 - 重复的字符串（编码名、目录）只保存一份，列中只存编号"""
+
+    __slots__ = ('_ids', '_strings')
+
+    def __init__(self):
+        self._ids = {}
+        self._strings = []
+    
+    def intern(self, value):
+        string_id = self._ids.get(value)
+        if string_id is None:
+            string_id = len(self._strings)
+            value = sys.intern(value)
+            self._ids[value] = string_id
+            self._strings.append(value)
+        return string_id
+    
+    def lookup(self, value):
+        return self._ids.get(value)
+    
+    def __getitem__(self, string_id):
+        return self._strings[string_id]
+
+
+class FileInfoStore:
+    """按列存储的文件信息 - 替代每个文件一个 dict，可通过路径像 dict 一样访问"""
+
+    def __init__(self):
+        self.clear()
+    
+    def clear(self):
+        """清空所有结果"""
+        self._dirs = StringTable()
+        self._dir_index = []            # 目录编号 -> {文件名: 行号}
+        self._dir_ids = array('I')
+        self._names = []
+        self._status = bytearray()
+        self._sizes = array('q')
+        self._action_texts = StringTable()  # 处理结果文字（驻留后按编号存储）
+        self._action_texts.intern('')
+        self._actions = array('H')
+        self._row_count = 0             # 所有列都追加完成后才更新，其他线程读取时不会看到不完整的行
+        self._count = 0
+        self.total_bytes = 0
+    
+    @property
+    def row_count(self):
+        """已分配的行数（包括已删除的行），新结果总是追加在末尾"""
+        return self._row_count
+    
+    def find_row(self, file_path):
+        """查找路径对应的有效行号，不存在时返回 None"""
+        row = self._find_row(file_path)
+        if row is None or self._status[row] == STATUS_DELETED:
+            return None
+        return row
+    
+    def is_live(self, row):
+        return self._status[row] != STATUS_DELETED
+    
+    def value(self, row, key, default=None):
+        """按列名读取某一行的值"""
+        return self._row_dict(row, key, default)
+    
+    def set_action(self, file_path, text):
+        """记录文件的处理结果文字"""
+        row = self.find_row(file_path)
+        if row is not None:
+            self._actions[row] = self._action_texts.intern(text)
+    
+    def action_of(self, row):
+        return self._action_texts[self._actions[row]]
+    
+    def action(self, file_path):
+        """文件的处理结果文字"""
+        row = self.find_row(file_path)
+        return self.action_of(row) if row is not None else ''
+    
+    def size(self, file_path):
+        """文件大小，不存在时为 0"""
+        row = self.find_row(file_path)
+        return self._sizes[row] if row is not None else 0
+    
+    # 路径索引
+    def _find_row(self, file_path):
+        directory, name = os.path.split(file_path)
+        dir_id = self._dirs.lookup(directory)
+        if dir_id is None:
+            return None
+        return self._dir_index[dir_id].get(name)
+    
+    def _new_row(self, file_path):
+        directory, name = os.path.split(file_path)
+        dir_id = self._dirs.intern(directory)
+        if dir_id == len(self._dir_index):
+            self._dir_index.append({})
+        row = self._row_count
+        self._dir_ids.append(dir_id)
+        self._names.append(name)
+        self._status.append(STATUS_DELETED)
+        self._sizes.append(0)
+        self._actions.append(0)
+        self._append_columns()
+        # 各列都有了这一行之后再发布行号和行数
+        self._dir_index[dir_id][name] = row
+        self._row_count = row + 1
+        return row
+    
+    def path_of(self, row):
+        return os.path.join(self._dirs[self._dir_ids[row]], self._names[row])
+    
+    def rows(self):
+        """按插入顺序遍历有效的行号"""
+        status = self._status
+        return (row for row in range(self._row_count) if status[row] != STATUS_DELETED)
+    
+    # 子类扩展的列
+    def _append_columns(self):
+        pass
+    
+    def _set_row(self, row, info):
+        self._status[row] = STATUS_OK if info.get('exists', True) else STATUS_ERROR
+        self._sizes[row] = info.get('size', 0)
+    
+    def _add_aggregates(self, row, sign):
+        self.total_bytes += sign * self._sizes[row]
+    
+    def _row_dict(self, row, key, default):
+        if key == 'size':
+            return self._sizes[row]
+        if key == 'size_str':
+            return format_size(self._sizes[row]) if self._status[row] == STATUS_OK else 'Unknown'
+        if key == 'exists':
+            return self._status[row] == STATUS_OK
+        return default
+    
+    _view_keys = ('size', 'size_str', 'exists')
+    
+    # dict 接口
+    def __setitem__(self, file_path, info):
+        row = self._find_row(file_path)
+        if row is None:
+            row = self._new_row(file_path)
+        elif self._status[row] != STATUS_DELETED:
+            self._add_aggregates(row, -1)
+            self._count -= 1
+        self._set_row(row, info)
+        self._add_aggregates(row, 1)
+        self._count += 1
+    
+    def __getitem__(self, file_path):
+        row = self._find_row(file_path)
+        if row is None or self._status[row] == STATUS_DELETED:
+            raise KeyError(file_path)
+        return ResultView(self, row)
+    
+    def get(self, file_path, default=None):
+        try:
+            return self[file_path]
+        except KeyError:
+            return default
+    
+    def __delitem__(self, file_path):
+        row = self._find_row(file_path)
+        if row is None or self._status[row] == STATUS_DELETED:
+            raise KeyError(file_path)
+        self._add_aggregates(row, -1)
+        self._status[row] = STATUS_DELETED
+        self._count -= 1
+        del self._dir_index[self._dir_ids[row]][self._names[row]]
+    
+    def __contains__(self, file_path):
+        row = self._find_row(file_path)
+        return row is not None and self._status[row] != STATUS_DELETED
+    
+    def __len__(self):
+        return self._count
+    
+    def __bool__(self):
+        return self._count > 0
+    
+    def __iter__(self):
+        return (self.path_of(row) for row in self.rows())
+    
+    def keys(self):
+        return iter(self)
+    
+    def values(self):
+        return (ResultView(self, row) for row in self.rows())
+    
+    def items(self):
+        return ((self.path_of(row), ResultView(self, row)) for row in self.rows())
+
+
+class ScanResultStore(FileInfoStore):
+    """按列存储的编码检测结果，并随结果写入实时维护统计信息"""
+
+    def clear(self):
+        super().clear()
+        self._encodings = StringTable()
+        self._chardet_encodings = array('H')
+        self._best_encodings = array('H')
+        self._confidences = array('f')
+        self._chardet_bytes = array('q')  # chardet 实际检查的字节数
+        self._has_chinese = bytearray()
+        self._file_types = bytearray()
+        self._tests = array('L')
+        self._errors = {}               # 只有出错的行才有错误信息
+        
+        # 实时统计
+        self.chinese_count = 0
+        self.chinese_encoding_counts = Counter()  # 含中文文件的推荐编码分布
+        self.file_type_counts = Counter()
+    
+    def _append_columns(self):
+        self._chardet_encodings.append(0)
+        self._best_encodings.append(0)
+        self._confidences.append(0.0)
+        self._chardet_bytes.append(0)
+        self._has_chinese.append(0)
+        self._file_types.append(0)
+        self._tests.append(0)
+    
+    def _set_row(self, row, info):
+        self._status[row] = STATUS_ERROR if 'error' in info else STATUS_OK
+        self._sizes[row] = info.get('size', 0)
+        self._chardet_encodings[row] = self._encodings.intern(info.get('chardet_encoding') or 'unknown')
+        self._best_encodings[row] = self._encodings.intern(info.get('best_encoding') or 'unknown')
+        self._confidences[row] = info.get('chardet_confidence') or 0
+        self._chardet_bytes[row] = info.get('chardet_bytes', 0)
+        self._has_chinese[row] = bool(info.get('has_chinese', False))
+        self._file_types[row] = FILE_TYPES.index(info.get('file_type', 'text'))
+        
+        tests = 0
+        for encoding, test in info.get('encodings_test', {}).items():
+            if encoding not in TEST_ENCODINGS:
+                continue
+            bits = TEST_TESTED
+            if test.get('success', False):
+                bits |= TEST_SUCCESS
+                if test.get('has_chinese', False):
+                    bits |= TEST_CHINESE
+                if test.get('has_mojibake', False):
+                    bits |= TEST_MOJIBAKE
+            tests |= bits << (4 * TEST_ENCODINGS.index(encoding))
+        self._tests[row] = tests
+        
+        if 'error' in info:
+            self._errors[row] = info['error']
+        else:
+            self._errors.pop(row, None)
+    
+    def _add_aggregates(self, row, sign):
+        super()._add_aggregates(row, sign)
+        self.file_type_counts[FILE_TYPES[self._file_types[row]]] += sign
+        if self._has_chinese[row]:
+            encoding = self._encodings[self._best_encodings[row]]
+            self.chinese_count += sign
+            self.chinese_encoding_counts[encoding] += sign
+            if self.chinese_encoding_counts[encoding] <= 0:
+                del self.chinese_encoding_counts[encoding]
+    
+    def _encodings_test(self, row):
+        """从位字段还原各编码的测试结果"""
+        tests = self._tests[row]
+        result = {}
+        for i, encoding in enumerate(TEST_ENCODINGS):
+            bits = (tests >> (4 * i)) & 0xF
+            if not bits & TEST_TESTED:
+                continue
+            if bits & TEST_SUCCESS:
+                has_chinese = bool(bits & TEST_CHINESE)
+                has_mojibake = bool(bits & TEST_MOJIBAKE)
+                result[encoding] = {
+                    'success': True,
+                    'has_chinese': has_chinese,
+                    'has_mojibake': has_mojibake,
+                    'score': (0 if has_mojibake else 10) + (5 if has_chinese else 0)
+                }
+            else:
+                result[encoding] = {'success': False, 'error': True}
+        return result
+    
+    def _row_dict(self, row, key, default):
+        if key == 'best_encoding':
+            return self._encodings[self._best_encodings[row]]
+        if key == 'chardet_encoding':
+            return self._encodings[self._chardet_encodings[row]]
+        if key == 'chardet_confidence':
+            return self._confidences[row]
+        if key == 'chardet_bytes':
+            return self._chardet_bytes[row]
+        if key == 'has_chinese':
+            return bool(self._has_chinese[row])
+        if key == 'file_type':
+            return FILE_TYPES[self._file_types[row]]
+        if key == 'encodings_test':
+            return self._encodings_test(row)
+        if key == 'size':
+            return self._sizes[row]
+        if key == 'error':
+            return self._errors.get(row, default)
+        return default
+    
+    _view_keys = ('chardet_encoding', 'chardet_confidence', 'chardet_bytes', 'best_encoding', 'encodings_test',
+                  'has_chinese', 'file_type', 'size')
+
+
+class ResultView:
+    """单个文件结果的只读视图，兼容原来的 dict 访问方式"""
+
+    __slots__ = ('_store', '_row')
+
+    def __init__(self, store, row):
+        self._store = store
+        self._row = row
+    
+    def get(self, key, default=None):
+        return self._store._row_dict(self._row, key, default)
+    
+    def __getitem__(self, key):
+        missing = object()
+        value = self._store._row_dict(self._row, key, missing)
+        if value is missing:
+            raise KeyError(key)
+        return value
+    
+    def __contains__(self, key):
+        return self.get(key, None) is not None
+    
+    def keys(self):
+        keys = list(self._store._view_keys)
+        if 'error' in self:
+            keys.append('error')
+        return keys
+    
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+    
+    def to_dict(self):
+        return dict(self.items())
+
+
+class VirtualTreeview:
+    """虚拟列表 - 数据保存在模型中，Treeview 只为当前可见的行创建项目"""
+
+    def __init__(self, parent, columns, get_row, height=12):
+        # get_row(key) -> (values, tags)
+        self.get_row = get_row
+        self.tree = ttk.Treeview(parent, columns=columns, show='headings', height=height, selectmode='browse')
+        self.scrollbar = ttk.Scrollbar(parent, orient=tk.VERTICAL, command=self.yview)
+        self.keys = []             # 当前显示顺序（已过滤、排序）的数据键（模型中的行号）
+        self.positions = array('l')  # 行号 -> 在 keys 中的位置，不在列表中为 -1
+        self.top = 0               # 第一条可见数据的位置
+        self.visible_rows = height
+        self.selected_key = None
+        self._refresh_pending = False
+        
+        self.tree.bind('<Configure>', self.on_configure)
+        self.tree.bind('<<TreeviewSelect>>', self.on_select)
+        self.tree.bind('<MouseWheel>', lambda e: self.scroll(-3 if e.delta > 0 else 3))
+        self.tree.bind('<Button-4>', lambda e: self.scroll(-3))
+        self.tree.bind('<Button-5>', lambda e: self.scroll(3))
+        self.tree.bind('<Up>', lambda e: self.move_selection(-1))
+        self.tree.bind('<Down>', lambda e: self.move_selection(1))
+        self.tree.bind('<Prior>', lambda e: self.move_selection(-self.visible_rows))
+        self.tree.bind('<Next>', lambda e: self.move_selection(self.visible_rows))
+        self.tree.bind('<Home>', lambda e: self.move_selection(-len(self.keys)))
+        self.tree.bind('<End>', lambda e: self.move_selection(len(self.keys)))
+    
+    def grid(self, row, column):
+        self.tree.grid(row=row, column=column, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.scrollbar.grid(row=row, column=column + 1, sticky=(tk.N, tk.S))
+    
+    def set_keys(self, keys):
+        """替换全部数据"""
+        self.keys = keys
+        self.positions = array('l')
+        self._index_keys(0)
+        self._clamp_top()
+        self.refresh()
+    
+    def extend(self, keys):
+        """追加数据（扫描过程中增量显示）"""
+        if keys:
+            start = len(self.keys)
+            self.keys.extend(keys)
+            self._index_keys(start)
+            self.schedule_refresh()
+    
+    def _index_keys(self, start):
+        """记录 keys[start:] 中各行号的位置"""
+        positions = self.positions
+        keys = self.keys
+        for pos in range(start, len(keys)):
+            key = keys[pos]
+            if key >= len(positions):
+                positions.extend(itertools.repeat(-1, key + 1 - len(positions)))
+            positions[key] = pos
+    
+    def position_of(self, key):
+        """行号在当前列表中的位置，不在列表中返回 None"""
+        if key is None or key >= len(self.positions) or self.positions[key] < 0:
+            return None
+        return self.positions[key]
+    
+    def key_of_item(self, item):
+        """Treeview 项目对应的数据键"""
+        return self.keys[int(item)]
+    
+    def schedule_refresh(self, delay=100):
+        """合并短时间内的多次刷新"""
+        if not self._refresh_pending:
+            self._refresh_pending = True
+            self.tree.after(delay, self.refresh)
+    
+    def refresh(self):
+        """重新生成可见的行"""
+        self._refresh_pending = False
+        tree = self.tree
+        tree.delete(*tree.get_children())
+        
+        end = min(len(self.keys), self.top + self.visible_rows)
+        selected_item = None
+        for pos in range(self.top, end):
+            key = self.keys[pos]
+            values, tags = self.get_row(key)
+            tree.insert('', 'end', iid=str(pos), values=values, tags=tags)
+            if key == self.selected_key:
+                selected_item = str(pos)
+        if selected_item is not None:
+            tree.selection_set(selected_item)
+        
+        if self.keys:
+            self.scrollbar.set(self.top / len(self.keys), end / len(self.keys))
+        else:
+            self.scrollbar.set(0, 1)
+    
+    def yview(self, *args):
+        """滚动条回调"""
+        if args[0] == 'moveto':
+            self.top = int(float(args[1]) * len(self.keys))
+        elif args[0] == 'scroll':
+            amount = int(args[1])
+            if args[2] == 'pages':
+                amount *= self.visible_rows
+            self.top += amount
+        self._clamp_top()
+        self.refresh()
+    
+    def scroll(self, amount):
+        self.yview('scroll', amount, 'units')
+        return "break"
+    
+    def move_selection(self, delta):
+        """键盘移动选中行，必要时滚动"""
+        if not self.keys:
+            return "break"
+        pos = self.position_of(self.selected_key)
+        if pos is None:
+            pos = self.top - 1
+        pos = max(0, min(len(self.keys) - 1, pos + delta))
+        self.selected_key = self.keys[pos]
+        if pos < self.top:
+            self.top = pos
+        elif pos >= self.top + self.visible_rows:
+            self.top = pos - self.visible_rows + 1
+        self.refresh()
+        self.tree.event_generate('<<TreeviewSelect>>')
+        return "break"
+    
+    def on_select(self, event):
+        selection = self.tree.selection()
+        if selection:
+            self.selected_key = self.key_of_item(selection[0])
+    
+    def on_configure(self, event):
+        """窗口大小改变时重新计算可见行数"""
+        style = ttk.Style()
+        row_height = int(style.lookup('Treeview', 'rowheight') or 20)
+        visible_rows = max(1, (event.height - row_height - 4) // row_height)
+        if visible_rows != self.visible_rows:
+            self.visible_rows = visible_rows
+            self._clamp_top()
+            self.refresh()
+    
+    def _clamp_top(self):
+        self.top = max(0, min(self.top, len(self.keys) - self.visible_rows))
+
+
+SCAN_VIEW_BATCH = 200  # 扫描时每处理多少个文件刷新一次列表
+
+
+# 内置简繁转换引擎设置
+CONVERTER_BACKENDS = {'opencc': 'OpenCC', 'trie': '内置Trie'}
+TRIE_FORMAT_VERSION = 1
+TRIE_MAGIC = b'CCNTRIE1'
+TRIE_HEADER = struct.Struct('<8sIIIII')  # magic, 版本, 最长词条, 节点数, 值个数, 值字节数
+
+# opencc-python 的分句规则，分隔符不参与词典匹配
+OPENCC_SPLIT_PATTERN = re.compile(
+    r'(\s+|-|,|\.|\?|!|\*|　|，|。|、|；|：|？|！|…|“|”|‘|’|『|』|「|」|﹁|﹂|—|－|（|）|《|》|〈|〉|～|．|／|＼|︒|︑|︔|︓|︿|﹀|︹|︺|︙|︐|［|﹇|］|﹈|︕|︖|︰|︳|︴|︽|︾|︵|︶|｛|︷|｝|︸|﹃|﹄|【|︻|】|︼)')
+
+
+def get_cache_dir():
+    """程序缓存目录（编译后的词典等）"""
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'ConvertCN')
+
+
+def read_opencc_dictionary(path):
+    """读取 OpenCC 文本词典，与 opencc-python 一样后出现的词条覆盖前面的，多个候选取第一个"""
+    mapping = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            key, value = line.strip().split('\t')
+            mapping[key] = value.split(' ')[0]
+    return mapping
+
+
+def opencc_dictionary_files(config):
+    """OpenCC 配置的转换链，每一项是一组文本词典的路径"""
+    spec = importlib.util.find_spec('opencc')
+    if spec is None or not spec.submodule_search_locations:
+        raise ImportError("需要安装 opencc-python-reimplemented 才能读取词典")
+    package_dir = spec.submodule_search_locations[0]
+    
+    with open(os.path.join(package_dir, 'config', config + '.json'), 'r', encoding='utf-8') as f:
+        setting = json.load(f)
+    
+    chain = []
+    for item in setting.get('conversion_chain', []):
+        entries = item['dict']['dicts'] if item['dict'].get('type') == 'group' else [item['dict']]
+        chain.append([os.path.join(package_dir, 'dictionary', entry['file']) for entry in entries])
+    return chain
+
+
+class TrieDictionary:
+    """编译后的扁平 Trie 词典 - 节点按广度优先编号，子节点按字符排序存放在连续数组中，
+    匹配时二分查找；保存为缓存文件，加载时内存映射，不需要重新解析文本词典"""
+
+    def __init__(self, max_len, first, labels, value_ids, values, buffer=None):
+        # 节点 n 的子节点对应 labels[first[n]:first[n + 1]]，第 i 条边指向节点 i + 1
+        self.max_len = max_len
+        self.first = first
+        self.labels = labels
+        self.value_ids = value_ids
+        self.values = values
+        self._buffer = buffer  # 保持内存映射打开
+        
+        # 根节点的子节点用字典查找，逐字符匹配时先用它过滤不能作为词条开头的字符
+        self.root_nodes = {chr(labels[edge]): edge + 1 for edge in range(first[0], first[1])}
+        
+        # 只有单字词条时直接用 str.translate 转换
+        self.char_table = None
+        if max_len == 1:
+            self.char_table = {ord(char): values[value_ids[node]]
+                               for char, node in self.root_nodes.items() if value_ids[node] >= 0}
+    
+    @staticmethod
+    def compile(mapping):
+        """把 {词条: 转换结果} 编译成缓存文件内容"""
+        # 先建普通 Trie：children[节点] = {字符编码: 子节点}
+        children = [{}]
+        node_values = [-1]
+        values = []
+        for key in sorted(mapping):
+            node = 0
+            for char in key:
+                code = ord(char)
+                child = children[node].get(code)
+                if child is None:
+                    child = len(children)
+                    children[node][code] = child
+                    children.append({})
+                    node_values.append(-1)
+                node = child
+            node_values[node] = len(values)
+            values.append(mapping[key])
+        
+        # 按广度优先顺序重新编号，每个节点的子节点连续存放
+        first = array('I')
+        labels = array('I')
+        value_ids = array('i')
+        queue = deque([0])
+        while queue:
+            node = queue.popleft()
+            first.append(len(labels))
+            value_ids.append(node_values[node])
+            for code in sorted(children[node]):
+                labels.append(code)
+                queue.append(children[node][code])
+        first.append(len(labels))
+        
+        values_bytes = '\n'.join(values).encode('utf-8')
+        max_len = max((len(key) for key in mapping), default=0)
+        header = TRIE_HEADER.pack(TRIE_MAGIC, TRIE_FORMAT_VERSION, max_len, len(value_ids),
+                                  len(values), len(values_bytes))
+        return b''.join([header, first.tobytes(), labels.tobytes(), value_ids.tobytes(), values_bytes])
+    
+    @classmethod
+    def load(cls, path):
+        """内存映射加载缓存文件"""
+        with open(path, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(buffer)
+        magic, version, max_len, node_count, value_count, values_len = TRIE_HEADER.unpack_from(view)
+        if magic != TRIE_MAGIC or version != TRIE_FORMAT_VERSION:
+            raise ValueError(f"不是有效的词典缓存文件: {path}")
+        
+        offset = TRIE_HEADER.size
+        sections = []
+        for count, typecode in ((node_count + 1, 'I'), (node_count - 1, 'I'), (node_count, 'i')):
+            section = view[offset:offset + count * 4]
+            if sys.byteorder == 'little':
+                sections.append(section.cast(typecode))
+            else:
+                section = array(typecode, section)
+                section.byteswap()
+                sections.append(section)
+            offset += count * 4
+        first, labels, value_ids = sections
+        values = bytes(view[offset:offset + values_len]).decode('utf-8').split('\n') if value_count else []
+        return cls(max_len, first, labels, value_ids, values, buffer)
+    
+    def find_matches(self, text):
+        """找出 text 中所有词条匹配，按长度分组: matches[长度] = [(位置, 值序号), ...]（位置递增）"""
+        matches = [[] for _ in range(self.max_len + 1)]
+        codes = list(map(ord, text))
+        root_nodes = self.root_nodes
+        first = self.first
+        labels = self.labels
+        value_ids = self.value_ids
+        length = len(text)
+        
+        for start, char in enumerate(text):
+            node = root_nodes.get(char)
+            if node is None:
+                continue
+            value = value_ids[node]
+            if value >= 0:
+                matches[1].append((start, value))
+            end = start + 1
+            while end < length:
+                low = first[node]
+                high = first[node + 1]
+                if low == high:
+                    break
+                code = codes[end]
+                edge = bisect.bisect_left(labels, code, low, high)
+                if edge == high or labels[edge] != code:
+                    break
+                node = edge + 1
+                end += 1
+                value = value_ids[node]
+                if value >= 0:
+                    matches[end - start].append((start, value))
+        return matches
+
+
+class TrieConverter:
+    """内置简繁转换引擎 - 使用编译后的词典，匹配规则与 opencc-python 完全一致：
+    每段文本先在第一个词典中反复选取最长（同长取最左）的词条，剩下的片段再交给同组的下一个词典"""
+
+    def __init__(self, config, cache_dir=None):
+        self.cache_dir = cache_dir or get_cache_dir()
+        # 转换链，每一项是一组词典
+        self.chain = [[self.load_dictionary(source) for source in group]
+                      for group in opencc_dictionary_files(config)]
+    
+    def load_dictionary(self, source):
+        """加载编译后的词典，缓存不存在或文本词典已改变时重新编译"""
+        stat = os.stat(source)
+        stamp = f"{TRIE_FORMAT_VERSION}|{os.path.basename(source)}|{stat.st_size}|{stat.st_mtime_ns}"
+        name = f"{os.path.splitext(os.path.basename(source))[0]}-{zlib.crc32(stamp.encode('utf-8')):08x}.trie"
+        path = os.path.join(self.cache_dir, name)
+        
+        if not os.path.exists(path):
+            # opencc-python 先按分隔符分句再查词典，含分隔符的词条永远不会被匹配
+            mapping = {key: value for key, value in read_opencc_dictionary(source).items()
+                       if not OPENCC_SPLIT_PATTERN.search(key)}
+            data = TrieDictionary.compile(mapping)
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        return TrieDictionary.load(path)
+    
+    def convert(self, text):
+        """转换文本，结果与 opencc.OpenCC(config).convert(text) 相同"""
+        # 编译时已去掉含分隔符的词条，匹配不会跨过分隔符，整段文本一次处理即与逐句处理相同
+        for group in self.chain:
+            text = self._convert_group(text, group)
+        return text
+    
+    def _convert_group(self, text, group):
+        if not group or not text:
+            return text
+        trie = group[0]
+        if trie.char_table is not None and len(group) == 1:
+            return text.translate(trie.char_table)
+        
+        # 从最长的词条开始选取，与已选词条重叠的匹配作废
+        covered = bytearray(len(text))
+        selected = []
+        matches = trie.find_matches(text)
+        for length in range(trie.max_len, 0, -1):
+            for start, value in matches[length]:
+                end = start + length
+                if covered.find(1, start, end) < 0:
+                    covered[start:end] = b'\x01' * length
+                    selected.append((start, end, value))
+        if not selected:
+            return self._convert_group(text, group[1:])
+        
+        # 未匹配的片段交给同组的下一个词典
+        selected.sort()
+        values = trie.values
+        result = []
+        position = 0
+        for start, end, value in selected:
+            if start > position:
+                result.append(self._convert_group(text[position:start], group[1:]))
+            result.append(values[value])
+            position = end
+        if position < len(text):
+            result.append(self._convert_group(text[position:], group[1:]))
+        return ''.join(result)
+
+
+def create_converter(backend, config):
+    """创建简繁转换器"""
+    if backend == 'trie':
+        return TrieConverter(config)
+    return importlib.import_module('opencc').OpenCC(config)
+
+
+# 流式转码设置（不需要简繁转换或文件超出内存预算时使用）
+TRANSCODE_BUFFER_SIZE = 1024 * 1024  # 每次读取和写入的字节数
+CHUNKED_LINE_LIMIT = 4 * TRANSCODE_BUFFER_SIZE  # 分块转换时一行超过此长度也直接转换，不再等待换行符
+
+
+def same_codec(encoding1, encoding2):
+    """两个编码名称是否指同一个编码"""
+    try:
+        return codecs.lookup(encoding1).name == codecs.lookup(encoding2).name
+    except LookupError:
+        return False
+
+
+# 换行符、BOM 和行尾空白的规范化方式
+EOL_POLICIES = {
+    "preserve": {"name": "保持不变"},
+    "lf": {"name": "LF (Unix)"},
+    "crlf": {"name": "CRLF (Windows)"}
+}
+
+BOM_POLICIES = {
+    "auto": {"name": "按输出编码"},
+    "preserve": {"name": "保持不变"},
+    "strip": {"name": "去除"},
+    "add": {"name": "添加"}
+}
+
+TRAILING_WHITESPACE_PATTERN = re.compile(r'[ \t]+(?=[\r\n]|\Z)')
+
+
+def bom_free_encoding(encoding):
+    """去掉自动处理 BOM 的编码（utf-8-sig → utf-8），BOM 由 TextNormalizer 显式处理"""
+    return 'utf-8' if same_codec(encoding, 'utf-8-sig') else encoding
+
+
+class TextNormalizer:
+    """换行符、BOM 和行尾空白的规范化 - 在解码和编码之间逐块处理，并统计修改的数量"""
+
+    def __init__(self, eol='preserve', bom='auto', trim_trailing=False):
+        self.eol = eol
+        self.bom = bom
+        self.trim_trailing = trim_trailing
+        self.source_bom = None  # 输入是否有 BOM（处理第一块后确定）
+        self.output_bom = False
+        self.eol_changed = 0
+        self.trailing_trimmed = 0
+        self._carry = ''
+    
+    @property
+    def passthrough(self):
+        """是否不会修改任何内容（已是目标编码的文件可以直接复制）"""
+        return self.eol == 'preserve' and self.bom in ('auto', 'preserve') and not self.trim_trailing
+    
+    def feed(self, text, final=False):
+        """处理一块解码后的文本，返回可以写出的部分；不完整的最后一行留到下一块一起处理"""
+        if self.source_bom is None:
+            if not text and not final:
+                return ''
+            self.source_bom = text.startswith('\ufeff')
+            if self.source_bom:
+                text = text[1:]
+        
+        text = self._carry + text
+        if final:
+            self._carry = ''
+        else:
+            # 在最后一个换行处切开，块末尾的 \r 可能和下一块开头的 \n 组成 CRLF
+            end = max(text.rfind('\n'), text.rfind('\r', 0, len(text) - 1)) + 1
+            self._carry = text[end:]
+            text = text[:end]
+        if not text:
+            return text
+        
+        if self.trim_trailing:
+            text, count = TRAILING_WHITESPACE_PATTERN.subn('', text)
+            self.trailing_trimmed += count
+        
+        if self.eol != 'preserve':
+            crlf = text.count('\r\n')
+            cr = text.count('\r') - crlf
+            lf = text.count('\n') - crlf
+            changed = crlf + cr if self.eol == 'lf' else lf + cr
+            if changed:
+                text = text.replace('\r\n', '\n').replace('\r', '\n')
+                if self.eol == 'crlf':
+                    text = text.replace('\n', '\r\n')
+                self.eol_changed += changed
+        return text
+    
+    def bom_bytes(self, target_encoding):
+        """输出开头要写入的 BOM（只有 UTF-8 输出才写 BOM），需在处理第一块之后调用"""
+        if not same_codec(bom_free_encoding(target_encoding), 'utf-8'):
+            self.output_bom = False
+        elif self.bom == 'auto':
+            self.output_bom = same_codec(target_encoding, 'utf-8-sig')
+        elif self.bom == 'preserve':
+            self.output_bom = bool(self.source_bom)
+        else:
+            self.output_bom = self.bom == 'add'
+        return codecs.BOM_UTF8 if self.output_bom else b''
+    
+    def stats(self):
+        """本文件的修改统计"""
+        bom = ''
+        if self.output_bom and not self.source_bom:
+            bom = 'added'
+        elif self.source_bom and not self.output_bom:
+            bom = 'removed'
+        return {'eol': self.eol_changed, 'trailing': self.trailing_trimmed, 'bom': bom}
+
+
+def format_normalize_stats(stats):
+    """规范化统计的简短说明，没有修改时返回空字符串"""
+    parts = []
+    if stats['eol']:
+        parts.append(f"换行符 {stats['eol']} 处")
+    if stats['trailing']:
+        parts.append(f"行尾空白 {stats['trailing']} 行")
+    if stats['bom'] == 'added':
+        parts.append("添加BOM")
+    elif stats['bom'] == 'removed':
+        parts.append("去除BOM")
+    return ", ".join(parts)
+
+
+def iter_text_chunks(source, source_encoding, normalizer, convert=None, buffer_size=TRANSCODE_BUFFER_SIZE):
+    """按固定大小的块读取、增量解码并规范化，逐块产生 (文本, 是否最后一块)。
+    指定 convert 时按整行做简繁转换，词组不会被块边界截断"""
+    decoder = codecs.getincrementaldecoder(bom_free_encoding(source_encoding))()
+    pending = ''
+    while True:
+        data = source.read(buffer_size)
+        final = not data
+        text = normalizer.feed(decoder.decode(data, final=final), final=final)
+        if convert is not None:
+            text = pending + text
+            cut = len(text) if final else text.rfind('\n') + 1
+            if cut == 0 and len(text) >= CHUNKED_LINE_LIMIT:
+                cut = len(text)
+            text, pending = convert(text[:cut]) if cut else '', text[cut:]
+        yield text, final
+        if final:
+            break
+
+
+def transcode_stream(source, target, source_encoding, target_encoding, errors='strict',
+                     normalizer=None, buffer_size=TRANSCODE_BUFFER_SIZE, convert=None):
+    """按固定大小的块流式转码：字节 → 增量解码 → 规范化 →（简繁转换）→ 增量编码 → 二进制写入，
+    不在内存中保留整个文件；返回使用的 TextNormalizer"""
+    normalizer = normalizer or TextNormalizer()
+    encoder = codecs.getincrementalencoder(bom_free_encoding(target_encoding))(errors)
+    
+    bom_written = False
+    for text, final in iter_text_chunks(source, source_encoding, normalizer, convert, buffer_size):
+        if not bom_written and normalizer.source_bom is not None:
+            target.write(normalizer.bom_bytes(target_encoding))
+            bom_written = True
+        target.write(encoder.encode(text, final=final))
+    return normalizer
+
+
+def transcode_file(input_path, output_path, source_encoding, target_encoding, errors='strict',
+                   normalizer=None, buffer_size=TRANSCODE_BUFFER_SIZE):
+    """流式转码一个文件，失败时不留下写了一半的输出文件"""
+    try:
+        with open(input_path, 'rb') as source, open(output_path, 'wb', buffering=buffer_size) as target:
+            return transcode_stream(source, target, source_encoding, target_encoding, errors,
+                                    normalizer, buffer_size)
+    except Exception:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise
+
+
+# 检测时读取文件的方式
+MMAP_READ_THRESHOLD = 4 * 1024 * 1024  # 不小于此大小的文件映射为只读内存，较小的文件直接读取更快
+DETECT_CHUNK_SIZE = 1024 * 1024  # 大文件试解码时每次交给增量解码器的字节数
+CHARDET_CHUNK_SIZE = 64 * 1024  # 每次交给 chardet 的字节数
+BEST_SCORE = 15  # 试解码的最高得分：没有乱码 (10) 且含中文 (5)
+NON_ASCII_PATTERN = re.compile(rb'[\x80-\xff]')
+MOJIBAKE_CHARS = ('锟', '烫', '屯', '�')
+
+
+def map_file(f):
+    """把打开的文件映射为只读内存，空文件返回 b''（不能映射长度为 0 的文件）"""
+    if os.fstat(f.fileno()).st_size == 0:
+        return b''
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def release_buffer(buffer):
+    """释放 map_file 返回的内存映射"""
+    if isinstance(buffer, mmap.mmap):
+        buffer.close()
+
+
+# 检测前的内容嗅探：只看文件开头，二进制文件不做编码检测，UTF-16/32 文本不交给 chardet 和试解码
+SNIFF_BYTES = 8192  # 嗅探时检查的开头字节数
+BINARY_SIGNATURES = (
+    (b'\x1f\x8b', 'gzip'), (b'PK\x03\x04', 'zip'), (b'\xfd7zXZ\x00', 'xz'), (b'7z\xbc\xaf\x27\x1c', '7z'),
+    (b'Rar!\x1a\x07', 'rar'), (b'\x28\xb5\x2f\xfd', 'zstd'), (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpeg'), (b'GIF87a', 'gif'), (b'GIF89a', 'gif'), (b'%PDF-', 'pdf'),
+    (b'\x7fELF', 'elf'), (b'\xca\xfe\xba\xbe', 'class'), (b'SQLite format 3\x00', 'sqlite'),
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'ole'),
+)
+# UTF-32 LE 的 BOM 以 UTF-16 LE 的 BOM 开头，需要先检查；解码时 BOM 作为 U+FEFF 保留，由 TextNormalizer 处理
+UNICODE_BOMS = ((codecs.BOM_UTF32_LE, 'utf-32-le'), (codecs.BOM_UTF32_BE, 'utf-32-be'),
+                (codecs.BOM_UTF16_LE, 'utf-16-le'), (codecs.BOM_UTF16_BE, 'utf-16-be'))
+UNICODE_ENCODINGS = tuple(encoding for bom, encoding in UNICODE_BOMS)
+NUL_LAYOUT_RATIO = 0.9  # 没有 BOM 时至少这么多的 NUL 落在 UTF-16/32 高位字节的位置才按 UTF-16/32 解码
+BINARY_CONTROL_RATIO = 0.05  # NUL 和其他控制字符（换行、制表、换页、ESC 除外）超过此比例视为二进制
+CONTROL_BYTES_PATTERN = re.compile(rb'[\x00-\x08\x0e-\x1a\x1c-\x1f\x7f]')
+CONTROL_CHARS_PATTERN = re.compile(r'[\x00-\x08\x0e-\x1a\x1c-\x1f\x7f]')
+COMMON_TEXT_RATIO = 0.8  # 没有 BOM 时解码结果中 ASCII 和中文字符（含标点、全角字符）至少占这个比例
+COMMON_CHARS_PATTERN = re.compile(r'[\t\n\r\x20-\x7e\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]')
+
+
+def guess_unicode_encoding(head):
+    """没有 BOM 时按 NUL 的位置猜测 UTF-32/UTF-16：ASCII 字符的高位字节为 0，NUL 只出现在固定的位置"""
+    nul_count = head.count(0)
+    usable = len(head) - len(head) % 4
+    if usable:
+        units = usable // 4
+        # UTF-32 的最高字节总是 0，次高字节只在 BMP 以外的字符中非 0
+        if head[3:usable:4].count(0) == units and head[2:usable:4].count(0) >= units * NUL_LAYOUT_RATIO:
+            return 'utf-32-le'
+        if head[0:usable:4].count(0) == units and head[1:usable:4].count(0) >= units * NUL_LAYOUT_RATIO:
+            return 'utf-32-be'
+    odd = head[1::2].count(0)
+    if odd >= nul_count * NUL_LAYOUT_RATIO:
+        return 'utf-16-le'
+    if nul_count - odd >= nul_count * NUL_LAYOUT_RATIO:
+        return 'utf-16-be'
+    return None
+
+
+def looks_like_unicode_text(head, encoding, has_bom=True):
+    """开头能否按 encoding 解码为正常的文本（末尾不完整的字符留在增量解码器中，不算错误）；
+    没有 BOM 时还要求大部分是 ASCII 和中文字符，避免把小整数组成的二进制数据当作 UTF-16"""
+    try:
+        text = codecs.getincrementaldecoder(encoding)().decode(head)
+    except UnicodeDecodeError:
+        return False
+    if len(CONTROL_CHARS_PATTERN.findall(text)) > len(text) * BINARY_CONTROL_RATIO:
+        return False
+    return has_bom or len(COMMON_CHARS_PATTERN.findall(text)) >= len(text) * COMMON_TEXT_RATIO
+
+
+def sniff_content(head):
+    """根据文件开头判断内容类型，返回 ('binary', 格式) 、('text', UTF-16/32 编码) 或 ('text', None)：
+    依次检查文件格式的特征字节、UTF-16/32 的 BOM、NUL 的位置（没有 BOM 的 UTF-16/32）和控制字符的比例"""
+    for signature, name in BINARY_SIGNATURES:
+        if head.startswith(signature):
+            return 'binary', name
+    for bom, encoding in UNICODE_BOMS:
+        if head.startswith(bom) and looks_like_unicode_text(head, encoding):
+            return 'text', encoding
+    if b'\x00' in head:
+        encoding = guess_unicode_encoding(head)
+        if encoding is not None and looks_like_unicode_text(head, encoding, has_bom=False):
+            return 'text', encoding
+    if len(CONTROL_BYTES_PATTERN.findall(head)) > len(head) * BINARY_CONTROL_RATIO:
+        return 'binary', 'NUL' if b'\x00' in head else '控制字符'
+    return 'text', None
+
+
+def detect_chardet(buffer, chunk_size=CHARDET_CHUNK_SIZE):
+    """把缓冲区按固定大小逐块交给 chardet，检测器得出结论 (done) 时停止，不复制整个缓冲区；
+    返回 (检测结果, 交给 chardet 的字节数)。chardet (3.x - 7.x) 的 result 只在得出结论或 close 时设置，
+    没有可以提前判断的中间置信度；7.x 检查的字节数达到上限时也设置 done"""
+    detector = chardet.UniversalDetector()
+    consumed = 0
+    while consumed < len(buffer):
+        block = buffer[consumed:consumed + chunk_size]
+        detector.feed(block)
+        consumed += len(block)
+        if detector.done:
+            break
+    return detector.close(), consumed
+
+
+def scan_decoded(buffer, encoding, chunk_size=DETECT_CHUNK_SIZE):
+    """按指定编码试解码，返回 (是否含中文, 是否含乱码字符)，无法解码时抛出 UnicodeDecodeError；
+    大缓冲区用增量解码器逐块解码，不构造整个文件的字符串"""
+    has_chinese = has_mojibake = False
+    if len(buffer) <= chunk_size:
+        pieces = (str(buffer, encoding),)
+    else:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        pieces = (decoder.decode(buffer[start:start + chunk_size], final=start + chunk_size >= len(buffer))
+                  for start in range(0, len(buffer), chunk_size))
+    for content in pieces:
+        has_chinese = has_chinese or any('\u4e00' <= char <= '\u9fff' for char in content)
+        has_mojibake = has_mojibake or any(char in content for char in MOJIBAKE_CHARS)
+    return has_chinese, has_mojibake
+
+
+def can_decode(buffer, encoding, chunk_size=DETECT_CHUNK_SIZE):
+    """只检查能否按指定编码解码（不检查内容是否含中文和乱码）；无法解码的内容通常在开头就失败"""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    try:
+        for start in range(0, len(buffer), chunk_size):
+            decoder.decode(buffer[start:start + chunk_size], final=start + chunk_size >= len(buffer))
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+ENCODING_PRIOR_MIN_FILES = 8  # 目录中至少这么多文件证明某个候选编码无法解码后才跳过它
+
+
+class EncodingPriors:
+    """按目录统计的编码先验 - 同一目录下的文件通常是同一种编码。先试解码目录中最常见的推荐编码，
+    它得到最高分时排在它后面的编码不可能胜出；目录中以它为推荐编码的文件足够多、
+    都无法用某个排在前面的编码解码，且当前文件的 chardet 结果与这些文件一致时，只检查能否用这个编码解码、不再评分。
+    先验编码没有得到最高分、chardet 结果不一致或被跳过的编码可以解码（与先验冲突）时按原顺序完整检测"""
+
+    def __init__(self, min_files=ENCODING_PRIOR_MIN_FILES):
+        self.min_files = min_files
+        self._dirs = {}  # 目录 -> {推荐编码: [文件数, chardet 结果计数, 各编码无法解码（或被跳过）的文件数]}
+    
+    def get(self, directory, chardet_encoding):
+        """返回 (先验编码或 None, 可以跳过的编码集合)"""
+        stats = self._dirs.get(directory)
+        if not stats:
+            return None, frozenset()
+        prior = max(stats, key=lambda encoding: stats[encoding][0])
+        files, chardet_counts, failed = stats[prior]
+        if files < self.min_files or chardet_counts.most_common(1)[0][0] != chardet_encoding:
+            return prior, frozenset()
+        earlier = TEST_ENCODINGS[:TEST_ENCODINGS.index(prior)]
+        return prior, frozenset(encoding for encoding in earlier if failed[encoding] == files)
+    
+    def record(self, directory, best_encoding, tests, chardet_encoding):
+        """记录一个文件的检测结果（tests 为各编码的试解码结果，没有的编码表示被跳过）"""
+        if tests.get(best_encoding, {}).get('score') != BEST_SCORE:
+            return
+        stats = self._dirs.setdefault(directory, {})
+        entry = stats.setdefault(best_encoding, [0, Counter(), Counter()])
+        entry[0] += 1
+        entry[1][chardet_encoding] += 1
+        for encoding in TEST_ENCODINGS[:TEST_ENCODINGS.index(best_encoding)]:
+            if not tests.get(encoding, {'success': False}).get('success', False):
+                entry[2][encoding] += 1
+
+
+class ContentIndex:
+    """内容去重索引 - 利用扫描时已经读出的内容计算快速哈希 (crc32)，
+    大小和快速哈希都相同时再用强哈希 (blake2b) 确认内容相同"""
+
+    def __init__(self, opener=open):
+        self.opener = opener
+        self._entries = {}  # (大小, crc32) -> [[强哈希或 None, 第一个文件]]
+        self.total_bytes = 0
+        self.unique_bytes = 0
+    
+    def _file_hash(self, path):
+        """重新读取文件计算强哈希（第一个文件的内容已经不在内存中）"""
+        digest = hashlib.blake2b(digest_size=32)
+        with self.opener(path, 'rb') as f:
+            for block in iter(lambda: f.read(TRANSCODE_BUFFER_SIZE), b''):
+                digest.update(block)
+        return digest.digest()
+    
+    def add(self, path, data):
+        """登记文件内容，与之前登记的文件内容相同时返回那个文件，否则返回 None"""
+        size = len(data)
+        self.total_bytes += size
+        key = (size, zlib.crc32(data))
+        entries = self._entries.get(key)
+        if entries is None:
+            self._entries[key] = [[None, path]]
+            self.unique_bytes += size
+            return None
+        
+        strong = hashlib.blake2b(data, digest_size=32).digest()
+        for entry in entries:
+            if entry[0] is None:
+                try:
+                    entry[0] = self._file_hash(entry[1])
+                except OSError:
+                    # 之前的文件已无法读取（被删除、权限改变等）：不能确认内容相同，不再与它比较
+                    entry[0] = b''
+            if entry[0] == strong:
+                return entry[1]
+        entries.append([strong, path])
+        self.unique_bytes += size
+        return None
+
+
+FICLONE = 0x40049409  # Linux ioctl：在支持的文件系统（btrfs、XFS 等）上以写时复制方式克隆文件
+
+
+def clone_file(source, target):
+    """用 reflink 克隆文件（不复制数据），不支持时返回 False"""
+    if not sys.platform.startswith('linux'):
+        return False
+    import fcntl
+    try:
+        with open(source, 'rb') as src, open(target, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        return True
+    except OSError:
+        if os.path.exists(target):
+            os.remove(target)
+        return False
+
+
+# 扫描时的并发读取
+SCAN_READ_CONCURRENCY = 16  # 默认同时在途的读取数
+SCAN_READ_MIN = 64 * 1024  # 单次读取请求的最小/最大字节数
+SCAN_READ_MAX = 8 * 1024 * 1024
+
+
+class ReadScheduler:
+    """并发读取调度 - 网络共享等高延迟文件系统上，open/read/stat 的耗时主要是往返延迟而不是 CPU，
+    用线程池同时发出多个请求；结果按提交顺序交给检测，在途数量有上限（有界队列），内存占用有界"""
+
+    def __init__(self, concurrency=SCAN_READ_CONCURRENCY, opener=open,
+                 min_read=SCAN_READ_MIN, max_read=SCAN_READ_MAX, mmap_threshold=MMAP_READ_THRESHOLD):
+        self.concurrency = max(1, concurrency)
+        self.opener = opener
+        self.mmap_threshold = mmap_threshold
+        self.min_read = min_read
+        self.max_read = max_read
+        self._average_size = min_read
+    
+    def read_size(self):
+        """首次读取的请求大小：跟随最近读取的文件大小，多数文件一次往返就能读完"""
+        size = 1 << int(self._average_size * 2).bit_length()
+        return max(self.min_read, min(self.max_read, size))
+    
+    def read_file(self, path):
+        """读取整个文件，没有读完时每次请求大小加倍，减少往返次数；
+        不小于 mmap_threshold 的本地文件返回只读内存映射（用完后调用 release_buffer）"""
+        size = self.read_size()
+        chunks = []
+        with self.opener(path, 'rb') as f:
+            if self.mmap_threshold and hasattr(f, 'fileno') and \
+                    os.fstat(f.fileno()).st_size >= self.mmap_threshold:
+                return map_file(f)
+            while True:
+                data = f.read(size)
+                chunks.append(data)
+                if len(data) < size:
+                    break
+                size = min(size * 2, self.max_read)
+        data = chunks[0] if len(chunks) == 1 else b''.join(chunks)
+        self._average_size = self._average_size * 0.8 + len(data) * 0.2
+        return data
+    
+    def map(self, func, items):
+        """在线程池中对每一项调用 func，按提交顺序逐个返回结果；最多 concurrency*2 项在途"""
+        with futures.ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            pending = deque()
+            try:
+                for item in items:
+                    pending.append(pool.submit(func, item))
+                    if len(pending) >= self.concurrency * 2:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                for future in pending:
+                    future.cancel()
+
+
+# 处理结果的输出方式
+PROCESS_WORKERS = min(8, os.cpu_count() or 1)  # 并行处理文件的线程数
+ARCHIVE_EXTENSIONS = ('.zip', '.tar.gz', '.tgz')
+ARCHIVE_SPOOL_SIZE = 8 * 1024 * 1024  # 写入压缩包前每个文件在内存中缓冲的最大字节数，超过时写入临时文件
+
+
+def is_archive_path(path):
+    """输出路径是否是压缩包"""
+    return path.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+# 处理顺序和内存预算：大文件先处理，按估算的内存占用决定同时处理哪些文件
+STREAM_JOB_MEMORY = 4 * TRANSCODE_BUFFER_SIZE  # 复制和流式转码的内存占用（读取块、解码后的文本、编码结果）
+PENDING_RESULT_MEMORY = ARCHIVE_SPOOL_SIZE  # 完成后等待按顺序提交的结果的内存占用（压缩包条目在内存中缓冲）
+WHOLE_FILE_TEXT_COPIES = 3  # 整文件转换同时持有的文本：解码、规范化、简繁转换后
+CONVERTER_MEMORY_FACTOR = {'opencc': 12, 'trie': 36}  # 简繁转换引擎的工作内存约为原文件大小的倍数（实测）
+STREAM_MEMORY_SHARE = 4  # 整文件转换的估算超过内存预算的 1/STREAM_MEMORY_SHARE 时改为按行分块流式转换
+
+
+def physical_memory():
+    """物理内存字节数，无法获取时返回 None"""
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def default_memory_budget():
+    """处理文件的内存预算：物理内存的 1/4，最多 1 GiB"""
+    memory = physical_memory()
+    return min(1024 ** 3, memory // 4) if memory else 256 * 1024 * 1024
+
+
+def estimate_job_memory(size, target_encoding=None, backend=None):
+    """估算处理一个文件的内存占用；target_encoding 为 None 表示复制或流式转码，backend 为简繁转换引擎。
+    整文件转换同时持有原始字节、几份文本（str 每字符最多 2 字节，按不超过原文件的 2 倍估算）和编码结果，
+    编码结果按目标编码表示中文的字节数相对双字节源编码放大"""
+    if target_encoding is None:
+        return STREAM_JOB_MEMORY
+    expansion = len('中文'.encode(bom_free_encoding(target_encoding))) / 4
+    factor = 1 + 2 * WHOLE_FILE_TEXT_COPIES + expansion + CONVERTER_MEMORY_FACTOR.get(backend, 0)
+    return int(size * factor)
+
+
+class DirectoryOutput:
+    """输出到目录 - 工作线程直接写入最终文件，不需要按顺序提交"""
+    in_place = False
+    supports_link = True
+    ordered = False
+
+    def __init__(self, root):
+        self.root = root
+    
+    def _prepare(self, relpath):
+        path = os.path.join(self.root, relpath)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            if os.lstat(path).st_nlink > 1:
+                # 重新输出到同一目录时，旧输出可能是重复内容的硬链接：先删除，不改写链接到同一文件的其他输出
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+        return path
+    
+    def create(self, relpath, size=None):
+        """创建输出文件，返回二进制写入的文件对象"""
+        return open(self._prepare(relpath), 'wb', buffering=TRANSCODE_BUFFER_SIZE)
+    
+    def finish(self, relpath, f, mtime):
+        """文件写完，返回需要按顺序提交的条目（目录输出不需要）"""
+        f.close()
+        return None
+    
+    def discard(self, relpath, f):
+        """写入失败，删除写了一半的文件"""
+        f.close()
+        path = os.path.join(self.root, relpath)
+        if os.path.exists(path):
+            os.remove(path)
+    
+    def copy(self, input_path, relpath):
+        """直接复制文件（保留修改时间）"""
+        shutil.copy2(input_path, self._prepare(relpath))
+        return None
+    
+    def link(self, source_relpath, relpath):
+        """输出与已写入的文件内容相同：依次尝试硬链接、reflink 和复制，返回使用的方式"""
+        source = os.path.join(self.root, source_relpath)
+        target = self._prepare(relpath)
+        if os.path.lexists(target):
+            os.remove(target)
+        try:
+            os.link(source, target)
+            return 'hardlink'
+        except OSError:
+            pass
+        if clone_file(source, target):
+            return 'reflink'
+        shutil.copy2(source, target)
+        return 'copy'
+    
+    def commit(self, entry):
+        pass
+    
+    def close(self):
+        pass
+
+
+class ArchiveOutput:
+    """输出到 zip / tar.gz 压缩包 - 处理线程按提交顺序调用 commit 写入压缩包。
+    提交顺序最前面的任务（之前的条目都已写入）直接写入压缩包：zip 边写边压缩，tar 的头部含大小，
+    只有预先知道输出大小时（整文件转换的结果）才能直接写入；其他任务的结果先写进临时缓冲
+    （较大的文件落到临时文件），等轮到时再提交。同时处理的文件数有上限，内存占用有界"""
+    in_place = False
+    ordered = True  # 需要知道提交顺序最前面的任务（见 set_head、start_task）
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if path.lower().endswith('.zip'):
+            self._zip = zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True)
+            self._tar = None
+        else:
+            self._zip = None
+            self._tar = tarfile.open(path, 'w:gz')
+        self.supports_link = self._tar is not None  # zip 没有链接条目
+        self._lock = threading.Lock()
+        self._head = None  # 提交顺序最前面的任务
+        self._task = threading.local()  # 工作线程正在处理的任务、输入的修改时间和大小
+        self._direct = None  # 正在直接写入的 (文件对象, 条目信息)
+    
+    def set_head(self, key):
+        """提交顺序最前面的任务变化（处理线程在它之前的条目都写入后调用）"""
+        with self._lock:
+            self._head = key
+    
+    def start_task(self, key, mtime, source_size):
+        """工作线程开始处理一个任务"""
+        self._task.key = key
+        self._task.mtime = mtime
+        self._task.source_size = source_size
+    
+    def create(self, relpath, size=None):
+        """size 为已知的输出大小；提交顺序最前面的任务直接写入压缩包，其他任务写入临时缓冲"""
+        key = getattr(self._task, 'key', None)
+        with self._lock:
+            direct = (key is not None and key == self._head and self._direct is None
+                      and (self._zip is not None or size is not None))
+            if not direct:
+                return tempfile.SpooledTemporaryFile(max_size=ARCHIVE_SPOOL_SIZE)
+            name = relpath.replace(os.sep, '/')
+            if self._zip is not None:
+                info = self._zip_info(name, self._task.mtime)
+                # 大小未知时按输入大小判断是否需要 zip64（每个输入字节最多产生一个字符，XML 字符引用最多 10 字节）
+                expected = size if size is not None else self._task.source_size * 16
+                f = self._zip.open(info, 'w', force_zip64=expected >= zipfile.ZIP64_LIMIT)
+            else:
+                info = self._tar_info(name, size, self._task.mtime)
+                f = TarEntryWriter(self._tar, info)
+            self._direct = (f, info)
+            return f
+    
+    def _zip_info(self, name, mtime):
+        info = zipfile.ZipInfo(name, time.localtime(max(mtime, 315532800))[:6])  # zip 时间从 1980 年开始
+        info.compress_type = zipfile.ZIP_DEFLATED
+        info.external_attr = 0o644 << 16
+        return info
+    
+    def _tar_info(self, name, size, mtime):
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mtime = mtime
+        info.mode = 0o644
+        return info
+    
+    def finish(self, relpath, f, mtime):
+        if self._direct is not None and f is self._direct[0]:
+            # 已经直接写入压缩包，不需要提交
+            f.close()
+            self._direct = None
+            return None
+        return (relpath, None, f, mtime)
+    
+    def discard(self, relpath, f):
+        if self._direct is None or f is not self._direct[0]:
+            f.close()
+            return
+        info = self._direct[1]
+        self._direct = None
+        if self._zip is None:
+            f.close()  # tar 流不能回退，不足的内容用 NUL 补齐（只在写输出失败时发生）
+            return
+        # 直接写入的 zip 条目写了一半：关闭后截断到条目开头，从目录中删除
+        try:
+            f.close()
+        except Exception:
+            pass
+        if self._zip.NameToInfo.get(info.filename) is info:
+            del self._zip.NameToInfo[info.filename]
+            self._zip.filelist.remove(info)
+        self._zip.fp.seek(info.header_offset)
+        self._zip.fp.truncate()
+        self._zip.start_dir = info.header_offset
+    
+    def copy(self, input_path, relpath):
+        # 复制的文件在提交时直接从磁盘读入压缩包，不需要缓冲
+        return (relpath, input_path, None, None)
+    
+    def commit(self, entry):
+        """把一个文件写入压缩包（只在处理线程中按顺序调用）"""
+        relpath, input_path, buffer, mtime = entry
+        name = relpath.replace(os.sep, '/')
+        if buffer is None:
+            if self._zip is not None:
+                self._zip.write(input_path, name)
+            else:
+                self._tar.add(input_path, name, recursive=False)
+            return
+        
+        try:
+            size = buffer.tell()
+            buffer.seek(0)
+            if self._zip is not None:
+                with self._zip.open(self._zip_info(name, mtime), 'w', force_zip64=size >= zipfile.ZIP64_LIMIT) as target:
+                    shutil.copyfileobj(buffer, target, TRANSCODE_BUFFER_SIZE)
+            else:
+                self._tar.addfile(self._tar_info(name, size, mtime), buffer)
+        finally:
+            buffer.close()
+    
+    def link(self, source_relpath, relpath):
+        """内容与已写入的条目相同：写入 tar 硬链接条目（只在处理线程中按顺序调用）"""
+        info = tarfile.TarInfo(relpath.replace(os.sep, '/'))
+        info.type = tarfile.LNKTYPE
+        info.linkname = source_relpath.replace(os.sep, '/')
+        info.mode = 0o644
+        info.mtime = time.time()
+        self._tar.addfile(info)
+        return 'hardlink'
+    
+    def close(self):
+        if self._zip is not None:
+            self._zip.close()
+        else:
+            self._tar.close()
+
+
+class TarEntryWriter:
+    """直接写入 tar 压缩流的条目（大小预先确定）：先写头部，内容边写边压缩，关闭时补齐到块大小"""
+
+    def __init__(self, tar, info):
+        self._tar = tar
+        self._size = info.size
+        self._written = 0
+        header = info.tobuf(tar.format, tar.encoding, tar.errors)
+        tar.fileobj.write(header)
+        tar.offset += len(header)
+        tar.members.append(info)
+    
+    def write(self, data):
+        if self._written + len(data) > self._size:
+            raise ValueError("写入的内容超过 tar 条目的大小")
+        self._tar.fileobj.write(data)
+        self._written += len(data)
+        return len(data)
+    
+    def close(self):
+        if self._tar is None:
+            return
+        blocks, remainder = divmod(self._size, tarfile.BLOCKSIZE)
+        padding = self._size - self._written + (tarfile.BLOCKSIZE - remainder if remainder else 0)
+        self._tar.fileobj.write(tarfile.NUL * padding)
+        self._tar.offset += (blocks + (1 if remainder else 0)) * tarfile.BLOCKSIZE
+        self._tar = None
+
+
+# 原地转换的撤销记录（位于输入目录下，扫描时跳过）
+UNDO_DIR_NAME = '.convertcn_undo'
+UNDO_LOG_NAME = 'undo.jsonl'
+UNDO_LOG_VERSION = 1
+
+
+class InPlaceOutput:
+    """原地改写 - 新内容先写入同一目录的临时文件，提交时按顺序把原文件硬链接（不支持时复制）到撤销目录、
+    追加一行撤销日志，再用 rename 原子替换原文件；保留原文件的权限，可选保留修改时间"""
+    in_place = True
+    supports_link = False  # 每个文件各自原地改写，不能合并为链接
+    ordered = False
+
+    def __init__(self, root, preserve_mtime=True, tag=''):
+        self.root = root
+        self.preserve_mtime = preserve_mtime
+        self._temp_paths = {}
+        self._count = 0
+        
+        # tag 区分同时运行的分片，避免在共享目录中创建同名的撤销目录
+        base = os.path.join(root, UNDO_DIR_NAME, time.strftime('%Y%m%d-%H%M%S') + (f'-{tag}' if tag else ''))
+        self.undo_dir = base
+        suffix = 1
+        while os.path.exists(self.undo_dir):
+            suffix += 1
+            self.undo_dir = f"{base}-{suffix}"
+        os.makedirs(self.undo_dir)
+        self._log = open(os.path.join(self.undo_dir, UNDO_LOG_NAME), 'w', encoding='utf-8')
+        self._log.write(json.dumps({'version': UNDO_LOG_VERSION, 'root': os.path.abspath(root)},
+                                   ensure_ascii=False) + '\n')
+        self._log.flush()
+    
+    def create(self, relpath, size=None):
+        path = os.path.join(self.root, relpath)
+        fd, temp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp',
+                                         dir=os.path.dirname(path))
+        self._temp_paths[relpath] = temp_path
+        return os.fdopen(fd, 'wb', buffering=TRANSCODE_BUFFER_SIZE)
+    
+    def finish(self, relpath, f, mtime):
+        """临时文件写完：刷新到磁盘并设置与原文件相同的权限（和修改时间）"""
+        f.flush()
+        os.fsync(f.fileno())
+        f.close()
+        temp_path = self._temp_paths.pop(relpath)
+        stat = os.stat(os.path.join(self.root, relpath))
+        os.chmod(temp_path, stat.st_mode & 0o7777)
+        if self.preserve_mtime:
+            os.utime(temp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        return (relpath, temp_path)
+    
+    def discard(self, relpath, f):
+        f.close()
+        temp_path = self._temp_paths.pop(relpath, None)
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+    
+    def copy(self, input_path, relpath):
+        # 不需要改写的文件保持原样，不读取也不复制
+        return None
+    
+    def commit(self, entry):
+        """备份原文件、记录撤销日志后替换原文件（只在处理线程中按顺序调用）"""
+        relpath, temp_path = entry
+        path = os.path.join(self.root, relpath)
+        try:
+            self._count += 1
+            backup = f"{self._count:06d}"
+            backup_path = os.path.join(self.undo_dir, backup)
+            try:
+                # 替换后原文件的 inode 只被撤销目录引用，不需要复制内容
+                os.link(path, backup_path)
+            except OSError:
+                shutil.copy2(path, backup_path)
+            self._log.write(json.dumps({'path': relpath, 'backup': backup}, ensure_ascii=False) + '\n')
+            self._log.flush()
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+    
+    def close(self):
+        self._log.close()
+        for temp_path in self._temp_paths.values():
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        if self._count == 0:
+            # 没有改写任何文件，不保留撤销记录
+            remove_undo_dir(self.undo_dir)
+            self.undo_dir = None
+
+
+def remove_undo_dir(undo_dir):
+    """删除一次运行的撤销目录（撤销目录的上级为空时一并删除）"""
+    shutil.rmtree(undo_dir, ignore_errors=True)
+    parent = os.path.dirname(undo_dir)
+    if os.path.isdir(parent) and not os.listdir(parent):
+        os.rmdir(parent)
+
+
+def find_undo_runs(root):
+    """输入目录下保存的原地转换撤销记录，按时间从旧到新排列"""
+    undo_root = os.path.join(root, UNDO_DIR_NAME)
+    if not os.path.isdir(undo_root):
+        return []
+    return [os.path.join(undo_root, name) for name in sorted(os.listdir(undo_root))
+            if os.path.isfile(os.path.join(undo_root, name, UNDO_LOG_NAME))]
+
+
+def rollback_in_place(undo_dir):
+    """按撤销日志从后往前把原地改写过的文件恢复为原文件，返回恢复的文件数"""
+    with open(os.path.join(undo_dir, UNDO_LOG_NAME), 'r', encoding='utf-8') as f:
+        header = json.loads(f.readline())
+        if header.get('version') != UNDO_LOG_VERSION:
+            raise ValueError(f"不支持的撤销日志版本: {header.get('version')}")
+        entries = [json.loads(line) for line in f if line.strip()]
+    
+    restored = 0
+    for entry in reversed(entries):
+        backup_path = os.path.join(undo_dir, entry['backup'])
+        if os.path.exists(backup_path):
+            os.replace(backup_path, os.path.join(header['root'], entry['path']))
+            restored += 1
+    remove_undo_dir(undo_dir)
+    return restored
+
+
+# 可以作为输入的压缩包
+INPUT_ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
 
-# 版本信息
-VERSION = "1.4.1"
-BUILD_DATE = "2025-07"
-AUTHOR = "SaberOnGo"
+def strip_archive_extension(name):
+    """去掉压缩包扩展名（sdk.tar.gz → sdk）"""
+    lower = name.lower()
+    for ext in sorted(INPUT_ARCHIVE_EXTENSIONS, key=len, reverse=True):
+        if lower.endswith(ext):
+            return name[:-len(ext)]
+    return name
+
+
+class MemberStream:
+    """流式读取的压缩包成员 - 关闭时调用 on_close（通知顺序读取的 tar 继续读取下一个成员，或关闭单独的句柄）"""
+
+    def __init__(self, f, on_close=None):
+        self._file = f
+        self._on_close = on_close
+    
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+    
+    def seekable(self):
+        # 只按顺序读取（流模式的 tarfile 成员调用 seekable 会出错）
+        return False
+    
+    def close(self):
+        self._file.close()
+        on_close, self._on_close = self._on_close, None
+        if on_close is not None:
+            on_close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ArchiveInput:
+    """压缩包输入 - 把 zip / tar 中的文件当作输入目录下的虚拟文件（路径为 压缩包路径/成员路径），不解压到磁盘。
+    zip 通过中央目录随机读取成员；tar 在扫描和处理时各顺序读取一遍，
+    顺序读出的成员通过 prefetch 交给随后打开它的线程：小成员读入内存，大成员直接交出 tar 流，
+    读完关闭后才继续读取下一个成员"""
+
+    def __init__(self, path):
+        self.path = path
+        self.is_zip = zipfile.is_zipfile(path)
+        self.members = {}  # 虚拟路径 -> (成员名, 大小, 修改时间)
+        self._prefetched = {}
+        self._streaming = None  # 已交出 tar 流的成员读完（关闭）时设置的事件
+        self._lock = threading.Lock()
+        self._handle = None
+        self._progress = 0.0
+        if self.is_zip:
+            self._handle = zipfile.ZipFile(path)
+            for info in self._handle.infolist():
+                file_path = self.member_path(info.filename)
+                if file_path and not info.is_dir():
+                    self.members[file_path] = (info.filename, info.file_size,
+                                               time.mktime(info.date_time + (0, 0, -1)))
+        else:
+            tarfile.open(path, 'r:*').close()  # 不是有效的 tar 文件时报错
+    
+    def member_path(self, name):
+        """成员名对应的虚拟路径，绝对路径或包含 .. 的成员返回 None"""
+        parts = [part for part in name.replace('\\', '/').split('/') if part not in ('', '.')]
+        if not parts or '..' in parts or name.startswith('/'):
+            return None
+        return os.path.join(self.path, *parts)
+    
+    def progress(self):
+        """iter_members 的遍历进度 (0~1)"""
+        return self._progress
+    
+    def iter_members(self, wanted=None):
+        """按压缩包中的顺序遍历文件成员，返回 (虚拟路径, 大小, 文件对象或 None)。
+        tar 只遍历一遍，wanted(虚拟路径) 为真的成员返回可读的文件对象，只在下次迭代前有效；
+        zip 可以随时用 open 读取，总是返回 None"""
+        if self.is_zip:
+            for i, (file_path, (name, size, mtime)) in enumerate(list(self.members.items())):
+                self._progress = (i + 1) / len(self.members)
+                yield file_path, size, None
+            return
+        
+        with open(self.path, 'rb') as raw, tarfile.open(fileobj=raw, mode='r|*') as tar:
+            total = os.fstat(raw.fileno()).st_size or 1
+            for member in tar:
+                self._progress = min(raw.tell() / total, 1.0)
+                file_path = self.member_path(member.name)
+                if not member.isfile() or file_path is None:
+                    continue
+                self.members[file_path] = (member.name, member.size, member.mtime)
+                if wanted is not None and wanted(file_path):
+                    yield file_path, member.size, tar.extractfile(member)
+                    self._wait_stream()
+                else:
+                    yield file_path, member.size, None
+    
+    def prefetch(self, file_path, f, size):
+        """把顺序读出的成员交给下一次 open：小成员读入内存；大成员直接交出 tar 流（不写临时文件），
+        iter_members 等到它被读完关闭或 release 后才继续。zip 格式的文档需要随机读取，总是读入内存"""
+        if size > ARCHIVE_SPOOL_SIZE and not file_path.lower().endswith(('.docx', '.odt')):
+            done = threading.Event()
+            buffer = MemberStream(f, done.set)
+            self._streaming = done
+        else:
+            buffer = io.BytesIO(f.read())
+        with self._lock:
+            old = self._prefetched.pop(file_path, None)
+            self._prefetched[file_path] = buffer
+        if old is not None:
+            old.close()
+    
+    def _wait_stream(self):
+        """等待交出的 tar 流读完，之后才能移动到下一个成员"""
+        done, self._streaming = self._streaming, None
+        if done is not None:
+            done.wait()
+    
+    def release(self, file_path=None):
+        """丢弃没有被读取的预读内容"""
+        with self._lock:
+            if file_path is None:
+                buffers = list(self._prefetched.values())
+                self._prefetched.clear()
+            else:
+                buffers = [self._prefetched.pop(file_path)] if file_path in self._prefetched else []
+        for buffer in buffers:
+            buffer.close()
+    
+    def open(self, file_path):
+        """以二进制方式打开成员"""
+        with self._lock:
+            buffer = self._prefetched.pop(file_path, None)
+        if buffer is not None:
+            return buffer
+        name, size, mtime = self.members[file_path]
+        if self.is_zip:
+            return self._handle.open(name)
+        # tar 随机读取（预览、交出的 tar 流已读完后再次打开等）：压缩的 tar 需要从头解压到成员位置，较慢
+        if size > ARCHIVE_SPOOL_SIZE:
+            # 大成员用单独的句柄流式读取，不读入内存
+            tar = tarfile.open(self.path, 'r:*')
+            return MemberStream(tar.extractfile(name), tar.close)
+        with self._lock:
+            if self._handle is None:
+                self._handle = tarfile.open(self.path, 'r:*')
+            return io.BytesIO(self._handle.extractfile(name).read())
+    
+    def stat(self, file_path):
+        """成员的 (大小, 修改时间)"""
+        name, size, mtime = self.members[file_path]
+        return size, mtime
+    
+    def close(self):
+        self.release()
+        if self._handle is not None:
+            self._handle.close()
+
+
+# 大文件分块并行简繁转换设置
+PARALLEL_CONVERT_MIN_CHARS = 2000000   # 超过该字符数的文本才分块并行转换
+PARALLEL_CONVERT_CHUNK_CHARS = 500000  # 每块的目标字符数
+
+# 候选的切分字符：OpenCC 的句子分隔符（与 OpenCC PhraseExtract.cpp 一致）。
+# 个别词条含有其中的字符（如 STPhrases 的“菲利克斯．米达麦亚”），实际使用的分隔符由 chunk_boundary_pattern 按词典筛选
+CHUNK_SEPARATORS = '-,.?!*　，。、；：？！…“”‘’『』「」﹁﹂—－（）《》〈〉～．／＼︒︑︔︓︿﹀︹︺︙︐［﹇］﹈︕︖︰︳︴︽︾︵︶｛︷｝︸﹃﹄【︻】︼'
+
+_chunk_boundary_patterns = {}
+
+
+def chunk_boundary_pattern(config):
+    """配置的所有词典词条中都不出现的分隔符（含空白）组成的正则，在其后切分不会拆开任何词组匹配；
+    无法读取词典时返回 None（只在换行处切分）"""
+    if config in _chunk_boundary_patterns:
+        return _chunk_boundary_patterns[config]
+    
+    separators = set(CHUNK_SEPARATORS)
+    whitespace = True
+    try:
+        for group in opencc_dictionary_files(config):
+            for source in group:
+                for key in read_opencc_dictionary(source):
+                    separators.difference_update(key)
+                    if whitespace and any(char.isspace() for char in key):
+                        whitespace = False
+    except (ImportError, OSError, ValueError):
+        pattern = None
+    else:
+        characters = ''.join(re.escape(char) for char in sorted(separators))
+        if whitespace:
+            characters += r'\s'
+        pattern = re.compile(f'[{characters}]')
+    _chunk_boundary_patterns[config] = pattern
+    return pattern
+
+
+def split_text_chunks(text, chunk_chars=PARALLEL_CONVERT_CHUNK_CHARS, boundary=None):
+    """在安全边界处把文本切成约 chunk_chars 个字符的块，优先在换行处切分，其次在 boundary 匹配的分隔符处"""
+    chunks = []
+    start = 0
+    length = len(text)
+    while length - start > chunk_chars:
+        target = start + chunk_chars
+        end = text.find('\n', target, target + chunk_chars)
+        if end < 0:
+            # 附近没有换行，在之后第一个分隔符处切分
+            match = boundary.search(text, target) if boundary is not None else None
+            if not match:
+                break
+            end = match.start()
+        chunks.append(text[start:end + 1])
+        start = end + 1
+    chunks.append(text[start:])
+    return chunks
+
+
+_chunk_converters = {}
+
+
+def _convert_chunk(backend, config, chunk):
+    """进程池中转换一个文本块（每个子进程只加载一次词典）"""
+    converter = _chunk_converters.get((backend, config))
+    if converter is None:
+        converter = create_converter(backend, config)
+        _chunk_converters[(backend, config)] = converter
+    return converter.convert(chunk)
+
+
+class ParallelConverter:
+    """大文件分块并行简繁转换 - 在进程池中转换各块，再按原顺序拼接"""
+
+    def __init__(self, max_workers=None, min_chars=PARALLEL_CONVERT_MIN_CHARS,
+                 chunk_chars=PARALLEL_CONVERT_CHUNK_CHARS):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.min_chars = min_chars
+        self.chunk_chars = chunk_chars
+        self._pool = None
+        self._lock = threading.Lock()
+    
+    def convert(self, backend, config, text, converter):
+        """转换文本；文本较小或只有一个 CPU 时直接用 converter 串行转换"""
+        if self.max_workers < 2 or len(text) < self.min_chars:
+            return converter.convert(text)
+        
+        chunks = split_text_chunks(text, self.chunk_chars, chunk_boundary_pattern(config))
+        if len(chunks) < 2:
+            return converter.convert(text)
+        
+        try:
+            return ''.join(self._get_pool().map(_convert_chunk, itertools.repeat(backend),
+                                                itertools.repeat(config), chunks))
+        except Exception:
+            # 进程池不可用（子进程启动失败或异常退出），退回串行转换
+            self.shutdown()
+            return converter.convert(text)
+    
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                # 用 spawn 启动子进程：进程池创建时已有 Tk、读取调度和处理线程，fork 多线程的进程时
+                # 子进程可能卡在其他线程持有的锁上（Python 3.12 起会警告）
+                import multiprocessing
+                self._pool = futures.ProcessPoolExecutor(max_workers=self.max_workers,
+                                                         mp_context=multiprocessing.get_context('spawn'))
+            return self._pool
+    
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+# 预览缓存设置
+PREVIEW_CACHE_SIZE = 32            # LRU 缓存最多保留的文件数
+PREVIEW_CACHE_MAX_CHARS = 20000000  # LRU 缓存最多保留的字符数（原文+转换结果）
+PREVIEW_PREFETCH_COUNT = 3         # 选中文件前后各预取的文件数
+
+
+class PreviewEngine:
+    """预览转换引擎 - 在后台线程中预取、转换文件，并用 LRU 缓存结果"""
+
+    def __init__(self, loader, on_ready=None, capacity=PREVIEW_CACHE_SIZE,
+                 max_chars=PREVIEW_CACHE_MAX_CHARS):
+        # loader(file_path, source_encoding, option) -> (原文, 转换结果)
+        self.loader = loader
+        # on_ready(key, entry) 在后台线程中调用
+        self.on_ready = on_ready
+        self.capacity = capacity
+        self.max_chars = max_chars
+        
+        self._cache = OrderedDict()
+        self._cache_chars = 0
+        self._pending = {}         # key -> 所属预取批次（None 表示立即请求）
+        self._lock = threading.Lock()
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._generation = 0       # 缓存失效时递增，丢弃旧任务的结果
+        self._prefetch_epoch = 0   # 每次新的预取请求递增，丢弃过时的预取任务
+        self._closed = False
+        
+        self._thread = threading.Thread(target=self._worker)
+        self._thread.daemon = True
+        self._thread.start()
+    
+    @staticmethod
+    def make_key(file_path, source_encoding, option):
+        """生成缓存键"""
+        return (file_path, source_encoding, option)
+    
+    def get(self, key):
+        """读取缓存，未命中返回 None"""
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache.move_to_end(key)
+            return entry
+    
+    def request(self, key):
+        """请求立即转换（最高优先级）"""
+        self._submit(key, 0, None)
+    
+    def prefetch(self, keys):
+        """预取一组文件，越靠前优先级越高；之前未完成的预取任务将被放弃"""
+        with self._lock:
+            self._prefetch_epoch += 1
+            epoch = self._prefetch_epoch
+        for distance, key in enumerate(keys, 1):
+            self._submit(key, distance, epoch)
+    
+    def invalidate(self):
+        """清空缓存并放弃所有未完成的任务（例如目标编码改变时）"""
+        with self._lock:
+            self._generation += 1
+            self._cache.clear()
+            self._cache_chars = 0
+            self._pending.clear()
+    
+    def shutdown(self):
+        """停止后台线程"""
+        self._closed = True
+        self.invalidate()
+        self._queue.put((-1, next(self._seq), None, None, None))
+    
+    def _submit(self, key, priority, epoch):
+        with self._lock:
+            if key in self._cache:
+                return
+            # 已在队列中的任务仍可以用更高优先级再次提交
+            if priority > 0 and key in self._pending and self._pending[key] in (None, epoch):
+                return
+            self._pending[key] = epoch
+            generation = self._generation
+        self._queue.put((priority, next(self._seq), generation, epoch, key))
+    
+    def _worker(self):
+        """后台转换线程"""
+        while True:
+            priority, _, generation, epoch, key = self._queue.get()
+            if self._closed:
+                return
+            
+            with self._lock:
+                if (generation != self._generation or key in self._cache or
+                        (epoch is not None and epoch != self._prefetch_epoch)):
+                    if key in self._pending and self._pending[key] == epoch:
+                        del self._pending[key]
+                    continue
+            
+            try:
+                content, converted = self.loader(*key)
+                entry = {'content': content, 'converted': converted}
+            except Exception as e:
+                entry = {'error': str(e)}
+            
+            with self._lock:
+                self._pending.pop(key, None)
+                if generation != self._generation:
+                    continue
+                self._store(key, entry)
+            
+            if self.on_ready:
+                self.on_ready(key, entry)
+    
+    def _store(self, key, entry):
+        """写入缓存并按容量淘汰最久未使用的条目（调用时需持有锁）"""
+        size = len(entry.get('content', '')) + len(entry.get('converted', ''))
+        self._cache[key] = entry
+        self._cache_chars += size
+        entry['chars'] = size
+        while len(self._cache) > 1 and (len(self._cache) > self.capacity or
+                                        self._cache_chars > self.max_chars):
+            _, old_entry = self._cache.popitem(last=False)
+            self._cache_chars -= old_entry['chars']
+
+
+class PreviewDiff:
+    """预览差异 - 按行惰性计算原文与转换结果的字符级差异及无法编码的字符"""
+
+    def __init__(self, before, after, target_encoding):
+        self.before_lines = before.split('\n')
+        self.after_lines = after.split('\n')
+        self.coverage = CodecCoverage.get(target_encoding)
+        self.check_encoding = not self.coverage.lossless
+        self._cache = {}
+        
+        # 简繁转换不会改变换行，通常行一一对应；否则按行对齐
+        self._line_map = None
+        self._after_map = None  # 原文行号 -> 转换后的行号（需要时由 _line_map 反推）
+        if len(self.before_lines) != len(self.after_lines):
+            self._line_map = [None] * len(self.after_lines)
+            matcher = difflib.SequenceMatcher(None, self.before_lines, self.after_lines, autojunk=False)
+            for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+                if tag == 'equal' or (tag == 'replace' and i2 - i1 == j2 - j1):
+                    for offset in range(j2 - j1):
+                        self._line_map[j1 + offset] = i1 + offset
+    
+    @property
+    def line_count(self):
+        return len(self.after_lines)
+    
+    def before_line_index(self, line):
+        """转换后第 line 行对应的原文行号，没有对应行时返回 None"""
+        if self._line_map is None:
+            return line
+        return self._line_map[line]
+    
+    def after_line_range(self, first, last):
+        """原文 [first, last) 行对应的转换后的行范围 [起始, 结束)，没有对应行时范围为空"""
+        if self._line_map is None:
+            return first, last
+        if self._after_map is None:
+            self._after_map = [None] * len(self.before_lines)
+            for after_line, before_line in enumerate(self._line_map):
+                if before_line is not None:
+                    self._after_map[before_line] = after_line
+        mapped = [line for line in self._after_map[max(first, 0):max(last, 0)] if line is not None]
+        if not mapped:
+            return 0, 0
+        return mapped[0], mapped[-1] + 1
+    
+    def line_diff(self, line):
+        """计算单行差异，返回 (原文变化区间, 转换后变化区间, 无法编码区间)"""
+        result = self._cache.get(line)
+        if result is not None:
+            return result
+        
+        after = self.after_lines[line]
+        before_line = self.before_line_index(line)
+        before_ranges = []
+        after_ranges = []
+        
+        if before_line is None:
+            # 整行都是新增内容
+            if after:
+                after_ranges.append((0, len(after)))
+        else:
+            before = self.before_lines[before_line]
+            if before == after:
+                pass
+            elif len(before) == len(after):
+                # 逐字转换，长度不变时按位置比较
+                start = None
+                for i, (a, b) in enumerate(zip(before, after)):
+                    if a != b:
+                        if start is None:
+                            start = i
+                    elif start is not None:
+                        before_ranges.append((start, i))
+                        start = None
+                if start is not None:
+                    before_ranges.append((start, len(after)))
+                after_ranges = list(before_ranges)
+            else:
+                matcher = difflib.SequenceMatcher(None, before, after, autojunk=False)
+                for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+                    if tag == 'equal':
+                        continue
+                    if i2 > i1:
+                        before_ranges.append((i1, i2))
+                    if j2 > j1:
+                        after_ranges.append((j1, j2))
+        
+        result = (before_ranges, after_ranges, self.coverage.find_unencodable(after))
+        self._cache[line] = result
+        return result
+    
+    def find_change(self, line, column, forward=True):
+        """从 (line, column) 开始查找下一处（或上一处）变化，返回 (行, 起始列, 结束列)"""
+        if forward:
+            lines = range(line, self.line_count)
+        else:
+            lines = range(line, -1, -1)
+        
+        for current in lines:
+            if not self.has_change(current):
+                continue
+            _, after_ranges, lossy_ranges = self.line_diff(current)
+            ranges = sorted(after_ranges + lossy_ranges)
+            if forward:
+                for start, end in ranges:
+                    if current > line or start > column:
+                        return current, start, end
+            else:
+                for start, end in reversed(ranges):
+                    if current < line or start < column:
+                        return current, start, end
+        return None
+    
+    def has_change(self, line):
+        """快速判断一行是否有变化或无法编码的字符"""
+        if line in self._cache:
+            _, after_ranges, lossy_ranges = self._cache[line]
+            return bool(after_ranges or lossy_ranges)
+        
+        after = self.after_lines[line]
+        before_line = self.before_line_index(line)
+        if before_line is None or self.before_lines[before_line] != after:
+            return True
+        return self.coverage.has_unencodable(after)
+
+
+# 分片执行：多台机器共享文件系统，各自处理输入的一部分，不需要协调服务
+SHARD_REPORT_VERSION = 1
+SHARD_MODES = {'hash': '按文件路径哈希', 'dir': '按所在目录'}
+DEFAULT_EXTENSIONS = ".c,.h,.cpp,.hpp,.cc,.cxx,.txt,.py,.java,.js,.html,.css,.xml,.json,.md,.sql,.ini,.cfg,.conf,.log,.csv,.tsv,.doc,.docx,.rtf,.odt"
+
+
+class Shard:
+    """输入的一个分片 - 按相对路径（或所在目录）的 crc32 确定地划分，
+    每台机器用相同的参数得到相同的划分，同一目录的文件在 'dir' 模式下属于同一分片"""
+
+    def __init__(self, index, count, by='hash'):
+        if count < 1 or not 1 <= index <= count:
+            raise ValueError(f"分片编号应在 1 到 {count} 之间: {index}")
+        if by not in SHARD_MODES:
+            raise ValueError(f"未知的分片方式: {by}")
+        self.index = index
+        self.count = count
+        self.by = by
+    
+    @classmethod
+    def parse(cls, text, by='hash'):
+        """解析 "K/N" 形式的分片参数（K 从 1 开始）"""
+        try:
+            index, count = (int(part) for part in text.split('/'))
+        except ValueError:
+            raise ValueError(f"分片参数应为 K/N 形式: {text}") from None
+        return cls(index, count, by)
+    
+    @property
+    def name(self):
+        return f"shard-{self.index:05d}-of-{self.count:05d}"
+    
+    def owns(self, relpath):
+        """相对路径对应的文件是否属于本分片"""
+        key = relpath.replace(os.sep, '/')
+        if self.by == 'dir':
+            key = key.rpartition('/')[0]
+        return zlib.crc32(key.encode('utf-8', 'surrogateescape')) % self.count == self.index - 1
+
+
+# 监视模式：输入目录有变化时只重新检测和转换受影响的文件
+WATCH_DEBOUNCE = 0.2  # 最后一个事件之后等待的静默时间（秒），期间的事件合并为一批处理
+WATCH_MAX_DELAY = 2.0  # 持续有事件时最多等待的时间（秒），之后即使还有事件也先处理
+WATCH_POLL_INTERVAL = 1.0  # 没有 inotify 时轮询输入目录的间隔（秒）
+WATCH_READ_SIZE = 64 * 1024
+INOTIFY_EVENT = struct.Struct('iIII')  # wd, mask, cookie, 文件名长度
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+INOTIFY_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+
+
+class InotifyWatcher:
+    """用 Linux inotify 监视目录树（通过 ctypes 调用 libc，不需要额外的依赖）。
+    每个子目录一个 watch，新建或移入的目录随即加入；poll 返回 (路径, 是否仍存在) 的事件列表，
+    事件队列溢出时返回根目录（需要重新对照整个目录）"""
+    backend = 'inotify'
+
+    def __init__(self, root):
+        self.root = root
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self._dirs = {}  # wd -> 目录
+        try:
+            self.add_tree(root)
+        except OSError:
+            self.close()
+            raise
+    
+    @property
+    def watched_dirs(self):
+        return len(self._dirs)
+    
+    def add_tree(self, directory):
+        """监视目录及其所有子目录（跳过撤销记录）"""
+        for path, dirs, filenames in os.walk(directory):
+            dirs[:] = [d for d in dirs if d != UNDO_DIR_NAME]
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), INOTIFY_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                if path == directory and error != errno.ENOENT:
+                    raise OSError(error, f"无法监视目录: {path}")
+                continue  # 子目录刚被删除
+            self._dirs[wd] = path
+    
+    def remove_tree(self, directory):
+        """不再监视目录及其子目录"""
+        prefix = directory + os.sep
+        for wd, path in list(self._dirs.items()):
+            if path == directory or path.startswith(prefix):
+                self._libc.inotify_rm_watch(self._fd, wd)
+                del self._dirs[wd]
+    
+    def poll(self, timeout):
+        """等待最多 timeout 秒，返回这段时间的事件"""
+        if not select.select([self._fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self._fd, WATCH_READ_SIZE)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = INOTIFY_EVENT.unpack_from(data, offset)
+            name = data[offset + INOTIFY_EVENT.size:offset + INOTIFY_EVENT.size + length].rstrip(b'\0')
+            offset += INOTIFY_EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                events.append((self.root, True))
+                continue
+            if mask & IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            directory = self._dirs.get(wd)
+            if directory is None or mask & IN_DELETE_SELF:
+                continue  # 目录自身被删除时父目录也会收到事件
+            if name == UNDO_DIR_NAME.encode():
+                continue
+            path = os.path.join(directory, os.fsdecode(name))
+            exists = not mask & (IN_MOVED_FROM | IN_DELETE)
+            if exists and mask & IN_ISDIR:
+                # 新目录：加入监视，目录中已有的文件由处理时展开
+                self.add_tree(path)
+            elif mask & IN_MOVED_FROM and mask & IN_ISDIR:
+                # 目录移出后原来的 watch 仍然有效，但路径已经不对
+                self.remove_tree(path)
+            events.append((path, exists))
+        return events
+    
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingWatcher:
+    """没有 inotify 时（Windows、macOS、watch 数量达到上限）定时遍历目录，比较各文件的修改时间和大小"""
+    backend = 'polling'
+
+    def __init__(self, root, interval=WATCH_POLL_INTERVAL):
+        self.root = root
+        self.interval = interval
+        self.watched_dirs = 0
+        self._snapshot = self._scan()
+        self._next = time.monotonic() + interval
+    
+    def _scan(self):
+        snapshot = {}
+        self.watched_dirs = 0
+        for path, dirs, filenames in os.walk(self.root):
+            dirs[:] = [d for d in dirs if d != UNDO_DIR_NAME]
+            self.watched_dirs += 1
+            for filename in filenames:
+                file_path = os.path.join(path, filename)
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue
+                snapshot[file_path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+    
+    def poll(self, timeout):
+        """到下一次轮询时遍历目录，返回与上次相比的变化；timeout 内不到轮询时间时返回空列表"""
+        wait = self._next - time.monotonic()
+        if wait > timeout:
+            time.sleep(max(timeout, 0))
+            return []
+        time.sleep(max(wait, 0))
+        self._next = time.monotonic() + self.interval
+        snapshot = self._scan()
+        events = [(path, True) for path, state in snapshot.items() if self._snapshot.get(path) != state]
+        events.extend((path, False) for path in self._snapshot if path not in snapshot)
+        self._snapshot = snapshot
+        return events
+    
+    def close(self):
+        pass
+
+
+def create_watcher(root, polling=False, interval=WATCH_POLL_INTERVAL):
+    """优先使用 inotify，不可用时改为轮询"""
+    if not polling and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(root)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(root, interval)
+
+
+def collect_watch_events(watcher, debounce=WATCH_DEBOUNCE, max_delay=WATCH_MAX_DELAY, timeout=None):
+    """等待第一个事件，再收集到静默 debounce 秒（或累计 max_delay 秒）为止，合并为一批：
+    返回 (变化的路径, 删除的路径, 第一个事件的时间)；timeout 秒内没有事件时返回 None。
+    同一路径的多个事件只保留最后一个"""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    events = []
+    while not events:
+        wait = 0.5 if deadline is None else min(0.5, deadline - time.monotonic())
+        if wait <= 0:
+            return None
+        events = watcher.poll(wait)
+    first = time.monotonic()
+    latest = dict(events)
+    quiet_until = first + debounce
+    while True:
+        wait = min(quiet_until, first + max_delay) - time.monotonic()
+        if wait <= 0:
+            break
+        events = watcher.poll(wait)
+        if events:
+            latest.update(events)
+            quiet_until = time.monotonic() + debounce
+    changed = {path for path, exists in latest.items() if exists}
+    removed = {path for path, exists in latest.items() if not exists}
+    return changed, removed, first
+
+
+def format_watch_status(status):
+    """监视模式每批处理后输出的一行状态"""
+    batch = status['last_batch']
+    return (f"[{time.strftime('%H:%M:%S')}] 第 {status['batches']} 批: "
+            f"转换 {batch['convert']}、复制 {batch['copy']}、删除 {batch['removed']}、失败 {batch['fail']}，"
+            f"处理 {batch['handle_ms']:.1f} ms，事件到完成 {batch['latency_ms']:.1f} ms")
+
+
+def format_scan_summary(report):
+    """扫描统计报告（界面和分片合并共用）"""
+    total_files = report['encoding_files'] + report['copy_files']
+    summary = f"扫描完成!\n\n"
+    summary += f"输入目录: {report['input']}\n"
+    summary += f"输出目录: {report['output']}\n"
+    summary += f"文件类型过滤: {report['extensions']}\n"
+    summary += f"输出编码: {report['output_encoding']}\n\n"
+    
+    summary += f"文件统计:\n"
+    summary += f"  总文件数: {total_files}\n"
+    summary += f"  需要编码处理: {report['encoding_files']} 个\n"
+    summary += f"  直接复制: {report['copy_files']} 个 ({format_size(report['copy_bytes'])})\n\n"
+    
+    binary = Counter(report['binary'])
+    if binary:
+        summary += (f"二进制文件: {sum(binary.values())} 个 "
+                    f"({', '.join(f'{name} {count}' for name, count in binary.most_common())})，"
+                    f"跳过编码检测，直接复制\n\n")
+    
+    stats = report['dedup']
+    if stats.get('files'):
+        summary += f"重复内容: {stats['files']} 个文件与其他文件内容相同，只检测和转换一次\n"
+        summary += (f"  唯一内容 {format_size(stats['unique_bytes'])} / 总计 {format_size(stats['total_bytes'])}，"
+                    f"节省检测时间约 {stats['detect_saved']:.2f} s\n\n")
+    
+    encoding_counter = Counter(report['encoding_counts'])
+    if encoding_counter:
+        summary += f"编码分布 (需要处理的文件):\n"
+        for encoding, count in encoding_counter.most_common():
+            summary += f"  {encoding}: {count} 个文件\n"
+    else:
+        summary += "需要编码处理的文件中未发现中文内容\n"
+    return summary
+
+
+def format_process_summary(report):
+    """处理完成报告（界面和分片合并共用）"""
+    counts = report['counts']
+    message = f"处理完成!\n\n"
+    message += f"输入目录: {report['input']}\n"
+    message += f"输出目录: {report['output_root']}\n"
+    message += f"文件类型过滤: {report['extensions']}\n"
+    message += f"输出编码: {report['target_name']}\n\n"
+    message += f"处理统计:\n"
+    message += f"  总文件数: {counts['total']}\n"
+    message += f"  成功处理: {counts['success']}\n"
+    message += f"  处理失败: {counts['fail']}\n"
+    message += f"  编码转换: {counts['convert']}\n"
+    if report['in_place']:
+        message += f"  未修改: {counts['encoding_copy']}\n"
+    else:
+        message += f"  编码文件复制: {counts['encoding_copy']}\n"
+        message += f"  其他文件复制: {counts['direct_copy']}\n"
+    
+    if counts['excluded_copy'] > 0:
+        message += f"  用户排除复制: {counts['excluded_copy']}\n"
+    
+    if report['opencc']:
+        message += f"\n简繁体转换: {'已启用' if counts['convert'] > 0 else '无需转换'}\n"
+    
+    # 换行符、BOM 和行尾空白的修改统计
+    normalized = report['normalize']
+    if normalized['files']:
+        message += f"\n规范化: {normalized['files']} 个文件有修改\n"
+        message += f"  换行符: {normalized['eol']} 处\n"
+        message += f"  行尾空白: {normalized['trailing']} 行\n"
+        message += f"  添加BOM: {normalized['bom_added']} 个文件\n"
+        message += f"  去除BOM: {normalized['bom_removed']} 个文件\n"
+    
+    dedup = report['dedup']
+    if dedup['links']:
+        methods = {'hardlink': '硬链接', 'reflink': 'reflink', 'copy': '复制'}
+        message += (f"\n重复内容: {sum(dedup['links'].values())} 个文件未重复转换 "
+                    f"({', '.join(f'{methods[m]} {n}' for m, n in dedup['links'].items())})，"
+                    f"{format_size(dedup['bytes'])}，节省约 {dedup['saved']:.2f} s\n")
+    
+    schedule = report['schedule']
+    if schedule.get('capacity'):
+        message += (f"\n并行效率: {schedule['busy'] / schedule['capacity']:.0%} "
+                    f"({schedule['workers']} 个线程，处理耗时合计 {schedule['busy']:.2f} s，用时 {schedule['wall']:.2f} s)\n")
+        message += f"  估算内存峰值: {format_size(schedule['peak_memory'])} / 预算 {format_size(schedule['budget'])}\n"
+        if schedule['chunked']:
+            message += f"  超出内存预算、分块流式转换: {schedule['chunked']} 个文件\n"
+    
+    if not report['in_place']:
+        message += f"\n所有文件已保存到输出目录:\n{report['output']}"
+    elif report['undo_dirs']:
+        message += f"\n已原地改写 {counts['convert']} 个文件，撤销记录:\n" + '\n'.join(report['undo_dirs'])
+    else:
+        message += "\n没有需要改写的文件"
+    return message
+
+
+def shard_report_path(directory, shard):
+    return os.path.join(directory, f"{shard.name}.jsonl")
+
+
+def write_jsonl(path, header, rows):
+    """写入 JSON Lines 文件：第一行为 header，其后每行一条记录。
+    先写临时文件再改名，读取方不会读到未写完的文件（分片报告和扫描计划共用）"""
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(header, ensure_ascii=False) + '\n')
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False) + '\n')
+    os.replace(temp_path, path)
+
+
+def read_shard_header(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        header = json.loads(f.readline())
+    if header.get('version') != SHARD_REPORT_VERSION:
+        raise ValueError(f"不支持的分片报告版本: {path}")
+    return header
+
+
+def merge_shard_reports(directory, merged_path=None):
+    """合并目录中的分片报告，检查分片齐全且设置一致，返回 (扫描统计, 处理统计)；
+    指定 merged_path 时把所有文件行按分片顺序写入合并后的报告"""
+    paths = sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                   if name.startswith('shard-') and name.endswith('.jsonl'))
+    if not paths:
+        raise ValueError(f"目录中没有分片报告: {directory}")
+    headers = [read_shard_header(path) for path in paths]
+    
+    first = headers[0]
+    count = first['shard']['count']
+    indexes = sorted(header['shard']['index'] for header in headers)
+    if indexes != list(range(1, count + 1)):
+        missing = sorted(set(range(1, count + 1)) - set(indexes))
+        duplicated = sorted({index for index in indexes if indexes.count(index) > 1})
+        raise ValueError(f"分片报告不完整: 共 {count} 个分片，缺少 {missing or '无'}，重复 {duplicated or '无'}")
+    for header in headers:
+        if header['shard']['by'] != first['shard']['by'] or header['settings'] != first['settings']:
+            raise ValueError(f"分片 {header['shard']['index']} 的设置与其他分片不一致")
+    
+    scan = dict(first['scan'], encoding_files=0, copy_files=0, copy_bytes=0,
+                encoding_counts=Counter(), dedup=Counter(), binary=Counter())
+    process = dict(first['process'], counts=Counter(), opencc=False, normalize=Counter(),
+                   dedup={'links': Counter(), 'bytes': 0, 'saved': 0.0}, undo_dirs=[],
+                   schedule=dict(first['process']['schedule'], workers=0, busy=0.0, wall=0.0, capacity=0.0,
+                                 peak_memory=0, chunked=0))
+    for header in headers:
+        for key in ('encoding_files', 'copy_files', 'copy_bytes'):
+            scan[key] += header['scan'][key]
+        scan['encoding_counts'].update(header['scan']['encoding_counts'])
+        scan['dedup'].update(header['scan']['dedup'])  # 去重只在各分片内进行，统计直接相加
+        scan['binary'].update(header['scan']['binary'])
+        
+        shard_process = header['process']
+        process['counts'].update(shard_process['counts'])
+        process['opencc'] = process['opencc'] or shard_process['opencc']
+        process['normalize'].update(shard_process['normalize'])
+        process['dedup']['links'].update(shard_process['dedup']['links'])
+        process['dedup']['bytes'] += shard_process['dedup']['bytes']
+        process['dedup']['saved'] += shard_process['dedup']['saved']
+        process['undo_dirs'].extend(shard_process['undo_dirs'])
+        # 各分片同时在不同的机器上运行：线程数和处理耗时相加，用时和内存峰值取最大值
+        schedule = process['schedule']
+        for key in ('workers', 'busy', 'chunked'):
+            schedule[key] += shard_process['schedule'][key]
+        for key in ('wall', 'peak_memory'):
+            schedule[key] = max(schedule[key], shard_process['schedule'][key])
+        schedule['capacity'] = schedule['wall'] * schedule['workers']
+    
+    if merged_path:
+        def merged_rows():
+            for path in paths:
+                with open(path, 'r', encoding='utf-8') as f:
+                    f.readline()
+                    for line in f:
+                        yield json.loads(line)
+        header = dict(first, shard={'index': 0, 'count': count, 'by': first['shard']['by']},
+                      scan=scan, process=process)
+        write_jsonl(merged_path, header, merged_rows())
+    return scan, process
+
+
+# 扫描计划：保存扫描结果、用户排除和输出设置，之后不重新扫描即可处理（界面或批处理）
+PLAN_FORMAT = 'convertcn-plan'
+PLAN_VERSION = 1
+PLAN_EXTENSION = '.plan.jsonl'
+
+
+def encode_plan_tests(encodings_test):
+    """编码测试结果压缩为 编码 -> 标志：'x' 解码失败，'o' 解码成功，其后 'c' 含中文、'm' 有乱码"""
+    tests = {}
+    for encoding, test in encodings_test.items():
+        if not test.get('success', False):
+            tests[encoding] = 'x'
+        else:
+            tests[encoding] = 'o' + ('c' if test.get('has_chinese') else '') + ('m' if test.get('has_mojibake') else '')
+    return tests
+
+
+def decode_plan_tests(tests):
+    result = {}
+    for encoding, flags in tests.items():
+        if flags == 'x':
+            result[encoding] = {'success': False, 'error': True}
+        else:
+            result[encoding] = {'success': True, 'has_chinese': 'c' in flags, 'has_mojibake': 'm' in flags}
+    return result
+
+
+def read_plan(path):
+    """读取扫描计划，返回 (header, 记录迭代器)；记录按需逐行解析，适合数百万个文件"""
+    f = open(path, 'r', encoding='utf-8')
+    try:
+        header = json.loads(f.readline())
+    except ValueError:
+        f.close()
+        raise ValueError(f"不是有效的扫描计划: {path}") from None
+    if header.get('format') != PLAN_FORMAT:
+        f.close()
+        raise ValueError(f"不是有效的扫描计划: {path}")
+    if header.get('version') != PLAN_VERSION:
+        f.close()
+        raise ValueError(f"不支持的扫描计划版本: {header.get('version')}")
+    
+    def records():
+        with f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    return header, records()
 
-# 输出编码选项
-OUTPUT_ENCODINGS = {
-    "简体GB18030": {
-        "encoding": "gb18030",
-        "charset": "simplified",
-        "name": "简体GB18030"
-    },
-    "简体GB2312": {
-        "encoding": "gb2312", 
-        "charset": "simplified",
-        "name": "简体GB2312"
-    },
-    "简体UTF-8": {
-        "encoding": "utf-8",
-        "charset": "simplified", 
-        "name": "简体UTF-8"
-    },
-    "繁体BIG5": {
-        "encoding": "big5",
-        "charset": "traditional",
-        "name": "繁体BIG5"
-    },
-    "繁体UTF-8": {
-        "encoding": "utf-8",
-        "charset": "traditional",
-        "name": "繁体UTF-8"
-    },
-    "简体GBK": {
-        "encoding": "gbk",
-        "charset": "simplified",
-        "name": "简体GBK"
-    },
-    "UTF-8(无BOM)": {
-        "encoding": "utf-8",
-        "charset": "auto",
-        "name": "UTF-8(无BOM)"
-    },
-    "UTF-8(带BOM)": {
-        "encoding": "utf-8-sig",
-        "charset": "auto", 
-        "name": "UTF-8(带BOM)"
-    }
-}
 
 class EncodingUnifierGUI:
     def __init__(self, root):
@@ -75,30 +2909,74 @@ class EncodingUnifierGUI:
         self.root.title(f"文件编码统一工具 v{VERSION}")
         self.root.geometry("1300x900")
         
-        self.input_path = tk.StringVar()
-        self.output_path = tk.StringVar()
-        self.file_extensions_var = tk.StringVar(value=".c,.h,.cpp,.hpp,.cc,.cxx,.txt,.py,.java,.js,.html,.css,.xml,.json,.md,.sql,.ini,.cfg,.conf,.log,.csv,.tsv,.doc,.docx,.rtf,.odt")
-        self.output_encoding_var = tk.StringVar(value="简体GB18030")
+        self.init_state(tk)
+        self.setup_ui()
         
-        self.encoding_results = {}
-        self.copy_files = {}  # 存储需要直接复制的文件
+        # 目标编码或简繁转换引擎改变时，预览缓存失效
+        self.output_encoding_var.trace_add('write', self.on_output_encoding_changed)
+        self.converter_backend_var.trace_add('write', self.on_converter_backend_changed)
+    
+    def init_state(self, variables):
+        """初始化设置和结果（variables 提供 StringVar 等变量类型：tkinter 或批处理时的 BatchVariables）"""
+        self.input_path = variables.StringVar()
+        self.output_path = variables.StringVar()
+        self.file_extensions_var = variables.StringVar(value=DEFAULT_EXTENSIONS)
+        self.output_encoding_var = variables.StringVar(value="简体GB18030")
+        
+        self.encoding_results = ScanResultStore()
+        self.copy_files = FileInfoStore()  # 存储需要直接复制的文件
+        
+        # 文件列表的排序、过滤和已显示到的行号
+        self.encoding_sort = None
+        self.copy_sort = None
+        self.encoding_status_filter = variables.StringVar(value="全部")
+        self.encoding_encoding_filter = variables.StringVar(value="全部")
+        self.encoding_view_synced = 0
+        self.copy_view_synced = 0
         self.excluded_files = set()  # 存储用户排除的文件
         self.processed_files = []
         
         # 预览窗口相关
         self.preview_window = None
         self.preview_excluded_files = set()  # 预览窗口中排除的文件
-        
-        # 导入简繁转换模块（如果可用）
-        self.has_opencc = False
-        try:
-            import opencc
-            self.opencc = opencc
-            self.has_opencc = True
-        except ImportError:
-            pass
-        
-        self.setup_ui()
+        self.preview_engine = None  # 预览转换引擎（后台预取 + LRU 缓存）
+        self.preview_diff = None  # 当前预览文件的差异信息
+        self.preview_diff_generation = 0
+        
+        # 编码兼容性检查（目标编码无法表示的字符）
+        self.error_policy_var = variables.StringVar(value=ERROR_POLICIES["fail"]["name"])
+        self.error_policies = {}  # 单个文件的处理策略 file_path -> 策略
+        self.lossy_report = None  # 最近一次检查结果
+        self.lossy_analysis_generation = 0
+        self.fallback_files = {}  # 处理时实际改用后备编码的文件
+        
+        # 换行符、BOM 和行尾空白的规范化
+        self.eol_policy_var = variables.StringVar(value=EOL_POLICIES["preserve"]["name"])
+        self.bom_policy_var = variables.StringVar(value=BOM_POLICIES["auto"]["name"])
+        self.trim_trailing_var = variables.BooleanVar(value=False)
+        self.scan_concurrency_var = variables.IntVar(value=SCAN_READ_CONCURRENCY)  # 扫描时同时在途的读取数
+        self.dedup_var = variables.BooleanVar(value=True)  # 内容相同的文件只检测和转换一次
+        self.in_place_var = variables.BooleanVar(value=False)  # 原地转换：只改写需要转换的文件
+        self.preserve_mtime_var = variables.BooleanVar(value=True)
+        self.normalize_stats = {}  # 处理时每个文件的规范化统计
+        self.input_archive = None  # 输入为压缩包时的 ArchiveInput
+        self.last_undo_dir = None  # 最近一次原地转换的撤销记录
+        self.duplicate_of = {}  # 内容与之前的文件相同的编码文件 -> 那个文件
+        self.dedup_stats = {}  # 扫描时的去重统计
+        self.dedup_links = Counter()  # 处理时链接重复输出的方式计数
+        self.binary_formats = Counter()  # 扫描时嗅探为二进制、直接复制的文件的格式计数
+        
+        # 简繁转换模块（如果可用）只检查是否安装，首次转换时才导入
+        self.has_opencc = importlib.util.find_spec('opencc') is not None
+        self.opencc_converters = {}  # 已加载词典的转换器缓存 (引擎, 配置) -> (实际引擎, 转换器)
+        self.converter_backend_var = variables.StringVar(value=CONVERTER_BACKENDS['opencc'])
+        self.parallel_converter = ParallelConverter()  # 大文件分块并行转换
+        self.shard = None  # 分片执行时只处理属于本分片的文件
+        self.pipeline_buffers = {}  # 扫描并转换时已读出、等待转换的文件内容
+        self.input_opener = open  # 打开输入文件（与 ReadScheduler 的 opener 相同）
+        self.memory_budget = default_memory_budget()  # 同时处理的文件估算内存占用的上限
+        self.chunked_files = set()  # 整文件转换超出内存预算、改为按行分块流式转换的文件
+        self.schedule_stats = {}  # 处理时的调度统计（并行效率、内存峰值）
         
     def setup_ui(self):
         """设置用户界面"""
@@ -114,19 +2992,24 @@ class EncodingUnifierGUI:
         settings_frame.grid(row=0, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
         
         # 输入目录
-        ttk.Label(settings_frame, text="输入目录 (A):").grid(row=0, column=0, sticky=tk.W, pady=(0, 5))
+        ttk.Label(settings_frame, text="输入目录或压缩包 (A):").grid(row=0, column=0, sticky=tk.W, pady=(0, 5))
         input_frame = ttk.Frame(settings_frame)
         input_frame.grid(row=1, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
         ttk.Entry(input_frame, textvariable=self.input_path, width=80).grid(row=0, column=0, padx=(0, 5))
         ttk.Button(input_frame, text="浏览", command=self.browse_input_directory).grid(row=0, column=1)
+        ttk.Button(input_frame, text="压缩包", command=self.browse_input_archive).grid(row=0, column=2, padx=(5, 0))
         
         # 输出目录
-        ttk.Label(settings_frame, text="输出目录 (B):").grid(row=2, column=0, sticky=tk.W, pady=(0, 5))
+        ttk.Label(settings_frame, text="输出目录或压缩包 (B):").grid(row=2, column=0, sticky=tk.W, pady=(0, 5))
         output_frame = ttk.Frame(settings_frame)
         output_frame.grid(row=3, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
         ttk.Entry(output_frame, textvariable=self.output_path, width=80).grid(row=0, column=0, padx=(0, 5))
         ttk.Button(output_frame, text="浏览", command=self.browse_output_directory).grid(row=0, column=1)
-        ttk.Button(output_frame, text="自动设置", command=self.auto_set_output).grid(row=0, column=2, padx=(5, 0))
+        ttk.Button(output_frame, text="压缩包", command=self.browse_output_archive).grid(row=0, column=2, padx=(5, 0))
+        ttk.Button(output_frame, text="自动设置", command=self.auto_set_output).grid(row=0, column=3, padx=(5, 0))
+        ttk.Checkbutton(output_frame, text="原地转换", variable=self.in_place_var).grid(row=0, column=4, padx=(10, 0))
+        ttk.Checkbutton(output_frame, text="保留修改时间", variable=self.preserve_mtime_var).grid(row=0, column=5, padx=(5, 0))
+        ttk.Button(output_frame, text="撤销原地转换", command=self.undo_in_place).grid(row=0, column=6, padx=(5, 0))
         
         # 文件类型过滤
         ttk.Label(settings_frame, text="要处理编码的文件类型 (用逗号分隔):").grid(row=4, column=0, sticky=tk.W, pady=(0, 5))
@@ -135,6 +3018,11 @@ class EncodingUnifierGUI:
         
         ttk.Entry(filter_frame, textvariable=self.file_extensions_var, width=80).grid(row=0, column=0, padx=(0, 5))
         ttk.Button(filter_frame, text="重置默认", command=self.reset_extensions).grid(row=0, column=1)
+        ttk.Label(filter_frame, text="并发读取:").grid(row=0, column=2, sticky=tk.W, padx=(20, 5))
+        ttk.Spinbox(filter_frame, from_=1, to=64, textvariable=self.scan_concurrency_var, width=5).grid(
+            row=0, column=3, sticky=tk.W)
+        ttk.Checkbutton(filter_frame, text="合并重复内容", variable=self.dedup_var).grid(
+            row=0, column=4, sticky=tk.W, padx=(20, 0))
         
         # 输出编码设置
         ttk.Label(settings_frame, text="输出编码:").grid(row=6, column=0, sticky=tk.W, pady=(5, 5))
@@ -153,9 +3041,37 @@ class EncodingUnifierGUI:
             encoding_info = ttk.Label(encoding_frame, text="简繁体转换不可用 (需要安装opencc-python-reimplemented)", foreground="orange", font=("", 9))
         encoding_info.grid(row=0, column=1, sticky=tk.W)
         
+        # 无法编码字符的默认处理方式
+        ttk.Label(encoding_frame, text="无法编码的字符:").grid(row=0, column=2, sticky=tk.W, padx=(20, 5))
+        policy_combo = ttk.Combobox(encoding_frame, textvariable=self.error_policy_var,
+                                    values=[policy['name'] for policy in ERROR_POLICIES.values()],
+                                    state="readonly", width=14)
+        policy_combo.grid(row=0, column=3, sticky=tk.W)
+        
+        # 简繁转换引擎
+        if self.has_opencc:
+            ttk.Label(encoding_frame, text="转换引擎:").grid(row=0, column=4, sticky=tk.W, padx=(20, 5))
+            ttk.Combobox(encoding_frame, textvariable=self.converter_backend_var,
+                         values=list(CONVERTER_BACKENDS.values()),
+                         state="readonly", width=10).grid(row=0, column=5, sticky=tk.W)
+        
+        # 换行符、BOM 和行尾空白
+        normalize_frame = ttk.Frame(settings_frame)
+        normalize_frame.grid(row=8, column=0, sticky=(tk.W, tk.E), pady=(0, 5))
+        ttk.Label(normalize_frame, text="换行符:").grid(row=0, column=0, sticky=tk.W, padx=(0, 5))
+        ttk.Combobox(normalize_frame, textvariable=self.eol_policy_var,
+                     values=[policy['name'] for policy in EOL_POLICIES.values()],
+                     state="readonly", width=14).grid(row=0, column=1, sticky=tk.W)
+        ttk.Label(normalize_frame, text="BOM:").grid(row=0, column=2, sticky=tk.W, padx=(20, 5))
+        ttk.Combobox(normalize_frame, textvariable=self.bom_policy_var,
+                     values=[policy['name'] for policy in BOM_POLICIES.values()],
+                     state="readonly", width=10).grid(row=0, column=3, sticky=tk.W)
+        ttk.Checkbutton(normalize_frame, text="删除行尾空白", variable=self.trim_trailing_var).grid(
+            row=0, column=4, sticky=tk.W, padx=(20, 0))
+        
         # 说明文字
         info_text = "说明: 上述文件类型会进行编码检测和转换，其他所有文件将直接复制到输出目录\n支持的文档格式: .doc, .docx, .rtf, .odt 等"
-        ttk.Label(settings_frame, text=info_text, foreground="blue", font=("", 9)).grid(row=8, column=0, sticky=tk.W, pady=(5, 0))
+        ttk.Label(settings_frame, text=info_text, foreground="blue", font=("", 9)).grid(row=9, column=0, sticky=tk.W, pady=(5, 0))
         
         # 配置列权重
         settings_frame.columnconfigure(0, weight=1)
@@ -170,9 +3086,13 @@ class EncodingUnifierGUI:
         
         ttk.Button(button_frame, text="扫描文件", command=self.scan_files).grid(row=0, column=0, padx=(0, 5))
         ttk.Button(button_frame, text="预览转换", command=self.show_preview_window).grid(row=0, column=1, padx=(0, 5))
-        ttk.Button(button_frame, text="开始处理", command=self.start_processing).grid(row=0, column=2, padx=(0, 5))
-        ttk.Button(button_frame, text="清除结果", command=self.clear_results).grid(row=0, column=3, padx=(0, 5))
-        ttk.Button(button_frame, text="打开输出目录", command=self.open_output_directory).grid(row=0, column=4)
+        ttk.Button(button_frame, text="编码检查", command=self.show_encodability_report).grid(row=0, column=2, padx=(0, 5))
+        ttk.Button(button_frame, text="开始处理", command=self.start_processing).grid(row=0, column=3, padx=(0, 5))
+        ttk.Button(button_frame, text="扫描并转换", command=self.scan_and_process).grid(row=0, column=4, padx=(0, 5))
+        ttk.Button(button_frame, text="清除结果", command=self.clear_results).grid(row=0, column=5, padx=(0, 5))
+        ttk.Button(button_frame, text="打开输出目录", command=self.open_output_directory).grid(row=0, column=6, padx=(0, 5))
+        ttk.Button(button_frame, text="保存计划", command=self.save_plan).grid(row=0, column=7, padx=(0, 5))
+        ttk.Button(button_frame, text="加载计划", command=self.load_plan).grid(row=0, column=8)
         
         # 进度条
         self.progress_var = tk.DoubleVar()
@@ -203,14 +3123,17 @@ class EncodingUnifierGUI:
         summary_frame = ttk.Frame(self.notebook)
         self.notebook.add(summary_frame, text="统计信息")
         
-        # 设置编码处理文件列表
+        # 设置编码处理文件列表（默认显示的标签页）
         self.setup_encoding_tree(encoding_frame)
         
-        # 设置直接复制文件列表
-        self.setup_copy_tree(copy_frame)
-        
-        # 设置统计信息
-        self.setup_summary_text(summary_frame)
+        # 直接复制文件列表和统计信息在首次显示或写入数据时才创建
+        self.copy_tree = None
+        self.summary_text = None
+        self.deferred_tabs = {
+            'copy': (copy_frame, self.setup_copy_tree),
+            'summary': (summary_frame, self.setup_summary_text)
+        }
+        self.notebook.bind('<<NotebookTabChanged>>', self.on_notebook_tab_changed)
         
         # 配置网格权重
         self.root.columnconfigure(0, weight=1)
@@ -220,6 +3143,20 @@ class EncodingUnifierGUI:
         result_frame.columnconfigure(0, weight=1)
         result_frame.rowconfigure(0, weight=1)
         
+    def ensure_tab(self, name):
+        """创建延迟构建的标签页内容"""
+        tab = self.deferred_tabs.pop(name, None)
+        if tab:
+            frame, builder = tab
+            builder(frame)
+    
+    def on_notebook_tab_changed(self, event):
+        """切换标签页时创建尚未构建的内容"""
+        selected = self.notebook.select()
+        for name, (frame, builder) in list(self.deferred_tabs.items()):
+            if str(frame) == selected:
+                self.ensure_tab(name)
+    
     def create_menu(self):
         """创建菜单栏"""
         menubar = tk.Menu(self.root)
@@ -265,6 +3202,9 @@ class EncodingUnifierGUI:
 1. 设置目录
    • 选择输入目录(A): 包含源文件的目录
    • 选择输出目录(B): 处理后文件的保存位置
+   • 输入也可以是 zip / tar 压缩包：成员直接从压缩包读取，不解压到磁盘
+   • 输出也可以是 zip / tar.gz 压缩包：条目按顺序写入，超过 8 MB 的
+     处理结果在写入压缩包前暂存在临时文件中
 
 2. 配置文件类型和输出编码
    • 设置要处理编码的文件扩展名
@@ -324,32 +3264,40 @@ class EncodingUnifierGUI:
         
         title_frame.columnconfigure(0, weight=1)
         
-        # 创建Treeview显示文件信息
-        columns = ('select', 'file', 'encoding', 'confidence', 'status', 'action')
-        self.encoding_tree = ttk.Treeview(list_frame, columns=columns, show='headings', height=12)
-        
-        # 设置列标题
-        self.encoding_tree.heading('select', text='选择')
-        self.encoding_tree.heading('file', text='文件路径')
-        self.encoding_tree.heading('encoding', text='检测编码')
-        self.encoding_tree.heading('confidence', text='置信度')
-        self.encoding_tree.heading('status', text='状态')
-        self.encoding_tree.heading('action', text='操作')
+        # 过滤条件
+        ttk.Label(title_frame, text="状态:").grid(row=0, column=4, padx=(15, 2))
+        status_filter = ttk.Combobox(title_frame, textvariable=self.encoding_status_filter, width=10, state="readonly",
+                                     values=["全部", "需要转换", "无中文", "✓ 目标编码"])
+        status_filter.grid(row=0, column=5)
+        ttk.Label(title_frame, text="编码:").grid(row=0, column=6, padx=(10, 2))
+        self.encoding_filter_combo = ttk.Combobox(title_frame, textvariable=self.encoding_encoding_filter,
+                                                  width=10, state="readonly", values=["全部"])
+        self.encoding_filter_combo.grid(row=0, column=7)
+        status_filter.bind('<<ComboboxSelected>>', lambda e: self.apply_encoding_view())
+        self.encoding_filter_combo.bind('<<ComboboxSelected>>', lambda e: self.apply_encoding_view())
+        
+        # 创建虚拟列表显示文件信息（只为可见行创建项目）
+        columns = ('select', 'file', 'encoding', 'confidence', 'size', 'status', 'action')
+        self.encoding_view = VirtualTreeview(list_frame, columns, self.get_encoding_row, height=12)
+        self.encoding_tree = self.encoding_view.tree
+        
+        # 设置列标题（点击标题排序）
+        headings = {'select': '选择', 'file': '文件路径', 'encoding': '检测编码', 'confidence': '置信度',
+                    'size': '大小', 'status': '状态', 'action': '操作'}
+        self.encoding_headings = headings
+        for column, text in headings.items():
+            self.encoding_tree.heading(column, text=text, command=lambda c=column: self.sort_encoding_view(c))
         
         # 设置列宽
         self.encoding_tree.column('select', width=50)
         self.encoding_tree.column('file', width=320)
         self.encoding_tree.column('encoding', width=80)
         self.encoding_tree.column('confidence', width=60)
+        self.encoding_tree.column('size', width=70)
         self.encoding_tree.column('status', width=80)
         self.encoding_tree.column('action', width=120)
         
-        self.encoding_tree.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-        
-        # 滚动条
-        encoding_scroll = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.encoding_tree.yview)
-        encoding_scroll.grid(row=1, column=1, sticky=(tk.N, tk.S))
-        self.encoding_tree.configure(yscrollcommand=encoding_scroll.set)
+        self.encoding_view.grid(row=1, column=0)
         
         # 绑定事件
         self.encoding_tree.bind('<Double-1>', self.on_encoding_file_double_click)
@@ -377,26 +3325,24 @@ class EncodingUnifierGUI:
         """设置直接复制文件树"""
         ttk.Label(parent, text="直接复制的文件:").grid(row=0, column=0, sticky=tk.W)
         
-        # 创建Treeview显示复制文件信息
+        # 创建虚拟列表显示复制文件信息
         columns = ('file', 'size', 'status')
-        self.copy_tree = ttk.Treeview(parent, columns=columns, show='headings', height=15)
+        self.copy_view = VirtualTreeview(parent, columns, self.get_copy_row, height=15)
+        self.copy_tree = self.copy_view.tree
         
-        # 设置列标题
-        self.copy_tree.heading('file', text='文件路径')
-        self.copy_tree.heading('size', text='文件大小')
-        self.copy_tree.heading('status', text='状态')
+        # 设置列标题（点击标题排序）
+        headings = {'file': '文件路径', 'size': '文件大小', 'status': '状态'}
+        self.copy_headings = headings
+        for column, text in headings.items():
+            self.copy_tree.heading(column, text=text, command=lambda c=column: self.sort_copy_view(c))
         
         # 设置列宽
         self.copy_tree.column('file', width=500)
         self.copy_tree.column('size', width=100)
         self.copy_tree.column('status', width=120)
         
-        self.copy_tree.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-        
-        # 滚动条
-        copy_scroll = ttk.Scrollbar(parent, orient=tk.VERTICAL, command=self.copy_tree.yview)
-        copy_scroll.grid(row=1, column=1, sticky=(tk.N, tk.S))
-        self.copy_tree.configure(yscrollcommand=copy_scroll.set)
+        self.copy_view.grid(row=1, column=0)
+        self.apply_copy_view()
         
         # 配置权重
         parent.columnconfigure(0, weight=1)
@@ -425,36 +3371,171 @@ class EncodingUnifierGUI:
             # 切换选择状态
             if file_path in self.excluded_files:
                 self.excluded_files.discard(file_path)
-                select_text = "☑"
             else:
-                self.excluded_files.add(file_path)
-                select_text = "☐"
-            
-            # 更新显示
-            values = list(self.encoding_tree.item(item)['values'])
-            values[0] = select_text
-            self.encoding_tree.item(item, values=values)
+                self.excluded_files.add(file_path)
+            
+            # 更新显示
+            self.encoding_view.refresh()
+        
+    def select_all_encoding(self):
+        """全选编码文件（当前过滤条件下显示的文件）"""
+        store = self.encoding_results
+        for row in self.encoding_view.keys:
+            self.excluded_files.discard(store.path_of(row))
+        self.encoding_view.refresh()
+            
+    def deselect_all_encoding(self):
+        """全不选编码文件（当前过滤条件下显示的文件）"""
+        store = self.encoding_results
+        for row in self.encoding_view.keys:
+            self.excluded_files.add(store.path_of(row))
+        self.encoding_view.refresh()
+    
+    def get_encoding_status(self, encoding_info):
+        """根据检测结果和目标编码确定状态和操作"""
+        best_encoding = encoding_info.get('best_encoding', 'unknown')
+        target_encoding_info = OUTPUT_ENCODINGS[self.output_encoding_var.get()]
+        
+        if encoding_info.get('file_type') == 'document':
+            if encoding_info.get('has_chinese', False):
+                return "需要转换", f"文档→{target_encoding_info['name']}"
+            return "无中文", "直接复制"
+        elif best_encoding == target_encoding_info['encoding'] and target_encoding_info['charset'] == 'auto':
+            return "✓ 目标编码", "直接复制"
+        elif encoding_info.get('has_chinese', False) or best_encoding in UNICODE_ENCODINGS:
+            return "需要转换", f"{best_encoding}→{target_encoding_info['name']}"
+        return "无中文", "直接复制"
+    
+    def get_encoding_row(self, row):
+        """生成编码文件列表中一行的显示内容"""
+        store = self.encoding_results
+        file_path = store.path_of(row)
+        info = ResultView(store, row)
+        status, action = self.get_encoding_status(info)
+        select_text = "☐" if file_path in self.excluded_files else "☑"
+        
+        values = (
+            select_text,
+            os.path.relpath(file_path, self.input_path.get()),
+            info.get('best_encoding', 'unknown'),
+            f"{info.get('chardet_confidence', 0):.2f}",
+            format_size(info.get('size', 0)),
+            status,
+            store.action_of(row) or action
+        )
+        return values, (file_path,)
+    
+    def get_copy_row(self, row):
+        """生成复制文件列表中一行的显示内容"""
+        store = self.copy_files
+        file_path = store.path_of(row)
+        values = (
+            os.path.relpath(file_path, self.input_path.get()),
+            store.value(row, 'size_str', 'Unknown'),
+            store.action_of(row) or "待复制"
+        )
+        return values, (file_path,)
+    
+    def encoding_sort_key(self, column):
+        """编码文件列表排序用的键函数（直接读取结果存储中的列）"""
+        store = self.encoding_results
+        if column == 'file':
+            return store.path_of
+        if column == 'encoding':
+            return lambda row: store.value(row, 'best_encoding')
+        if column == 'confidence':
+            return lambda row: store.value(row, 'chardet_confidence')
+        if column == 'size':
+            return lambda row: store.value(row, 'size')
+        if column == 'status':
+            return lambda row: self.get_encoding_status(ResultView(store, row))[0]
+        if column == 'action':
+            return lambda row: store.action_of(row) or self.get_encoding_status(ResultView(store, row))[1]
+        return lambda row: store.path_of(row) in self.excluded_files
+    
+    def encoding_row_matches(self, row):
+        """判断编码文件是否符合过滤条件"""
+        status_filter = self.encoding_status_filter.get()
+        encoding_filter = self.encoding_encoding_filter.get()
+        store = self.encoding_results
+        if encoding_filter != "全部" and store.value(row, 'best_encoding') != encoding_filter:
+            return False
+        if status_filter != "全部" and self.get_encoding_status(ResultView(store, row))[0] != status_filter:
+            return False
+        return True
+    
+    def apply_encoding_view(self):
+        """按当前过滤和排序条件重建编码文件列表"""
+        store = self.encoding_results
+        if self.encoding_status_filter.get() == "全部" and self.encoding_encoding_filter.get() == "全部":
+            rows = list(store.rows())
+        else:
+            rows = [row for row in store.rows() if self.encoding_row_matches(row)]
+        
+        if self.encoding_sort:
+            column, reverse = self.encoding_sort
+            rows.sort(key=self.encoding_sort_key(column), reverse=reverse)
+        
+        self.encoding_view_synced = store.row_count
+        self.encoding_view.set_keys(rows)
+        
+        # 更新编码过滤选项
+        encodings = sorted(set(store.value(row, 'best_encoding') for row in store.rows()))
+        self.encoding_filter_combo.config(values=["全部"] + encodings)
+    
+    def apply_copy_view(self):
+        """按当前排序条件重建复制文件列表"""
+        if self.copy_tree is None:
+            return
+        store = self.copy_files
+        rows = list(store.rows())
+        if self.copy_sort:
+            column, reverse = self.copy_sort
+            if column == 'size':
+                key = lambda row: store.value(row, 'size')
+            elif column == 'status':
+                key = store.action_of
+            else:
+                key = store.path_of
+            rows.sort(key=key, reverse=reverse)
         
-    def select_all_encoding(self):
-        """全选编码文件"""
-        for item in self.encoding_tree.get_children():
-            file_path = self.encoding_tree.item(item)['tags'][0]
-            self.excluded_files.discard(file_path)
-            
-            values = list(self.encoding_tree.item(item)['values'])
-            values[0] = "☑"
-            self.encoding_tree.item(item, values=values)
-            
-    def deselect_all_encoding(self):
-        """全不选编码文件"""
-        for item in self.encoding_tree.get_children():
-            file_path = self.encoding_tree.item(item)['tags'][0]
-            self.excluded_files.add(file_path)
-            
-            values = list(self.encoding_tree.item(item)['values'])
-            values[0] = "☐"
-            self.encoding_tree.item(item, values=values)
-            
+        self.copy_view_synced = store.row_count
+        self.copy_view.set_keys(rows)
+    
+    def sort_encoding_view(self, column):
+        """点击列标题排序，再次点击反向"""
+        reverse = self.encoding_sort == (column, False)
+        self.encoding_sort = (column, reverse)
+        for name, text in self.encoding_headings.items():
+            arrow = (" ▼" if reverse else " ▲") if name == column else ""
+            self.encoding_tree.heading(name, text=text + arrow)
+        self.apply_encoding_view()
+    
+    def sort_copy_view(self, column):
+        """点击列标题排序，再次点击反向"""
+        reverse = self.copy_sort == (column, False)
+        self.copy_sort = (column, reverse)
+        for name, text in self.copy_headings.items():
+            arrow = (" ▼" if reverse else " ▲") if name == column else ""
+            self.copy_tree.heading(name, text=text + arrow)
+        self.apply_copy_view()
+    
+    def sync_file_views(self):
+        """把扫描过程中新增的结果追加到列表（不重新排序）"""
+        store = self.encoding_results
+        filtered = self.encoding_status_filter.get() != "全部" or self.encoding_encoding_filter.get() != "全部"
+        new_rows = [row for row in range(self.encoding_view_synced, store.row_count)
+                    if store.is_live(row) and (not filtered or self.encoding_row_matches(row))]
+        self.encoding_view_synced = store.row_count
+        self.encoding_view.extend(new_rows)
+        
+        if self.copy_files.row_count > self.copy_view_synced:
+            self.ensure_tab('copy')
+            store = self.copy_files
+            new_rows = [row for row in range(self.copy_view_synced, store.row_count) if store.is_live(row)]
+            self.copy_view_synced = store.row_count
+            self.copy_view.extend(new_rows)
+    
     def remove_selected_encoding(self):
         """删除未选中的编码文件"""
         if not self.excluded_files:
@@ -487,17 +3568,9 @@ class EncodingUnifierGUI:
     
     def rebuild_file_lists(self):
         """重新构建文件列表"""
-        # 清空现有列表
-        self.encoding_tree.delete(*self.encoding_tree.get_children())
-        self.copy_tree.delete(*self.copy_tree.get_children())
-        
-        # 重建编码文件列表
-        for file_path, encoding_info in self.encoding_results.items():
-            self.update_encoding_file_list(file_path, encoding_info)
-            
-        # 重建复制文件列表
-        for file_path, file_info in self.copy_files.items():
-            self.update_copy_file_list(file_path, file_info)
+        self.ensure_tab('copy')
+        self.apply_encoding_view()
+        self.apply_copy_view()
             
     def show_preview_window(self):
         """显示预览窗口"""
@@ -527,6 +3600,7 @@ class EncodingUnifierGUI:
         self.preview_window = tk.Toplevel(self.root)
         self.preview_window.title(f"编码转换预览 - {len(convert_files)} 个文件 → {target_encoding_info['name']}")
         self.preview_window.geometry("1300x800")
+        self.preview_window.protocol("WM_DELETE_WINDOW", self.close_preview_window)
         
         # 初始化预览排除列表
         self.preview_excluded_files = set()
@@ -592,6 +3666,8 @@ class EncodingUnifierGUI:
         # 操作按钮
         ttk.Button(preview_header_frame, text="排除此文件", command=self.toggle_current_file_exclusion).pack(side=tk.RIGHT, padx=(5, 0))
         ttk.Button(preview_header_frame, text="应用更改", command=self.apply_preview_changes).pack(side=tk.RIGHT, padx=(5, 0))
+        ttk.Button(preview_header_frame, text="下一处变化", command=lambda: self.preview_jump_change(True)).pack(side=tk.RIGHT, padx=(5, 0))
+        ttk.Button(preview_header_frame, text="上一处变化", command=lambda: self.preview_jump_change(False)).pack(side=tk.RIGHT, padx=(5, 0))
         
         # 创建预览区域的容器 - 使用PanedWindow来分割转换前后
         preview_paned = ttk.PanedWindow(right_frame, orient=tk.HORIZONTAL)
@@ -605,7 +3681,8 @@ class EncodingUnifierGUI:
         self.before_text = tk.Text(before_frame, wrap=tk.NONE, width=40, height=25)
         before_v_scroll = ttk.Scrollbar(before_frame, orient=tk.VERTICAL, command=self.before_text.yview)
         before_h_scroll = ttk.Scrollbar(before_frame, orient=tk.HORIZONTAL, command=self.before_text.xview)
-        self.before_text.configure(yscrollcommand=before_v_scroll.set, xscrollcommand=before_h_scroll.set)
+        self.before_text.configure(yscrollcommand=lambda *args: self.on_preview_scroll(before_v_scroll, *args),
+                                   xscrollcommand=before_h_scroll.set)
         
         self.before_text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         before_v_scroll.grid(row=0, column=1, sticky=(tk.N, tk.S))
@@ -617,12 +3694,14 @@ class EncodingUnifierGUI:
         # 转换后框架
         after_frame = ttk.LabelFrame(preview_paned, text=f"转换后 ({target_encoding_info['name']})")
         preview_paned.add(after_frame, weight=1)
+        self.preview_after_frame = after_frame
         
         # 转换后文本区域 - 添加滚动条
         self.after_text = tk.Text(after_frame, wrap=tk.NONE, width=40, height=25)
         after_v_scroll = ttk.Scrollbar(after_frame, orient=tk.VERTICAL, command=self.after_text.yview)
         after_h_scroll = ttk.Scrollbar(after_frame, orient=tk.HORIZONTAL, command=self.after_text.xview)
-        self.after_text.configure(yscrollcommand=after_v_scroll.set, xscrollcommand=after_h_scroll.set)
+        self.after_text.configure(yscrollcommand=lambda *args: self.on_preview_scroll(after_v_scroll, *args),
+                                  xscrollcommand=after_h_scroll.set)
         
         self.after_text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         after_v_scroll.grid(row=0, column=1, sticky=(tk.N, tk.S))
@@ -631,6 +3710,14 @@ class EncodingUnifierGUI:
         after_frame.columnconfigure(0, weight=1)
         after_frame.rowconfigure(0, weight=1)
         
+        # 差异高亮样式：变化的字符、目标编码无法表示的字符、当前定位的变化
+        self.before_text.tag_configure('changed', background='#fff2a8')
+        self.after_text.tag_configure('changed', background='#fff2a8')
+        self.after_text.tag_configure('lossy', background='#ff9c9c', foreground='#7a0000')
+        self.after_text.tag_configure('current_change', background='#8fc9ff')
+        self.after_text.tag_raise('lossy')
+        self.after_text.tag_raise('current_change')
+        
         # 底部按钮框架
         bottom_frame = ttk.Frame(self.preview_window)
         bottom_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
@@ -639,6 +3726,10 @@ class EncodingUnifierGUI:
         self.preview_status_var = tk.StringVar(value=f"共 {len(convert_files)} 个文件待转换")
         ttk.Label(bottom_frame, textvariable=self.preview_status_var).pack(side=tk.LEFT)
         
+        # 差异统计标签
+        self.preview_diff_var = tk.StringVar(value="")
+        ttk.Label(bottom_frame, textvariable=self.preview_diff_var, foreground="blue").pack(side=tk.LEFT, padx=(20, 0))
+        
         ttk.Button(bottom_frame, text="关闭预览", command=self.close_preview_window).pack(side=tk.RIGHT)
         
         # 绑定事件
@@ -650,6 +3741,50 @@ class EncodingUnifierGUI:
             self.preview_file_listbox.selection_set(0)
             self.on_preview_file_select(None)
     
+    def get_preview_engine(self):
+        """获取预览转换引擎（首次使用时创建）"""
+        if self.preview_engine is None:
+            self.preview_engine = PreviewEngine(
+                self.load_preview_content,
+                on_ready=lambda key, entry: self.root.after(0, lambda: self.on_preview_ready(key, entry)))
+        return self.preview_engine
+    
+    def load_preview_content(self, file_path, source_encoding, target_encoding_option):
+        """读取并转换预览内容（在预览引擎的后台线程中执行）"""
+        content = self.read_file_content(file_path, source_encoding)
+        converted_content = self.convert_text_encoding(content, target_encoding_option)
+        return content, converted_content
+    
+    def get_preview_key(self, index):
+        """获取预览列表中第 index 个文件的缓存键"""
+        file_path, info = self.preview_convert_files[index]
+        return PreviewEngine.make_key(file_path, info.get('best_encoding', 'utf-8'),
+                                      self.output_encoding_var.get())
+    
+    def on_output_encoding_changed(self, *args):
+        """目标编码改变 - 使预览缓存失效并刷新预览"""
+        if self.preview_engine:
+            self.preview_engine.invalidate()
+        
+        if self.preview_window:
+            target_encoding_info = OUTPUT_ENCODINGS[self.output_encoding_var.get()]
+            self.preview_after_frame.config(text=f"转换后 ({target_encoding_info['name']})")
+            self.on_preview_file_select(None)
+        
+        # 状态列取决于目标编码
+        self.apply_encoding_view()
+        
+        # 重新检查编码兼容性
+        if self.encoding_results:
+            self.start_encodability_analysis()
+    
+    def on_converter_backend_changed(self, *args):
+        """简繁转换引擎改变 - 缓存的转换结果来自之前的引擎，使预览缓存失效并刷新预览"""
+        if self.preview_engine:
+            self.preview_engine.invalidate()
+        if self.preview_window:
+            self.on_preview_file_select(None)
+    
     def preview_select_all(self, select):
         """预览窗口全选/全不选"""
         if select:
@@ -678,31 +3813,154 @@ class EncodingUnifierGUI:
             
         index = selection[0]
         file_path, info = self.preview_convert_files[index]
-        source_encoding = info.get('best_encoding', 'utf-8')
         
         # 更新标题
         rel_path = os.path.relpath(file_path, self.input_path.get())
         self.preview_title.config(text=f"预览: {rel_path}")
         
-        try:
-            # 读取原文件内容
-            content = self.read_file_content(file_path, source_encoding)
-            
-            # 显示转换前内容
-            self.before_text.delete(1.0, tk.END)
-            self.before_text.insert(tk.END, content)
-            
-            # 显示转换后内容
-            converted_content = self.convert_text_encoding(content, self.output_encoding_var.get())
-            self.after_text.delete(1.0, tk.END)
-            self.after_text.insert(tk.END, converted_content)
-            
-        except Exception as e:
-            error_msg = f"无法读取文件: {str(e)}"
+        engine = self.get_preview_engine()
+        key = self.get_preview_key(index)
+        entry = engine.get(key)
+        if entry is not None:
+            # 缓存命中，立即显示
+            self.display_preview_entry(entry)
+        else:
             self.before_text.delete(1.0, tk.END)
-            self.before_text.insert(tk.END, error_msg)
+            self.before_text.insert(tk.END, "正在加载...")
             self.after_text.delete(1.0, tk.END)
+            engine.request(key)
+        
+        # 预取前后相邻的文件，由近及远
+        neighbors = []
+        for distance in range(1, PREVIEW_PREFETCH_COUNT + 1):
+            for neighbor in (index + distance, index - distance):
+                if 0 <= neighbor < len(self.preview_convert_files):
+                    neighbors.append(self.get_preview_key(neighbor))
+        engine.prefetch(neighbors)
+    
+    def on_preview_ready(self, key, entry):
+        """预览引擎完成转换 - 如果仍是当前选中的文件则显示"""
+        if not self.preview_window:
+            return
+        
+        selection = self.preview_file_listbox.curselection()
+        if selection and self.get_preview_key(selection[0]) == key:
+            self.display_preview_entry(entry)
+    
+    def display_preview_entry(self, entry):
+        """显示预览内容"""
+        self.before_text.delete(1.0, tk.END)
+        self.after_text.delete(1.0, tk.END)
+        self.preview_diff = None
+        self.preview_diff_generation += 1
+        self.preview_diff_var.set("")
+        
+        if 'error' in entry:
+            self.before_text.insert(tk.END, f"无法读取文件: {entry['error']}")
             self.after_text.insert(tk.END, "转换预览不可用")
+            return
+        
+        # 显示转换前内容
+        self.before_text.insert(tk.END, entry['content'])
+        
+        # 显示转换后内容
+        self.after_text.insert(tk.END, entry['converted'])
+        
+        # 差异按需计算：先高亮可见区域，其余部分在空闲时分批处理
+        target_encoding = OUTPUT_ENCODINGS[self.output_encoding_var.get()]['encoding']
+        self.preview_diff = PreviewDiff(entry['content'], entry['converted'], target_encoding)
+        self.preview_highlighted = bytearray(self.preview_diff.line_count)
+        self.preview_diff_stats = [0, 0]  # [变化处数, 无法编码字符数]
+        self.highlight_visible_preview_lines()
+        generation = self.preview_diff_generation
+        self.preview_window.after(1, lambda: self.preview_highlight_step(generation, 0))
+    
+    def on_preview_scroll(self, scrollbar, *args):
+        """预览区域滚动 - 更新滚动条并高亮新出现的行"""
+        scrollbar.set(*args)
+        if self.preview_diff is not None:
+            self.highlight_visible_preview_lines()
+    
+    def highlight_visible_preview_lines(self):
+        """高亮两侧文本框中当前可见的行"""
+        for text_widget in (self.before_text, self.after_text):
+            first = int(text_widget.index('@0,0').split('.')[0]) - 1
+            last = int(text_widget.index(f'@0,{text_widget.winfo_height()}').split('.')[0])
+            if text_widget is self.before_text:
+                # 换行数量改变时原文与转换结果按行对齐，行号不一定相同
+                first, last = self.preview_diff.after_line_range(first, last)
+            self.highlight_preview_lines(first, last)
+    
+    def highlight_preview_lines(self, first, last):
+        """为 [first, last) 行添加差异高亮，返回 (变化处数, 无法编码字符数)"""
+        diff = self.preview_diff
+        changes = 0
+        lossy_chars = 0
+        for line in range(max(first, 0), min(last, diff.line_count)):
+            if not diff.has_change(line):
+                self.preview_highlighted[line] = 1
+                continue
+            
+            before_ranges, after_ranges, lossy_ranges = diff.line_diff(line)
+            changes += len(after_ranges)
+            lossy_chars += sum(end - start for start, end in lossy_ranges)
+            if self.preview_highlighted[line]:
+                continue
+            self.preview_highlighted[line] = 1
+            
+            before_line = diff.before_line_index(line)
+            if before_line is not None:
+                for start, end in before_ranges:
+                    self.before_text.tag_add('changed', f"{before_line + 1}.{start}", f"{before_line + 1}.{end}")
+            for start, end in after_ranges:
+                self.after_text.tag_add('changed', f"{line + 1}.{start}", f"{line + 1}.{end}")
+            for start, end in lossy_ranges:
+                self.after_text.tag_add('lossy', f"{line + 1}.{start}", f"{line + 1}.{end}")
+        return changes, lossy_chars
+    
+    def preview_highlight_step(self, generation, start, chunk_size=500):
+        """空闲时分批计算差异，避免大文件阻塞界面"""
+        if not self.preview_window or generation != self.preview_diff_generation:
+            return
+        
+        end = start + chunk_size
+        changes, lossy_chars = self.highlight_preview_lines(start, end)
+        self.preview_diff_stats[0] += changes
+        self.preview_diff_stats[1] += lossy_chars
+        
+        finished = end >= self.preview_diff.line_count
+        changes, lossy_chars = self.preview_diff_stats
+        status = f"变化: {changes} 处"
+        if self.preview_diff.check_encoding:
+            status += f"，无法用目标编码表示的字符: {lossy_chars} 个"
+        if not finished:
+            status += " (分析中...)"
+        self.preview_diff_var.set(status)
+        
+        if not finished:
+            self.preview_window.after(1, lambda: self.preview_highlight_step(generation, end))
+    
+    def preview_jump_change(self, forward):
+        """跳转到下一处（或上一处）变化"""
+        if self.preview_diff is None:
+            return
+        
+        line, column = map(int, self.after_text.index(tk.INSERT).split('.'))
+        found = self.preview_diff.find_change(line - 1, column, forward)
+        if found is None:
+            self.preview_diff_var.set("已到达最后一处变化" if forward else "已到达第一处变化")
+            return
+        
+        line, start, end = found
+        self.highlight_preview_lines(line, line + 1)
+        self.after_text.tag_remove('current_change', 1.0, tk.END)
+        self.after_text.tag_add('current_change', f"{line + 1}.{start}", f"{line + 1}.{end}")
+        self.after_text.mark_set(tk.INSERT, f"{line + 1}.{start}")
+        self.after_text.see(f"{line + 1}.{start}")
+        
+        before_line = self.preview_diff.before_line_index(line)
+        if before_line is not None:
+            self.before_text.see(f"{before_line + 1}.{start}")
     
     def on_preview_file_double_click(self, event):
         """预览文件双击事件 - 切换选择状态"""
@@ -768,12 +4026,7 @@ class EncodingUnifierGUI:
             self.excluded_files.add(file_path)
         
         # 更新主窗口的编码文件列表显示
-        for item in self.encoding_tree.get_children():
-            file_path = self.encoding_tree.item(item)['tags'][0]
-            if file_path in self.excluded_files:
-                values = list(self.encoding_tree.item(item)['values'])
-                values[0] = "☐"  # 更新选择状态
-                self.encoding_tree.item(item, values=values)
+        self.encoding_view.refresh()
         
         messagebox.showinfo("应用成功", f"已将 {excluded_count} 个文件标记为排除，请在主窗口查看")
         
@@ -790,6 +4043,7 @@ class EncodingUnifierGUI:
         if self.preview_window:
             self.preview_window.destroy()
             self.preview_window = None
+            self.preview_diff = None
             self.preview_excluded_files.clear()
     
     def get_file_extensions(self):
@@ -810,7 +4064,7 @@ class EncodingUnifierGUI:
         
     def reset_extensions(self):
         """重置默认文件扩展名"""
-        self.file_extensions_var.set(".c,.h,.cpp,.hpp,.cc,.cxx,.txt,.py,.java,.js,.html,.css,.xml,.json,.md,.sql,.ini,.cfg,.conf,.log,.csv,.tsv,.doc,.docx,.rtf,.odt")
+        self.file_extensions_var.set(DEFAULT_EXTENSIONS)
         
     def browse_input_directory(self):
         """浏览选择输入目录"""
@@ -821,37 +4075,91 @@ class EncodingUnifierGUI:
             if not self.output_path.get():
                 self.auto_set_output()
                 
+    def browse_input_archive(self):
+        """选择输入压缩包 - 直接扫描和转换压缩包中的文件，不需要先解压"""
+        path = filedialog.askopenfilename(
+            title="选择输入压缩包 (A)",
+            filetypes=[("压缩包", " ".join("*" + ext for ext in INPUT_ARCHIVE_EXTENSIONS)), ("所有文件", "*.*")]
+        )
+        if path:
+            self.input_path.set(path)
+            if not self.output_path.get():
+                self.auto_set_output()
+                
     def browse_output_directory(self):
         """浏览选择输出目录"""
         directory = filedialog.askdirectory(title="选择输出目录 (B)")
         if directory:
             self.output_path.set(directory)
             
+    def browse_output_archive(self):
+        """选择输出压缩包 - 处理结果直接写入 zip 或 tar.gz"""
+        initial = os.path.basename(self.input_path.get()) + "_encoded.zip" if self.input_path.get() else ""
+        path = filedialog.asksaveasfilename(
+            title="选择输出压缩包 (B)",
+            initialfile=initial,
+            defaultextension=".zip",
+            filetypes=[("ZIP 压缩包", "*.zip"), ("tar.gz 压缩包", "*.tar.gz *.tgz")]
+        )
+        if path:
+            self.output_path.set(path)
+            
+    def undo_in_place(self):
+        """撤销最近一次原地转换，把改写过的文件恢复为原文件"""
+        if not self.input_path.get() or not os.path.isdir(self.input_path.get()):
+            messagebox.showerror("错误", "请先选择输入目录")
+            return
+        runs = find_undo_runs(self.input_path.get())
+        if not runs:
+            messagebox.showinfo("撤销原地转换", "输入目录中没有原地转换的撤销记录")
+            return
+        
+        undo_dir = runs[-1]
+        if not messagebox.askyesno(
+            "撤销原地转换",
+            f"将恢复以下这次原地转换改写的所有文件:\n{undo_dir}\n\n是否继续?"
+        ):
+            return
+        try:
+            restored = rollback_in_place(undo_dir)
+        except Exception as e:
+            messagebox.showerror("错误", f"撤销失败: {str(e)}")
+            return
+        
+        # 文件内容已改变，需要重新扫描
+        if self.preview_engine:
+            self.preview_engine.invalidate()
+        self.status_var.set(f"已撤销原地转换 - 恢复 {restored} 个文件")
+        messagebox.showinfo("撤销原地转换", f"已恢复 {restored} 个文件，请重新扫描")
+    
     def auto_set_output(self):
         """自动设置输出目录"""
         if self.input_path.get():
             input_dir = self.input_path.get()
             parent_dir = os.path.dirname(input_dir)
-            dir_name = os.path.basename(input_dir)
+            dir_name = strip_archive_extension(os.path.basename(input_dir))
             output_dir = os.path.join(parent_dir, f"{dir_name}_encoded")
             self.output_path.set(output_dir)
     
     def open_output_directory(self):
-        """打开输出目录"""
-        if self.output_path.get() and os.path.exists(self.output_path.get()):
+        """打开输出目录（输出到压缩包时打开压缩包所在的目录）"""
+        directory = self.output_path.get()
+        if directory and is_archive_path(directory):
+            directory = os.path.dirname(os.path.abspath(directory))
+        if directory and os.path.exists(directory):
             try:
                 if os.name == 'nt':  # Windows
-                    os.startfile(self.output_path.get())
+                    os.startfile(directory)
                 else:  # Linux/Mac
                     import subprocess
-                    subprocess.run(['xdg-open', self.output_path.get()])
+                    subprocess.run(['xdg-open', directory])
             except Exception as e:
                 messagebox.showerror("错误", f"无法打开目录: {str(e)}")
         else:
             messagebox.showwarning("警告", "输出目录不存在或未设置")
     
-    def read_file_content(self, file_path, encoding):
-        """读取文件内容，支持多种文件格式"""
+    def read_file_content(self, file_path, encoding, newline=None):
+        """读取文件内容，支持多种文件格式（newline 同 open，只对普通文本文件有效）"""
         file_ext = os.path.splitext(file_path)[1].lower()
         
         if file_ext == '.docx':
@@ -864,13 +4172,51 @@ class EncodingUnifierGUI:
             return self.read_odt_content(file_path)
         else:
             # 普通文本文件
-            with open(file_path, 'r', encoding=encoding) as f:
-                return f.read()
+            with self.open_input(file_path) as raw:
+                if self.can_map_input(file_path) and newline in (None, '') and \
+                        os.fstat(raw.fileno()).st_size >= MMAP_READ_THRESHOLD:
+                    return self.decode_mapped_file(raw, encoding, newline)
+                return io.TextIOWrapper(raw, encoding=encoding, newline=newline).read()
+    
+    def decode_mapped_file(self, raw, encoding, newline):
+        """大文件直接从只读内存映射解码，不在内存中复制整个文件的字节（newline 同 open）"""
+        buffer = map_file(raw)
+        try:
+            with memoryview(buffer) as view:
+                content = str(view, encoding)
+        finally:
+            release_buffer(buffer)
+        if newline is None:
+            content = io.IncrementalNewlineDecoder(None, translate=True).decode(content, final=True)
+        return content
+    
+    def open_input(self, file_path):
+        """以二进制方式打开要转换的输入文件（扫描并转换时使用已读出的内容）"""
+        buffer = self.pipeline_buffers.get(file_path)
+        if buffer is not None:
+            return io.BytesIO(buffer)
+        return self.open_source(file_path, self.input_opener)
+    
+    def open_source(self, file_path, opener=open):
+        """从输入目录打开文件（输入为压缩包时读取压缩包中的成员）"""
+        if self.input_archive is not None:
+            return self.input_archive.open(file_path)
+        return opener(file_path, 'rb')
+    
+    def can_map_input(self, file_path):
+        """输入文件能否映射为内存（压缩包成员和已读出的内容不能）"""
+        return self.input_archive is None and file_path not in self.pipeline_buffers
+    
+    def get_input_mtime(self, file_path):
+        """输入文件的修改时间"""
+        if self.input_archive is not None:
+            return self.input_archive.stat(file_path)[1]
+        return os.stat(file_path).st_mtime
     
     def read_docx_content(self, file_path):
         """读取DOCX文件内容"""
         try:
-            with zipfile.ZipFile(file_path, 'r') as docx_zip:
+            with self.open_input(file_path) as raw, zipfile.ZipFile(raw, 'r') as docx_zip:
                 document_xml = docx_zip.read('word/document.xml')
                 root = ET.fromstring(document_xml)
                 
@@ -888,13 +4234,14 @@ class EncodingUnifierGUI:
             # 尝试使用python-docx2txt (如果可用)
             try:
                 import docx2txt
-                content = docx2txt.process(file_path)
+                with self.open_input(file_path) as raw:
+                    content = docx2txt.process(raw)
                 return content if content else "无法提取文本内容"
             except ImportError:
                 pass
             
             # 简单的二进制读取和文本提取
-            with open(file_path, 'rb') as f:
+            with self.open_input(file_path) as f:
                 raw_data = f.read()
                 # 尝试查找文本内容
                 content = raw_data.decode('utf-8', errors='ignore')
@@ -907,8 +4254,8 @@ class EncodingUnifierGUI:
     def read_rtf_content(self, file_path):
         """读取RTF文件内容"""
         try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
+            with self.open_input(file_path) as raw:
+                content = io.TextIOWrapper(raw, encoding='utf-8', errors='ignore').read()
                 
                 # 简单的RTF内容提取
                 import re
@@ -923,7 +4270,7 @@ class EncodingUnifierGUI:
     def read_odt_content(self, file_path):
         """读取ODT文件内容"""
         try:
-            with zipfile.ZipFile(file_path, 'r') as odt_zip:
+            with self.open_input(file_path) as raw, zipfile.ZipFile(raw, 'r') as odt_zip:
                 content_xml = odt_zip.read('content.xml')
                 root = ET.fromstring(content_xml)
                 
@@ -944,126 +4291,341 @@ class EncodingUnifierGUI:
             try:
                 if target_info['charset'] == 'traditional':
                     # 转换为繁体
-                    converter = self.opencc.OpenCC('s2t')  # 简体到繁体
-                    text = converter.convert(text)
+                    backend, converter = self.get_opencc_converter('s2t')  # 简体到繁体
+                    text = self.parallel_converter.convert(backend, 's2t', text, converter)
                 elif target_info['charset'] == 'simplified':
                     # 转换为简体
-                    converter = self.opencc.OpenCC('t2s')  # 繁体到简体
-                    text = converter.convert(text)
+                    backend, converter = self.get_opencc_converter('t2s')  # 繁体到简体
+                    text = self.parallel_converter.convert(backend, 't2s', text, converter)
             except Exception as e:
                 # 转换失败，使用原文
                 pass
         
         return text
+    
+    def get_converter_backend(self):
+        """当前选择的简繁转换引擎"""
+        name = self.converter_backend_var.get()
+        return next((key for key, value in CONVERTER_BACKENDS.items() if value == name), 'opencc')
+    
+    def get_opencc_converter(self, config):
+        """获取简繁转换器 (实际使用的引擎, 转换器)，词典只在首次使用时加载"""
+        selected = self.get_converter_backend()
+        entry = self.opencc_converters.get((selected, config))
+        if entry is None:
+            backend = selected
+            try:
+                converter = create_converter(backend, config)
+            except (OSError, ValueError):
+                # 内置引擎的词典无法编译或加载时使用 OpenCC
+                backend = 'opencc'
+                converter = create_converter(backend, config)
+            entry = (backend, converter)
+            self.opencc_converters[(selected, config)] = entry
+        return entry
             
     def scan_files(self):
         """扫描文件"""
+        extensions = self.prepare_scan()
+        if extensions is None:
+            return
+        
+        # 在后台线程中执行扫描
+        self.status_var.set("正在扫描文件...")
+        self.progress_var.set(0)
+        
+        thread = threading.Thread(target=self._scan_files_thread, args=(extensions,))
+        thread.daemon = True
+        thread.start()
+    
+    def scan_and_process(self):
+        """扫描并转换：不等扫描结束，检测完的文件立即转换（适合无人值守的大批量处理，不能先预览和排除）"""
+        extensions = self.prepare_scan()
+        if extensions is None:
+            return
+        if self.in_place_var.get() and self.input_archive is not None:
+            messagebox.showerror("错误", "原地转换不支持压缩包输入")
+            return
+        if not self.confirm_output():
+            return
+        
+        self.status_var.set("正在扫描并转换...")
+        self.progress_var.set(0)
+        
+        thread = threading.Thread(target=self._pipeline_thread, args=(extensions,))
+        thread.daemon = True
+        thread.start()
+    
+    def prepare_scan(self):
+        """检查扫描设置并清除之前的结果，返回要检测编码的扩展名（设置有误时返回 None）"""
         if not self.input_path.get():
             messagebox.showerror("错误", "请先选择输入目录")
-            return
+            return None
             
         if not os.path.exists(self.input_path.get()):
             messagebox.showerror("错误", "输入目录不存在")
-            return
+            return None
+        
+        # 输入为文件时作为压缩包读取
+        if self.input_archive is not None:
+            self.input_archive.close()
+            self.input_archive = None
+        if os.path.isfile(self.input_path.get()):
+            try:
+                self.input_archive = ArchiveInput(self.input_path.get())
+            except Exception as e:
+                messagebox.showerror("错误", f"无法读取输入压缩包: {str(e)}")
+                return None
             
-        if not self.output_path.get():
+        if not self.output_path.get() and not self.in_place_var.get():
             messagebox.showerror("错误", "请先选择输出目录")
-            return
+            return None
             
         extensions = self.get_file_extensions()
         if not extensions:
             messagebox.showerror("错误", "请设置要处理的文件类型")
-            return
+            return None
         
-        # 清除排除列表
+        # 清除排除列表和之前的结果
         self.excluded_files.clear()
-        
-        # 在后台线程中执行扫描
-        self.status_var.set("正在扫描文件...")
-        self.progress_var.set(0)
-        
-        thread = threading.Thread(target=self._scan_files_thread, args=(extensions,))
-        thread.daemon = True
-        thread.start()
-        
+        self.duplicate_of.clear()
+        self.dedup_stats = {}
+        self.binary_formats.clear()
+        self.encoding_results.clear()
+        self.copy_files.clear()
+        self.encoding_view.set_keys([])
+        self.encoding_view_synced = 0
+        self.copy_view_synced = 0
+        if self.copy_tree is not None:
+            self.copy_view.set_keys([])
+        
+        # 文件可能已被修改，预览缓存和编码检查结果失效
+        if self.preview_engine:
+            self.preview_engine.invalidate()
+        self.lossy_report = None
+        self.lossy_analysis_generation += 1
+        return extensions
+    
+    def list_input_files(self, target_extensions):
+        """遍历输入目录，返回 (需要检测编码的文件, 直接复制的文件)"""
+        encoding_files = []
+        copy_files = []
+        for root, dirs, filenames in os.walk(self.input_path.get()):
+            dirs[:] = [d for d in dirs if d != UNDO_DIR_NAME]
+            for filename in filenames:
+                file_path = os.path.join(root, filename)
+                if not self.owns_file(file_path):
+                    continue
+                
+                # 判断是否需要编码处理
+                file_ext = os.path.splitext(filename)[1].lower()
+                if file_ext in target_extensions:
+                    encoding_files.append(file_path)
+                else:
+                    copy_files.append(file_path)
+        return encoding_files, copy_files
+    
+    def detect_files(self, encoding_files, keep_buffers=False):
+        """并发读取并按顺序检测编码，每检测完一个文件产出该文件；内容相同的文件直接使用之前的结果。
+        keep_buffers 时读出的内容（内存映射的大文件除外）保留在 pipeline_buffers 中供转换使用"""
+        # 网络共享等高延迟文件系统上并发读取，检测按原顺序进行
+        scheduler = ReadScheduler(self.get_scan_concurrency(), opener=self.input_opener)
+        
+        def read_for_detection(file_path):
+            if os.path.splitext(file_path)[1].lower() in ['.doc', '.docx', '.rtf', '.odt']:
+                return None
+            try:
+                return scheduler.read_file(file_path)
+            except OSError:
+                return None  # 检测时重新读取并记录错误
+        
+        priors = EncodingPriors()
+        content_index = ContentIndex(self.input_opener) if self.dedup_var.get() else None
+        detect_timing = None  # 已检测内容的字节数和耗时（第一个文件包含延迟导入，不计入）
+        raw_contents = scheduler.map(read_for_detection, encoding_files)
+        for file_path, raw_data in zip(encoding_files, raw_contents):
+            # 先看文件开头：二进制文件不参与去重，也不做编码检测
+            sniffed = sniff_content(raw_data[:SNIFF_BYTES]) if raw_data is not None else None
+            
+            # 内容与之前的文件相同时直接使用它的检测结果
+            original = None
+            if content_index is not None and raw_data is not None and sniffed[0] != 'binary':
+                original = content_index.add(file_path, raw_data)
+            if original is not None:
+                release_buffer(raw_data)
+                self.duplicate_of[file_path] = original
+                self.encoding_results[file_path] = self.encoding_results[original].to_dict()
+            else:
+                # 检测编码
+                start = time.perf_counter()
+                encoding_info = self.detect_file_encoding(file_path, raw_data, priors, sniffed)
+                if encoding_info['file_type'] != 'binary':
+                    if detect_timing is None:
+                        detect_timing = [0, 0.0]
+                    else:
+                        detect_timing[0] += encoding_info.get('size', 0)
+                        detect_timing[1] += time.perf_counter() - start
+                self.add_detection_result(file_path, encoding_info)
+                if keep_buffers and isinstance(raw_data, bytes) and file_path in self.encoding_results:
+                    self.pipeline_buffers[file_path] = raw_data
+            yield file_path
+        
+        if content_index is not None:
+            duplicate_bytes = content_index.total_bytes - content_index.unique_bytes
+            detected_bytes, detect_seconds = detect_timing or (0, 0.0)
+            self.dedup_stats = {
+                'files': len(self.duplicate_of),
+                'total_bytes': content_index.total_bytes,
+                'unique_bytes': content_index.unique_bytes,
+                # 按已检测内容的平均速度估算
+                'detect_saved': detect_seconds * duplicate_bytes / max(detected_bytes, 1),
+            }
+    
     def _scan_files_thread(self, target_extensions):
         """后台扫描文件线程"""
         try:
-            # 清除之前的结果
-            self.encoding_results.clear()
-            self.copy_files.clear()
+            if self.input_archive is not None:
+                self._scan_archive(target_extensions)
+                return
             
             # 找到所有文件
-            all_files = []
-            encoding_files = []
-            copy_files = []
-            
-            for root, dirs, filenames in os.walk(self.input_path.get()):
-                for filename in filenames:
-                    file_path = os.path.join(root, filename)
-                    all_files.append(file_path)
-                    
-                    # 判断是否需要编码处理
-                    file_ext = os.path.splitext(filename)[1].lower()
-                    if file_ext in target_extensions:
-                        encoding_files.append(file_path)
-                    else:
-                        copy_files.append(file_path)
-            
-            if not all_files:
+            encoding_files, copy_files = self.list_input_files(target_extensions)
+            total_files = len(encoding_files) + len(copy_files)
+            if not total_files:
                 self.root.after(0, lambda: self.status_var.set("未找到任何文件"))
                 return
-                
+            
             # 处理需要编码检测的文件
-            total_encoding_files = len(encoding_files)
-            for i, file_path in enumerate(encoding_files):
+            for i, file_path in enumerate(self.detect_files(encoding_files)):
                 # 更新进度
-                progress = (i / len(all_files)) * 50  # 前50%用于编码检测
+                progress = (i / total_files) * 50  # 前50%用于编码检测
                 self.root.after(0, lambda p=progress: self.progress_var.set(p))
                 
-                # 检测编码
-                encoding_info = self.detect_file_encoding(file_path)
-                self.encoding_results[file_path] = encoding_info
-                
-                # 更新界面
-                self.root.after(0, lambda fp=file_path, ei=encoding_info: self.update_encoding_file_list(fp, ei))
+                # 批量更新界面
+                if i % SCAN_VIEW_BATCH == 0:
+                    self.root.after(0, self.sync_file_views)
             
             # 处理需要直接复制的文件
-            for i, file_path in enumerate(copy_files):
+            scheduler = ReadScheduler(self.get_scan_concurrency())
+            file_infos = scheduler.map(self.get_file_info, copy_files)
+            for i, (file_path, file_info) in enumerate(zip(copy_files, file_infos)):
                 # 更新进度
                 progress = 50 + (i / len(copy_files)) * 50  # 后50%用于复制文件信息
                 self.root.after(0, lambda p=progress: self.progress_var.set(p))
                 
-                # 获取文件信息
-                file_info = self.get_file_info(file_path)
                 self.copy_files[file_path] = file_info
                 
-                # 更新界面
-                self.root.after(0, lambda fp=file_path, fi=file_info: self.update_copy_file_list(fp, fi))
+                # 批量更新界面
+                if i % SCAN_VIEW_BATCH == 0:
+                    self.root.after(0, self.sync_file_views)
             
             # 完成扫描
             self.root.after(0, lambda: self.scan_complete(target_extensions))
             
         except Exception as e:
-            self.root.after(0, lambda: messagebox.showerror("扫描错误", f"扫描过程中出现错误: {str(e)}"))
+            self.root.after(0, lambda msg=str(e): self.report_error("扫描错误", f"扫描过程中出现错误: {msg}"))
+    
+    def _pipeline_thread(self, target_extensions):
+        """扫描并转换线程：读取、检测和转换同时进行。
+        读取由 ReadScheduler 限制在途数量，检测在本线程按顺序进行，检测完的文件交给转换线程池；
+        在途的转换任务有上限，转换跟不上时检测自然停下等待（反压），已读出的内容直接用于转换"""
+        try:
+            if self.input_archive is not None:
+                # 压缩包只能按成员顺序读取，先扫描再处理
+                self._scan_files_thread(target_extensions)
+                if self.encoding_results or self.copy_files:
+                    self._process_files_thread()
+                return
+            
+            encoding_files, copy_files = self.list_input_files(target_extensions)
+            if not encoding_files and not copy_files:
+                self.root.after(0, lambda: self.status_var.set("未找到任何文件"))
+                return
+            
+            target_encoding_info = OUTPUT_ENCODINGS[self.output_encoding_var.get()]
+            sink = self.open_output_sink()
+            total_files = len(encoding_files) + (0 if sink.in_place else len(copy_files))
+            
+            def tasks():
+                for i, file_path in enumerate(self.detect_files(encoding_files, keep_buffers=True)):
+                    if i % SCAN_VIEW_BATCH == 0:
+                        self.root.after(0, self.sync_file_views)
+                    if file_path in self.encoding_results:
+                        yield 'encoding', file_path
+                    elif not sink.in_place:
+                        yield 'copy', file_path  # 嗅探为二进制的文件直接复制
+                if sink.in_place:
+                    return  # 原地转换只改写编码文件
+                for file_path in copy_files:
+                    self.copy_files[file_path] = self.get_file_info(file_path)
+                    yield 'copy', file_path
+            
+            counts = self._run_tasks(tasks(), sink, total_files, target_encoding_info)
+            total_files = counts['success'] + counts['fail']  # 原地转换时二进制文件不处理
+            self.root.after(0, self.sync_file_views)
+            self.root.after(0, lambda: self.processing_complete(
+                total_files, counts['success'], counts['fail'], counts['convert'],
+                counts['encoding_copy'], counts['direct_copy'], counts['excluded_copy'], target_encoding_info))
+            
+        except Exception as e:
+            self.root.after(0, lambda msg=str(e): self.report_error("处理错误", f"处理过程中出现错误: {msg}"))
+        finally:
+            self.pipeline_buffers.clear()
+            
+    def _scan_archive(self, target_extensions):
+        """扫描输入压缩包：按压缩包中的顺序遍历一遍成员，需要检测编码的成员边读边检测"""
+        archive = self.input_archive
+        priors = EncodingPriors()
+        
+        def wanted(file_path):
+            return os.path.splitext(file_path)[1].lower() in target_extensions
+        
+        for i, (file_path, size, f) in enumerate(archive.iter_members(wanted)):
+            if i % SCAN_VIEW_BATCH == 0:
+                self.root.after(0, lambda p=archive.progress() * 100: self.progress_var.set(p))
+                self.root.after(0, self.sync_file_views)
+            if not self.owns_file(file_path):
+                continue
             
+            if wanted(file_path):
+                if f is not None:
+                    archive.prefetch(file_path, f, size)
+                self.add_detection_result(file_path, self.detect_file_encoding(file_path, priors=priors))
+                archive.release(file_path)
+            else:
+                self.copy_files[file_path] = self.get_file_info(file_path)
+        
+        if not self.encoding_results and not self.copy_files:
+            self.root.after(0, lambda: self.status_var.set("未找到任何文件"))
+            return
+        self.root.after(0, lambda: self.scan_complete(target_extensions))
+    
+    def owns_file(self, file_path):
+        """分片执行时文件是否属于本分片"""
+        return self.shard is None or self.shard.owns(os.path.relpath(file_path, self.input_path.get()))
+    
+    def report_error(self, title, message):
+        """后台线程出错时在界面上提示"""
+        messagebox.showerror(title, message)
+    
+    def get_scan_concurrency(self):
+        """扫描时同时在途的读取数"""
+        try:
+            return max(1, min(64, int(self.scan_concurrency_var.get())))
+        except (tk.TclError, ValueError):
+            return SCAN_READ_CONCURRENCY
+    
     def get_file_info(self, file_path):
         """获取文件信息"""
         try:
-            stat = os.stat(file_path)
-            size = stat.st_size
-            
-            # 格式化文件大小
-            if size < 1024:
-                size_str = f"{size} B"
-            elif size < 1024 * 1024:
-                size_str = f"{size/1024:.1f} KB"
+            if self.input_archive is not None:
+                size = self.input_archive.stat(file_path)[0]
             else:
-                size_str = f"{size/(1024*1024):.1f} MB"
-                
+                size = os.stat(file_path).st_size
+            
             return {
                 'size': size,
-                'size_str': size_str,
+                'size_str': format_size(size),
                 'exists': True
             }
         except Exception:
@@ -1073,8 +4635,9 @@ class EncodingUnifierGUI:
                 'exists': False
             }
             
-    def detect_file_encoding(self, file_path):
-        """检测文件编码"""
+    def detect_file_encoding(self, file_path, raw_data=None, priors=None, sniffed=None):
+        """检测文件编码（raw_data 为已经读出的文件内容，priors 为本次扫描的目录编码先验，
+        sniffed 为已经得到的 sniff_content 结果）"""
         result = {
             'chardet_encoding': 'unknown',
             'chardet_confidence': 0,
@@ -1091,6 +4654,7 @@ class EncodingUnifierGUI:
             if file_ext in ['.doc', '.docx', '.rtf', '.odt']:
                 result['file_type'] = 'document'
                 try:
+                    result['size'] = self.get_file_info(file_path)['size']
                     content = self.read_file_content(file_path, 'utf-8')
                     result['has_chinese'] = any('\u4e00' <= char <= '\u9fff' for char in content)
                     result['best_encoding'] = 'utf-8'  # 文档类型默认使用UTF-8
@@ -1105,161 +4669,502 @@ class EncodingUnifierGUI:
                 return result
             
             # 普通文本文件编码检测
-            # 使用chardet检测
-            with open(file_path, 'rb') as f:
-                raw_data = f.read()
-                if len(raw_data) > 0:
-                    chardet_result = chardet.detect(raw_data)
-                    result['chardet_encoding'] = chardet_result['encoding'] or 'unknown'
-                    result['chardet_confidence'] = chardet_result['confidence'] or 0
-            
-            # 尝试用不同编码读取
-            test_encodings = ['utf-8', 'gb18030', 'gbk', 'gb2312', 'big5', 'utf-8-sig', 'ascii']
-            best_score = -1
-            best_encoding = 'unknown'
-            
-            for encoding in test_encodings:
-                try:
-                    with open(file_path, 'r', encoding=encoding) as f:
-                        content = f.read()
-                        
-                    # 评分系统
-                    score = 0
-                    has_chinese = any('\u4e00' <= char <= '\u9fff' for char in content)
-                    has_mojibake = any(char in content for char in ['锟', '烫', '屯', '�'])
-                    
-                    if not has_mojibake:
-                        score += 10
-                    if has_chinese:
-                        score += 5
-                        result['has_chinese'] = True
-                    
-                    result['encodings_test'][encoding] = {
-                        'success': True,
-                        'has_chinese': has_chinese,
-                        'has_mojibake': has_mojibake,
-                        'score': score
-                    }
-                    
-                    if score > best_score:
-                        best_score = score
-                        best_encoding = encoding
-                        
-                except Exception:
-                    result['encodings_test'][encoding] = {
-                        'success': False,
-                        'error': True
-                    }
-            
-            result['best_encoding'] = best_encoding
+            # 大文件映射为只读内存，chardet 和各编码的试解码共用同一个缓冲区
+            if raw_data is None:
+                raw_data = self.read_input_buffer(file_path)
+            try:
+                content_type, unicode_encoding = sniffed or sniff_content(raw_data[:SNIFF_BYTES])
+                if content_type == 'binary':
+                    # 二进制文件（压缩包、图片、含 NUL 的数据等）不做编码检测，记录结果时归入直接复制的文件
+                    result.update(file_type='binary', binary_format=unicode_encoding, size=len(raw_data))
+                elif unicode_encoding is not None:
+                    self.detect_unicode_encoding(raw_data, result, unicode_encoding, priors,
+                                                 os.path.dirname(file_path))
+                else:
+                    self.detect_text_encoding(raw_data, result, priors, os.path.dirname(file_path))
+            finally:
+                release_buffer(raw_data)
             
         except Exception as e:
             result['error'] = str(e)
         
         return result
     
-    def update_encoding_file_list(self, file_path, encoding_info):
-        """更新编码文件列表显示"""
-        rel_path = os.path.relpath(file_path, self.input_path.get())
+    def add_detection_result(self, file_path, encoding_info):
+        """记录检测结果：嗅探为二进制的文件归入直接复制的文件"""
+        if encoding_info['file_type'] != 'binary':
+            self.encoding_results[file_path] = encoding_info
+            return
+        size = encoding_info['size']
+        self.copy_files[file_path] = {'size': size, 'size_str': format_size(size), 'exists': True}
+        self.copy_files.set_action(file_path, f"二进制 ({encoding_info['binary_format']})")
+        self.binary_formats[encoding_info['binary_format']] += 1
+    
+    def detect_unicode_encoding(self, raw_data, result, encoding, priors=None, directory=None):
+        """嗅探为 UTF-16/32 的文本不需要 chardet 和试解码（这些编码与 ASCII 不兼容，试解码的结果没有意义），
+        只按该编码解码整个文件确认；只是开头像 UTF-16/32、后面无法解码时按普通文本检测"""
+        try:
+            has_chinese, has_mojibake = scan_decoded(raw_data, encoding)
+        except UnicodeDecodeError:
+            self.detect_text_encoding(raw_data, result, priors, directory)
+            return
+        result['size'] = len(raw_data)
+        result['best_encoding'] = encoding
+        result['has_chinese'] = has_chinese
+    
+    def read_input_buffer(self, file_path):
+        """读取整个输入文件用于检测：大文件映射为只读内存（用完后调用 release_buffer），小文件直接读取"""
+        with self.open_source(file_path) as f:
+            if self.input_archive is None and os.fstat(f.fileno()).st_size >= MMAP_READ_THRESHOLD:
+                return map_file(f)
+            return f.read()
+    
+    def detect_text_encoding(self, raw_data, result, priors=None, directory=None):
+        """检测缓冲区中文本的编码，结果写入 result"""
+        result['size'] = len(raw_data)
+        if len(raw_data) > 0:
+            chardet_result, result['chardet_bytes'] = detect_chardet(raw_data)
+            result['chardet_encoding'] = chardet_result['encoding'] or 'unknown'
+            result['chardet_confidence'] = chardet_result['confidence'] or 0
         
-        # 确定显示的编码和状态
-        best_encoding = encoding_info.get('best_encoding', 'unknown')
-        confidence = encoding_info.get('chardet_confidence', 0)
-        target_encoding_info = OUTPUT_ENCODINGS[self.output_encoding_var.get()]
+        # 纯 ASCII 内容用任何候选编码（都兼容 ASCII）解码结果都相同，不需要逐个解码
+        ascii_only = NON_ASCII_PATTERN.search(raw_data) is None
         
-        # 确定状态和操作
-        if encoding_info.get('file_type') == 'document':
-            if encoding_info.get('has_chinese', False):
-                status = "需要转换"
-                action = f"文档→{target_encoding_info['name']}"
+        tests = {}
+        
+        def test(encoding):
+            """试解码并评分"""
+            try:
+                has_chinese, has_mojibake = (False, False) if ascii_only else scan_decoded(raw_data, encoding)
+                    
+                # 评分系统
+                score = 0
+                
+                if not has_mojibake:
+                    score += 10
+                if has_chinese:
+                    score += 5
+                    result['has_chinese'] = True
+                
+                tests[encoding] = {
+                    'success': True,
+                    'has_chinese': has_chinese,
+                    'has_mojibake': has_mojibake,
+                    'score': score
+                }
+                return score
+                    
+            except Exception:
+                tests[encoding] = {
+                    'success': False,
+                    'error': True
+                }
+                return -1
+        
+        # 先试目录的先验编码：得到最高分时只需要再试排在它前面、没有被证据排除的编码
+        prior, skip = (priors.get(directory, result['chardet_encoding']) if priors is not None and not ascii_only
+                       else (None, frozenset()))
+        if prior is not None and test(prior) >= BEST_SCORE:
+            earlier = TEST_ENCODINGS[:TEST_ENCODINGS.index(prior)]
+            if any(can_decode(raw_data, encoding) for encoding in skip):
+                # 被跳过的编码也能解码（与先验冲突）：排在前面的编码都要评分
+                candidates = list(earlier)
             else:
-                status = "无中文"
-                action = "直接复制"
-        elif best_encoding == target_encoding_info['encoding'] and target_encoding_info['charset'] == 'auto':
-            status = "✓ 目标编码"
-            action = "直接复制"
-        elif encoding_info.get('has_chinese', False):
-            status = "需要转换"
-            action = f"{best_encoding}→{target_encoding_info['name']}"
+                candidates = [encoding for encoding in earlier if encoding not in skip]
         else:
-            status = "无中文"
-            action = "直接复制"
+            # 没有先验或与先验冲突：按原顺序完整检测
+            candidates = [encoding for encoding in TEST_ENCODINGS if encoding not in tests]
+        
+        for encoding in candidates:
+            # 已有编码得到最高分时，后面的编码不可能胜出（同分取靠前的编码），不再试解码
+            if test(encoding) >= BEST_SCORE:
+                break
+        
+        # 按原顺序选出得分最高的编码（同分取靠前的编码）
+        best_score = -1
+        best_encoding = 'unknown'
+        for encoding in TEST_ENCODINGS:
+            if encoding in tests:
+                result['encodings_test'][encoding] = tests[encoding]
+                if tests[encoding].get('score', -1) > best_score:
+                    best_score = tests[encoding]['score']
+                    best_encoding = encoding
+        
+        result['best_encoding'] = best_encoding
+        if priors is not None and not ascii_only:
+            priors.record(directory, best_encoding, tests, result['chardet_encoding'])
+    
+    def scan_report(self):
+        """扫描统计（编码分布在扫描时已实时累计）"""
+        return {
+            'input': self.input_path.get(),
+            'output': self.output_path.get(),
+            'extensions': self.file_extensions_var.get(),
+            'output_encoding': self.output_encoding_var.get(),
+            'encoding_files': len(self.encoding_results),
+            'copy_files': len(self.copy_files),
+            'copy_bytes': self.copy_files.total_bytes,
+            'encoding_counts': dict(self.encoding_results.chinese_encoding_counts),
+            'dedup': dict(self.dedup_stats),
+            'binary': dict(self.binary_formats),
+        }
+    
+    def scan_complete(self, target_extensions):
+        """扫描完成"""
+        self.progress_var.set(100)
+        
+        # 生成统计报告
+        total_files = len(self.encoding_results) + len(self.copy_files)
+        summary = format_scan_summary(self.scan_report())
         
-        # 默认选中状态
-        select_text = "☑"
+        # 按当前排序和过滤条件显示完整列表
+        self.rebuild_file_lists()
+        
+        # 显示扫描结果
+        self.status_var.set(f"扫描完成 - 总计 {total_files} 个文件")
+        self.ensure_tab('summary')
+        self.summary_text.delete(1.0, tk.END)
+        self.summary_text.insert(tk.END, summary)
+        
+        # 切换到统计信息标签页
+        self.notebook.select(2)
+        
+        # 扫描完成后在后台检查编码兼容性
+        self.start_encodability_analysis()
+    
+    def plan_header(self):
+        """扫描计划的第一行：输入输出和处理设置"""
+        def policy_key(policies, name, default):
+            return next((key for key, policy in policies.items() if policy['name'] == name), default)
+        return {
+            'format': PLAN_FORMAT,
+            'version': PLAN_VERSION,
+            'input': self.input_path.get(),
+            'output': self.output_path.get(),
+            'extensions': self.file_extensions_var.get(),
+            'output_encoding': self.output_encoding_var.get(),
+            'error_policy': policy_key(ERROR_POLICIES, self.error_policy_var.get(), 'fail'),
+            'eol': policy_key(EOL_POLICIES, self.eol_policy_var.get(), 'preserve'),
+            'bom': policy_key(BOM_POLICIES, self.bom_policy_var.get(), 'auto'),
+            'trim_trailing': self.trim_trailing_var.get(),
+            'in_place': self.in_place_var.get(),
+            'dedup': dict(self.dedup_stats),
+            'binary': dict(self.binary_formats),
+        }
+    
+    def plan_records(self):
+        """扫描计划中的文件记录，按相对路径排序，两次扫描的计划可以直接 diff"""
+        root = self.input_path.get()
+        # 内容相同的一组文件在计划中都指向组中按路径排序的第一个文件（与扫描顺序无关），
+        # 加载计划时按计划顺序第一个文件作为原文件，保存加载后的计划得到相同的内容
+        groups = {}
+        for file_path, original in self.duplicate_of.items():
+            relpath = os.path.relpath(file_path, root).replace(os.sep, '/')
+            groups[original] = min(groups.get(original, os.path.relpath(original, root).replace(os.sep, '/')),
+                                   relpath)
+        records = []
+        for file_path, info in self.encoding_results.items():
+            record = {'path': os.path.relpath(file_path, root).replace(os.sep, '/'), 'kind': 'encoding',
+                      'size': info.get('size', 0), 'encoding': info.get('best_encoding'),
+                      'chardet': info.get('chardet_encoding'),
+                      'confidence': round(info.get('chardet_confidence') or 0, 4),
+                      'chardet_bytes': info.get('chardet_bytes', 0), 'chinese': info.get('has_chinese', False),
+                      'type': info.get('file_type', 'text'), 'tests': encode_plan_tests(info.get('encodings_test', {}))}
+            if 'error' in info:
+                record['error'] = info['error']
+            if file_path in self.excluded_files:
+                record['excluded'] = True
+            if file_path in self.error_policies:
+                record['policy'] = self.error_policies[file_path]
+            group = groups.get(self.duplicate_of.get(file_path, file_path))
+            if group is not None and group != record['path']:
+                record['duplicate_of'] = group
+            records.append(record)
+        for file_path, info in self.copy_files.items():
+            records.append({'path': os.path.relpath(file_path, root).replace(os.sep, '/'), 'kind': 'copy',
+                            'size': info.get('size', 0), 'exists': info.get('exists', True)})
+        records.sort(key=lambda record: record['path'])
+        return records
+    
+    def apply_plan(self, header, records):
+        """用扫描计划代替扫描：恢复设置、检测结果、排除的文件和单独设置的处理策略"""
+        if self.input_archive is not None:
+            self.input_archive.close()
+            self.input_archive = None
+        self.input_path.set(header['input'])
+        self.output_path.set(header['output'])
+        self.file_extensions_var.set(header['extensions'])
+        if header['output_encoding'] not in OUTPUT_ENCODINGS:
+            raise ValueError(f"未知的输出编码: {header['output_encoding']}")
+        self.output_encoding_var.set(header['output_encoding'])
+        self.error_policy_var.set(ERROR_POLICIES[header['error_policy']]['name'])
+        self.eol_policy_var.set(EOL_POLICIES[header['eol']]['name'])
+        self.bom_policy_var.set(BOM_POLICIES[header['bom']]['name'])
+        self.trim_trailing_var.set(header['trim_trailing'])
+        self.in_place_var.set(header['in_place'])
+        if os.path.isfile(header['input']):
+            self.input_archive = ArchiveInput(header['input'])
+        
+        self.excluded_files.clear()
+        self.error_policies.clear()
+        self.duplicate_of.clear()
+        self.encoding_results.clear()
+        self.copy_files.clear()
+        self.dedup_stats = dict(header.get('dedup', {}))
+        self.binary_formats = Counter(header.get('binary', {}))
+        
+        root = header['input']
+        leaders = {}  # 内容相同的一组文件中按计划顺序的第一个（处理时作为原文件）
+        for record in records:
+            file_path = os.path.join(root, *record['path'].split('/'))
+            if not self.owns_file(file_path):
+                continue
+            if record['kind'] == 'copy':
+                self.copy_files[file_path] = {'size': record['size'], 'size_str': format_size(record['size']),
+                                              'exists': record.get('exists', True)}
+                continue
+            
+            info = {'size': record['size'], 'best_encoding': record['encoding'],
+                    'chardet_encoding': record['chardet'], 'chardet_confidence': record['confidence'],
+                    'chardet_bytes': record['chardet_bytes'], 'has_chinese': record['chinese'],
+                    'file_type': record['type'], 'encodings_test': decode_plan_tests(record['tests'])}
+            if 'error' in record:
+                info['error'] = record['error']
+            self.encoding_results[file_path] = info
+            if record.get('excluded'):
+                self.excluded_files.add(file_path)
+            if 'policy' in record:
+                self.error_policies[file_path] = record['policy']
+            group = record.get('duplicate_of', record['path'])
+            leader = leaders.setdefault(group, file_path)
+            if leader != file_path:
+                self.duplicate_of[file_path] = leader
+    
+    def save_plan(self):
+        """保存扫描计划"""
+        if not self.encoding_results and not self.copy_files:
+            messagebox.showerror("错误", "请先扫描文件")
+            return
+        initial = os.path.basename(self.input_path.get().rstrip('/\\')) + PLAN_EXTENSION
+        path = filedialog.asksaveasfilename(
+            title="保存扫描计划",
+            initialfile=initial,
+            defaultextension=PLAN_EXTENSION,
+            filetypes=[("扫描计划", "*" + PLAN_EXTENSION), ("所有文件", "*.*")]
+        )
+        if not path:
+            return
+        try:
+            write_jsonl(path, self.plan_header(), self.plan_records())
+        except OSError as e:
+            messagebox.showerror("错误", f"无法保存扫描计划: {str(e)}")
+            return
+        self.status_var.set(f"扫描计划已保存: {path}")
+    
+    def load_plan(self):
+        """加载扫描计划，不重新扫描即可预览和处理"""
+        path = filedialog.askopenfilename(
+            title="加载扫描计划",
+            filetypes=[("扫描计划", "*" + PLAN_EXTENSION), ("所有文件", "*.*")]
+        )
+        if not path:
+            return
+        try:
+            header, records = read_plan(path)
+            self.apply_plan(header, records)
+        except (OSError, ValueError, KeyError) as e:
+            messagebox.showerror("错误", f"无法加载扫描计划: {str(e)}")
+            return
         
-        # 插入到树形视图
-        self.encoding_tree.insert('', 'end', values=(
-            select_text,
-            rel_path,
-            best_encoding,
-            f"{confidence:.2f}",
-            status,
-            action
-        ), tags=(file_path,))
+        # 和扫描完成时一样刷新列表和统计，预览缓存和编码检查结果失效
+        self.encoding_view_synced = 0
+        self.copy_view_synced = 0
+        if self.preview_engine:
+            self.preview_engine.invalidate()
+        self.lossy_report = None
+        self.lossy_analysis_generation += 1
+        self.scan_complete(self.get_file_extensions())
+        self.status_var.set(f"已加载扫描计划 - 总计 {len(self.encoding_results) + len(self.copy_files)} 个文件")
+    
+    def create_normalizer(self):
+        """按当前设置创建换行符/BOM/行尾空白规范化器"""
+        eol = next((key for key, policy in EOL_POLICIES.items() if policy['name'] == self.eol_policy_var.get()),
+                   'preserve')
+        bom = next((key for key, policy in BOM_POLICIES.items() if policy['name'] == self.bom_policy_var.get()),
+                   'auto')
+        return TextNormalizer(eol, bom, self.trim_trailing_var.get())
+    
+    def get_error_policy(self, file_path):
+        """获取文件的无法编码字符处理策略"""
+        policy = self.error_policies.get(file_path)
+        if policy:
+            return policy
+        default_name = self.error_policy_var.get()
+        for key, policy_info in ERROR_POLICIES.items():
+            if policy_info['name'] == default_name:
+                return key
+        return "fail"
+    
+    def start_encodability_analysis(self):
+        """在后台检查转换结果能否用目标编码完整表示"""
+        option = self.output_encoding_var.get()
+        coverage = CodecCoverage.get(OUTPUT_ENCODINGS[option]['encoding'])
+        files = [(fp, info.get('best_encoding', 'utf-8')) for fp, info in self.encoding_results.items()
+                 if info.get('has_chinese', False) and fp not in self.excluded_files]
+        
+        self.lossy_analysis_generation += 1
+        generation = self.lossy_analysis_generation
+        
+        if coverage.lossless:
+            # 目标编码能表示所有字符，无需读取文件
+            self.lossy_report = {'option': option, 'files': {}, 'checked': len(files)}
+            return
         
-    def update_copy_file_list(self, file_path, file_info):
-        """更新复制文件列表显示"""
-        rel_path = os.path.relpath(file_path, self.input_path.get())
+        self.lossy_report = None
+        thread = threading.Thread(target=self._analyze_encodability_thread,
+                                  args=(files, option, coverage, generation))
+        thread.daemon = True
+        thread.start()
+    
+    def _analyze_encodability_thread(self, files, option, coverage, generation):
+        """后台编码兼容性检查线程"""
+        report_files = {}
+        for i, (file_path, source_encoding) in enumerate(files):
+            # 重新扫描或目标编码改变时放弃本次检查
+            if generation != self.lossy_analysis_generation:
+                return
+            
+            if i % 50 == 0:
+                self.root.after(0, lambda n=i: self.status_var.set(f"正在检查编码兼容性... {n}/{len(files)}"))
+            
+            try:
+                content = self.read_file_content(file_path, source_encoding)
+                converted_content = self.convert_text_encoding(content, option)
+            except Exception:
+                continue
+            
+            result = analyze_encodability(converted_content, coverage)
+            if result['count']:
+                report_files[file_path] = result
         
-        # 插入到树形视图
-        self.copy_tree.insert('', 'end', values=(
-            rel_path,
-            file_info.get('size_str', 'Unknown'),
-            "待复制"
-        ), tags=(file_path,))
+        report = {'option': option, 'files': report_files, 'checked': len(files)}
+        self.root.after(0, lambda: self.encodability_analysis_complete(generation, report))
     
-    def scan_complete(self, target_extensions):
-        """扫描完成"""
-        self.progress_var.set(100)
+    def encodability_analysis_complete(self, generation, report):
+        """编码兼容性检查完成"""
+        if generation != self.lossy_analysis_generation:
+            return
+        self.lossy_report = report
         
-        # 统计编码分布
-        encodings = []
-        for file_path, info in self.encoding_results.items():
-            if info.get('has_chinese', False):
-                encodings.append(info.get('best_encoding', 'unknown'))
+        target_name = OUTPUT_ENCODINGS[report['option']]['name']
+        if not report['files']:
+            self.status_var.set(f"编码检查完成 - 所有文件都能用 {target_name} 完整表示")
+            return
         
-        encoding_counter = Counter(encodings) if encodings else Counter()
+        total_chars = sum(result['count'] for result in report['files'].values())
+        message = (f"\n编码兼容性检查:\n"
+                   f"  {len(report['files'])} 个文件含有 {target_name} 无法表示的字符 (共 {total_chars} 个)\n"
+                   f"  点击\"编码检查\"查看位置并设置处理方式\n")
+        self.ensure_tab('summary')
+        self.summary_text.insert(tk.END, message)
+        self.status_var.set(f"编码检查完成 - {len(report['files'])} 个文件含有无法编码的字符")
+    
+    def show_encodability_report(self):
+        """显示编码兼容性检查结果，并按文件设置处理方式"""
+        if not self.encoding_results:
+            messagebox.showerror("错误", "请先扫描文件")
+            return
         
-        # 计算文件总数和大小
-        total_encoding_files = len(self.encoding_results)
-        total_copy_files = len(self.copy_files)
-        total_files = total_encoding_files + total_copy_files
+        report = self.lossy_report
+        if report is None or report['option'] != self.output_encoding_var.get():
+            if report is not None:
+                self.start_encodability_analysis()
+            messagebox.showinfo("提示", "正在检查编码兼容性，请稍后再试")
+            return
         
-        total_copy_size = sum(info.get('size', 0) for info in self.copy_files.values())
-        if total_copy_size < 1024:
-            copy_size_str = f"{total_copy_size} B"
-        elif total_copy_size < 1024 * 1024:
-            copy_size_str = f"{total_copy_size/1024:.1f} KB"
-        else:
-            copy_size_str = f"{total_copy_size/(1024*1024):.1f} MB"
+        target_name = OUTPUT_ENCODINGS[report['option']]['name']
+        if not report['files']:
+            messagebox.showinfo("编码检查", f"已检查 {report['checked']} 个文件，转换结果都能用 {target_name} 完整表示")
+            return
         
-        # 生成统计报告
-        summary = f"扫描完成!\n\n"
-        summary += f"输入目录: {self.input_path.get()}\n"
-        summary += f"输出目录: {self.output_path.get()}\n"
-        summary += f"文件类型过滤: {self.file_extensions_var.get()}\n"
-        summary += f"输出编码: {self.output_encoding_var.get()}\n\n"
-        
-        summary += f"文件统计:\n"
-        summary += f"  总文件数: {total_files}\n"
-        summary += f"  需要编码处理: {total_encoding_files} 个\n"
-        summary += f"  直接复制: {total_copy_files} 个 ({copy_size_str})\n\n"
-        
-        if encodings:
-            summary += f"编码分布 (需要处理的文件):\n"
-            for encoding, count in encoding_counter.most_common():
-                summary += f"  {encoding}: {count} 个文件\n"
-        else:
-            summary += "需要编码处理的文件中未发现中文内容\n"
+        window = tk.Toplevel(self.root)
+        window.title(f"编码检查 - {len(report['files'])} 个文件含有 {target_name} 无法表示的字符")
+        window.geometry("1000x600")
         
-        # 显示扫描结果
-        self.status_var.set(f"扫描完成 - 总计 {total_files} 个文件")
-        self.summary_text.delete(1.0, tk.END)
-        self.summary_text.insert(tk.END, summary)
+        # 文件列表
+        columns = ('file', 'count', 'chars', 'policy')
+        tree = ttk.Treeview(window, columns=columns, show='headings', height=15)
+        tree.heading('file', text='文件路径')
+        tree.heading('count', text='字符数')
+        tree.heading('chars', text='无法编码的字符')
+        tree.heading('policy', text='处理方式')
+        tree.column('file', width=450)
+        tree.column('count', width=60)
+        tree.column('chars', width=200)
+        tree.column('policy', width=120)
+        tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=(10, 5))
+        
+        def policy_text(file_path):
+            policy = self.error_policies.get(file_path)
+            if policy:
+                return ERROR_POLICIES[policy]['name']
+            return f"默认 ({self.error_policy_var.get()})"
+        
+        for file_path, result in sorted(report['files'].items()):
+            sample = ''.join(char for char, _ in result['chars'].most_common(10))
+            tree.insert('', 'end', iid=file_path, values=(
+                os.path.relpath(file_path, self.input_path.get()),
+                result['count'],
+                sample,
+                policy_text(file_path)
+            ))
+        
+        # 位置详情
+        detail_text = scrolledtext.ScrolledText(window, height=8)
+        detail_text.pack(fill=tk.X, padx=10, pady=(0, 5))
+        
+        def on_select(event):
+            selection = tree.selection()
+            if not selection:
+                return
+            result = report['files'][selection[0]]
+            details = f"共 {result['count']} 个无法编码的字符，位置 (行:列):\n"
+            details += "  ".join(f"{line}:{column} {char}" for line, column, char in result['positions'])
+            if result['count'] > len(result['positions']):
+                details += "  ..."
+            detail_text.delete(1.0, tk.END)
+            detail_text.insert(tk.END, details)
+        
+        tree.bind('<<TreeviewSelect>>', on_select)
+        
+        # 为选中的文件设置处理方式
+        bottom_frame = ttk.Frame(window)
+        bottom_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
         
-        # 切换到统计信息标签页
-        self.notebook.select(2)
+        policy_names = [policy['name'] for policy in ERROR_POLICIES.values()]
+        selected_policy_var = tk.StringVar(value=policy_names[0])
+        ttk.Label(bottom_frame, text="选中文件的处理方式:").pack(side=tk.LEFT)
+        ttk.Combobox(bottom_frame, textvariable=selected_policy_var, values=policy_names,
+                     state="readonly", width=14).pack(side=tk.LEFT, padx=(5, 5))
+        
+        def apply_policy():
+            policy = next(key for key, info in ERROR_POLICIES.items()
+                          if info['name'] == selected_policy_var.get())
+            for file_path in tree.selection():
+                self.error_policies[file_path] = policy
+                tree.set(file_path, 'policy', policy_text(file_path))
+        
+        def reset_policy():
+            for file_path in tree.selection():
+                self.error_policies.pop(file_path, None)
+                tree.set(file_path, 'policy', policy_text(file_path))
+        
+        ttk.Button(bottom_frame, text="应用到选中文件", command=apply_policy).pack(side=tk.LEFT)
+        ttk.Button(bottom_frame, text="恢复默认", command=reset_policy).pack(side=tk.LEFT, padx=(5, 0))
+        
+        fallback = FALLBACK_ENCODINGS.get(CodecCoverage.get(OUTPUT_ENCODINGS[report['option']]['encoding']).encoding, 'utf-8')
+        ttk.Label(bottom_frame, text=f"后备编码: {fallback}", foreground="blue").pack(side=tk.LEFT, padx=(20, 0))
+        ttk.Button(bottom_frame, text="关闭", command=window.destroy).pack(side=tk.RIGHT)
     
     def on_encoding_file_double_click(self, event):
         """编码文件双击事件"""
@@ -1290,7 +5195,7 @@ class EncodingUnifierGUI:
         details += f"目标编码: {target_encoding_info['name']}\n\n"
         
         details += f"Chardet检测: {info.get('chardet_encoding', 'unknown')} "
-        details += f"(置信度: {info.get('chardet_confidence', 0):.2f})\n"
+        details += f"(置信度: {info.get('chardet_confidence', 0):.2f}, 检查 {format_size(info.get('chardet_bytes', 0))})\n"
         details += f"推荐编码: {info.get('best_encoding', 'unknown')}\n"
         details += f"文件类型: {info.get('file_type', 'text')}\n"
         details += f"包含中文: {'是' if info.get('has_chinese', False) else '否'}\n\n"
@@ -1308,65 +5213,106 @@ class EncodingUnifierGUI:
                 details += f"{encoding:12}: {status}\n"
             else:
                 details += f"{encoding:12}: ✗ 读取失败\n"
+        skipped = [encoding for encoding in TEST_ENCODINGS if encoding not in info.get('encodings_test', {})]
+        if info.get('best_encoding') in UNICODE_ENCODINGS:
+            details += "按文件开头的 BOM 或 NUL 的位置识别为 UTF-16/32，未做 chardet 检测和试解码\n"
+        elif skipped and info.get('file_type', 'text') == 'text' and not info.get('error'):
+            details += f"已跳过 (不可能优于推荐编码): {', '.join(skipped)}\n"
         
         self.encoding_detail_text.delete(1.0, tk.END)
         self.encoding_detail_text.insert(tk.END, details)
     
+    def get_output_root(self):
+        """输出目录（原地转换时为输入目录）"""
+        return self.input_path.get() if self.in_place_var.get() else self.output_path.get()
+    
     def get_output_file_path(self, input_file_path):
         """获取输出文件路径"""
         rel_path = os.path.relpath(input_file_path, self.input_path.get())
-        return os.path.join(self.output_path.get(), rel_path)
+        return os.path.join(self.get_output_root(), rel_path)
+    
+    def confirm_output(self):
+        """输出压缩包已存在或输出目录不为空时确认是否覆盖"""
+        if self.in_place_var.get():
+            return True
+        if is_archive_path(self.output_path.get()):
+            if os.path.exists(self.output_path.get()):
+                return messagebox.askyesno(
+                    "压缩包已存在",
+                    f"输出压缩包已存在:\n{self.output_path.get()}\n\n继续处理将覆盖该文件，是否继续?"
+                )
+        elif os.path.exists(self.output_path.get()):
+            if os.listdir(self.output_path.get()):
+                return messagebox.askyesno(
+                    "输出目录不为空",
+                    f"输出目录不为空:\n{self.output_path.get()}\n\n"
+                    "继续处理将覆盖同名文件，是否继续?"
+                )
+        return True
     
     def start_processing(self):
         """开始处理文件"""
         if not self.encoding_results and not self.copy_files:
             messagebox.showerror("错误", "请先扫描文件")
             return
-            
-        if not self.output_path.get():
+        
+        in_place = self.in_place_var.get()
+        if in_place:
+            if self.input_archive is not None:
+                messagebox.showerror("错误", "原地转换不支持压缩包输入")
+                return
+        elif not self.output_path.get():
             messagebox.showerror("错误", "请先选择输出目录")
             return
         
-        # 检查输出目录
-        if os.path.exists(self.output_path.get()):
-            if os.listdir(self.output_path.get()):
-                response = messagebox.askyesno(
-                    "输出目录不为空",
-                    f"输出目录不为空:\n{self.output_path.get()}\n\n"
-                    "继续处理将覆盖同名文件，是否继续?"
-                )
-                if not response:
-                    return
+        if not self.confirm_output():
+            return
         
         # 统计处理计划（排除被用户取消选择的文件）
-        selected_encoding_files = [fp for fp in self.encoding_results.keys() if fp not in self.excluded_files]
+        # 使用扫描时累计的统计信息，只需遍历被排除的文件
         target_encoding_info = OUTPUT_ENCODINGS[self.output_encoding_var.get()]
+        excluded_infos = [self.encoding_results[fp] for fp in self.excluded_files if fp in self.encoding_results]
+        selected_count = len(self.encoding_results) - len(excluded_infos)
         
-        total_files = len(selected_encoding_files) + len(self.copy_files)
-        convert_files = sum(1 for fp in selected_encoding_files 
-                          if self.encoding_results[fp].get('has_chinese', False))
-        encoding_copy_files = len(selected_encoding_files) - convert_files
+        total_files = selected_count + len(self.copy_files)
+        convert_files = (self.encoding_results.chinese_count -
+                         sum(1 for info in excluded_infos if info.get('has_chinese', False)))
+        encoding_copy_files = selected_count - convert_files
         direct_copy_files = len(self.copy_files)
         excluded_count = len(self.excluded_files)
         
         # 计算复制文件总大小
-        total_copy_size = sum(info.get('size', 0) for info in self.copy_files.values())
+        total_copy_size = self.copy_files.total_bytes
         if total_copy_size < 1024 * 1024:
             copy_size_str = f"{total_copy_size/1024:.1f} KB"
         else:
             copy_size_str = f"{total_copy_size/(1024*1024):.1f} MB"
         
-        message = (f"处理计划:\n\n"
-                  f"总文件数: {total_files}\n"
-                  f"编码转换: {convert_files} 个 (转换为{target_encoding_info['name']})\n"
-                  f"编码文件直接复制: {encoding_copy_files} 个\n"
-                  f"其他文件直接复制: {direct_copy_files} 个 ({copy_size_str})\n")
+        if in_place:
+            message = (f"处理计划 (原地转换):\n\n"
+                       f"改写: {convert_files} 个 (转换为{target_encoding_info['name']})\n"
+                       f"保持不变: {total_files - convert_files} 个 (不读取、不复制)\n"
+                       f"原文件保存在撤销记录中，可以用“撤销原地转换”恢复\n")
+        else:
+            message = (f"处理计划:\n\n"
+                      f"总文件数: {total_files}\n"
+                      f"编码转换: {convert_files} 个 (转换为{target_encoding_info['name']})\n"
+                      f"编码文件直接复制: {encoding_copy_files} 个\n"
+                      f"其他文件直接复制: {direct_copy_files} 个 ({copy_size_str})\n")
         
         if excluded_count > 0:
-            message += f"用户排除: {excluded_count} 个 (将直接复制)\n"
+            message += f"用户排除: {excluded_count} 个 ({'保持不变' if in_place else '将直接复制'})\n"
+        
+        # 编码兼容性检查结果
+        report = self.lossy_report
+        if report and report['option'] == self.output_encoding_var.get() and report['files']:
+            lossy_files = [fp for fp in report['files'] if fp not in self.excluded_files]
+            if lossy_files:
+                message += (f"含无法编码字符: {len(lossy_files)} 个 "
+                            f"(默认处理方式: {self.error_policy_var.get()})\n")
             
         message += (f"\n输入目录: {self.input_path.get()}\n"
-                   f"输出目录: {self.output_path.get()}\n"
+                   f"输出目录: {self.get_output_root()}\n"
                    f"输出编码: {target_encoding_info['name']}\n\n"
                    f"开始处理?")
         
@@ -1383,189 +5329,421 @@ class EncodingUnifierGUI:
         thread.daemon = True
         thread.start()
     
+    def open_output_sink(self):
+        """按设置创建输出：原地改写、输出到目录或压缩包"""
+        output_path = self.output_path.get()
+        if self.in_place_var.get():
+            return InPlaceOutput(self.input_path.get(), self.preserve_mtime_var.get(),
+                                 self.shard.name if self.shard else '')
+        if is_archive_path(output_path):
+            return ArchiveOutput(output_path)
+        os.makedirs(output_path, exist_ok=True)
+        return DirectoryOutput(output_path)
+    
     def _process_files_thread(self):
         """后台处理文件线程"""
         try:
             target_encoding_info = OUTPUT_ENCODINGS[self.output_encoding_var.get()]
-            target_encoding = target_encoding_info['encoding']
-            
-            # 创建输出目录
-            if not os.path.exists(self.output_path.get()):
-                os.makedirs(self.output_path.get())
-            
-            success_count = 0
-            fail_count = 0
-            convert_count = 0
-            encoding_copy_count = 0
-            direct_copy_count = 0
-            excluded_copy_count = 0
-            
-            # 将排除的编码文件移到复制列表处理
-            excluded_encoding_files = {}
-            for file_path in self.excluded_files:
-                if file_path in self.encoding_results:
-                    excluded_encoding_files[file_path] = self.get_file_info(file_path)
-            
-            selected_encoding_files = {fp: info for fp, info in self.encoding_results.items() 
-                                     if fp not in self.excluded_files}
-            
-            total_files = len(selected_encoding_files) + len(self.copy_files) + len(excluded_encoding_files)
-            processed_count = 0
-            
-            # 处理选中的编码文件
-            for file_path, info in selected_encoding_files.items():
-                # 更新进度
-                progress = (processed_count / total_files) * 100
-                self.root.after(0, lambda p=progress: self.progress_var.set(p))
-                
-                # 获取输出路径
-                output_file_path = self.get_output_file_path(file_path)
-                
-                # 确保输出目录存在
-                output_dir = os.path.dirname(output_file_path)
-                if not os.path.exists(output_dir):
-                    os.makedirs(output_dir)
-                
-                # 判断是否需要转换
-                source_encoding = info.get('best_encoding', 'utf-8')
-                has_chinese = info.get('has_chinese', False)
-                
-                if has_chinese:
-                    # 需要转换编码
-                    if self.convert_and_save_file(file_path, output_file_path, source_encoding, target_encoding_info):
-                        success_count += 1
-                        convert_count += 1
-                        action_text = f"✓ 已转换 ({source_encoding}→{target_encoding_info['name']})"
-                    else:
-                        fail_count += 1
-                        action_text = "✗ 转换失败"
-                else:
-                    # 直接复制文件
-                    if self.copy_file(file_path, output_file_path):
-                        success_count += 1
-                        encoding_copy_count += 1
-                        action_text = "✓ 已复制"
-                    else:
-                        fail_count += 1
-                        action_text = "✗ 复制失败"
-                
-                # 更新文件状态
-                self.root.after(0, lambda fp=file_path, at=action_text: self.update_encoding_file_action(fp, at))
-                processed_count += 1
             
-            # 处理排除的编码文件（直接复制）
-            for file_path, file_info in excluded_encoding_files.items():
-                # 更新进度
-                progress = (processed_count / total_files) * 100
-                self.root.after(0, lambda p=progress: self.progress_var.set(p))
-                
-                # 获取输出路径
-                output_file_path = self.get_output_file_path(file_path)
-                
-                # 确保输出目录存在
-                output_dir = os.path.dirname(output_file_path)
-                if not os.path.exists(output_dir):
-                    os.makedirs(output_dir)
-                
-                # 直接复制文件
-                if self.copy_file(file_path, output_file_path):
-                    success_count += 1
-                    excluded_copy_count += 1
-                    action_text = "✓ 已复制(排除)"
-                else:
-                    fail_count += 1
-                    action_text = "✗ 复制失败"
-                
-                # 更新文件状态
-                self.root.after(0, lambda fp=file_path, at=action_text: self.update_encoding_file_action(fp, at))
-                processed_count += 1
+            # 依次处理：选中的编码文件、排除的编码文件（直接复制）、其他文件（直接复制）
+            tasks = itertools.chain(
+                (('encoding', fp) for fp in self.encoding_results.keys() if fp not in self.excluded_files),
+                # 按扫描顺序遍历未选中的文件（集合的顺序不确定，压缩包条目的顺序会每次不同）
+                (('excluded', fp) for fp in self.encoding_results.keys() if fp in self.excluded_files),
+                (('copy', fp) for fp in self.copy_files.keys()))
+            total_files = len(self.encoding_results) + len(self.copy_files)
+            if self.in_place_var.get():
+                # 原地转换只处理选中的编码文件，其他文件保持原样
+                tasks = (('encoding', fp) for fp in self.encoding_results.keys() if fp not in self.excluded_files)
+                total_files = len(self.encoding_results) - sum(fp in self.encoding_results for fp in self.excluded_files)
+            if self.input_archive is not None and not self.input_archive.is_zip:
+                # tar 只能顺序读取：按成员在压缩包中的顺序处理
+                tasks = self._iter_tar_tasks({file_path: kind for kind, file_path in tasks})
+            else:
+                # 大文件先处理（最长作业优先），最后不会只剩一个大文件在一个线程上处理；
+                # 排序是稳定的，内容相同的文件大小相同，仍排在原文件之后
+                tasks = sorted(tasks, key=self.task_size, reverse=True)
             
-            # 处理需要直接复制的文件
-            for file_path, file_info in self.copy_files.items():
-                # 更新进度
-                progress = (processed_count / total_files) * 100
-                self.root.after(0, lambda p=progress: self.progress_var.set(p))
-                
-                # 获取输出路径
-                output_file_path = self.get_output_file_path(file_path)
-                
-                # 确保输出目录存在
-                output_dir = os.path.dirname(output_file_path)
-                if not os.path.exists(output_dir):
-                    os.makedirs(output_dir)
-                
-                # 直接复制文件
-                if self.copy_file(file_path, output_file_path):
-                    success_count += 1
-                    direct_copy_count += 1
-                    status_text = "✓ 已复制"
-                else:
-                    fail_count += 1
-                    status_text = "✗ 复制失败"
-                
-                # 更新文件状态
-                self.root.after(0, lambda fp=file_path, st=status_text: self.update_copy_file_status(fp, st))
-                processed_count += 1
+            # 任务和总数确定后再创建输出（原地转换时创建撤销记录）
+            sink = self.open_output_sink()
+            counts = self._run_tasks(tasks, sink, total_files, target_encoding_info)
             
             # 处理完成
             self.root.after(0, lambda: self.processing_complete(
-                total_files, success_count, fail_count, convert_count, 
-                encoding_copy_count, direct_copy_count, excluded_copy_count, target_encoding_info))
+                total_files, counts['success'], counts['fail'], counts['convert'],
+                counts['encoding_copy'], counts['direct_copy'], counts['excluded_copy'], target_encoding_info))
             
         except Exception as e:
-            self.root.after(0, lambda: messagebox.showerror("处理错误", f"处理过程中出现错误: {str(e)}"))
+            self.root.after(0, lambda msg=str(e): self.report_error("处理错误", f"处理过程中出现错误: {msg}"))
     
-    def convert_and_save_file(self, input_path, output_path, source_encoding, target_encoding_info):
-        """转换编码并保存文件"""
+    def _run_tasks(self, tasks, sink, total_files, target_encoding_info):
+        """处理 (类型, 文件) 任务并关闭输出，返回计数。
+        工作线程并行处理；结果按提交顺序取回，压缩包条目也按这个顺序写入。
+        最多 PROCESS_WORKERS*2 个任务同时处理，且估算的内存占用不超过预算；前面的大文件还没完成时，
+        后面已完成的任务只保留结果等待提交，不阻塞新任务。tasks 是生成器时取下一个任务也随之等待"""
+        self.fallback_files.clear()
+        self.normalize_stats.clear()
+        self.dedup_links.clear()
+        self.outcome_counters = {}  # 处理结果文字 -> 计数项，重复内容的文件沿用原文件的结果
+        self.work_timing = [0, 0.0, 0]  # 转换的字节数、耗时，链接的重复字节数
+        self.chunked_files.clear()
+        budget = self.memory_budget
+        stats = self.schedule_stats = {'workers': PROCESS_WORKERS, 'busy': 0.0, 'wall': 0.0,
+                                       'budget': budget, 'peak_memory': 0}
+        copy_unchanged = self.create_normalizer().passthrough
+        
+        counts = Counter()
+        start = time.perf_counter()
+        with futures.ThreadPoolExecutor(max_workers=PROCESS_WORKERS) as pool:
+            pending = deque()  # 按提交顺序等待取回的 (任务, 结果的内存占用)
+            running = {}  # 正在处理的任务 -> 完成时释放的内存
+            in_flight = 0
+            
+            def collect(block):
+                # 已完成的任务只保留结果的内存，再按顺序提交最前面已完成的任务
+                nonlocal in_flight
+                if block:
+                    futures.wait(running, return_when=futures.FIRST_COMPLETED)
+                for future in [future for future in running if future.done()]:
+                    in_flight -= running.pop(future)
+                while pending and pending[0][0] not in running:
+                    future, kept, _ = pending.popleft()
+                    in_flight -= kept
+                    self._finish_task(*future.result(), sink, counts, total_files)
+                if sink.ordered:
+                    # 之前的条目都已写入：最前面的任务可以直接写入输出，不必缓冲
+                    sink.set_head(pending[0][2] if pending else None)
+            
+            try:
+                for kind, file_path in tasks:
+                    memory = self.estimate_task_memory(kind, file_path, target_encoding_info)
+                    collect(False)
+                    # 同时处理的任务已满或内存预算不够时等待；没有其他任务时超出预算的文件单独处理
+                    while running and (len(running) >= PROCESS_WORKERS * 2 or in_flight + memory > budget):
+                        collect(True)
+                    if sink.ordered and not pending:
+                        sink.set_head(file_path)
+                    future = pool.submit(self._timed_task, kind, file_path, sink,
+                                         target_encoding_info, copy_unchanged)
+                    kept = min(memory, PENDING_RESULT_MEMORY)
+                    running[future] = memory - kept
+                    pending.append((future, kept, file_path))
+                    in_flight += memory
+                    stats['peak_memory'] = max(stats['peak_memory'], in_flight)
+                while pending:
+                    collect(bool(running))
+            finally:
+                for future, kept, _ in pending:
+                    future.cancel()
+                sink.close()
+                if sink.in_place:
+                    self.last_undo_dir = sink.undo_dir
+                if self.input_archive is not None:
+                    self.input_archive.release()
+        stats['wall'] = time.perf_counter() - start
+        return counts
+    
+    def task_size(self, task):
+        """任务对应的文件大小（排序用）"""
+        kind, file_path = task
+        return (self.copy_files if kind == 'copy' else self.encoding_results).size(file_path)
+    
+    def estimate_task_memory(self, kind, file_path, target_encoding_info):
+        """估算处理任务的内存占用；整文件转换的估算超过内存预算的份额时改为按行分块流式转换"""
+        if kind != 'encoding':
+            return estimate_job_memory(0)
+        info = self.encoding_results[file_path]
+        file_ext = os.path.splitext(file_path)[1].lower()
+        document = file_ext in ['.doc', '.docx', '.rtf', '.odt']
+        converts = info.get('has_chinese', False) or info.get('best_encoding') in UNICODE_ENCODINGS
+        if not converts or (target_encoding_info['charset'] == 'auto' and not document):
+            return estimate_job_memory(0)
+        backend = self.get_converter_backend() if self.has_opencc and target_encoding_info['charset'] != 'auto' else None
+        memory = estimate_job_memory(info.get('size', 0), target_encoding_info['encoding'], backend)
+        if not document and memory * STREAM_MEMORY_SHARE > self.memory_budget:
+            # 分块转换时每次转换约一个读取块的文本
+            self.chunked_files.add(file_path)
+            return max(estimate_job_memory(TRANSCODE_BUFFER_SIZE, target_encoding_info['encoding'], backend),
+                       STREAM_JOB_MEMORY)
+        return memory
+    
+    def _iter_tar_tasks(self, kinds):
+        """顺序读取输入的 tar，把要处理的成员预读后交给工作线程"""
+        archive = self.input_archive
+        for file_path, size, f in archive.iter_members(kinds.__contains__):
+            if f is not None:
+                archive.prefetch(file_path, f, size)
+                yield kinds[file_path], file_path
+    
+    def _timed_task(self, kind, file_path, sink, *args):
+        """处理一个文件并记录耗时，返回 (处理结果, 耗时)"""
+        start = time.perf_counter()
         try:
-            # 读取原文件内容
-            content = self.read_file_content(input_path, source_encoding)
+            if sink.ordered:
+                sink.start_task(file_path, self.get_input_mtime(file_path), self.task_size((kind, file_path)))
+            result = self._process_task(kind, file_path, sink, *args)
+        finally:
+            self.pipeline_buffers.pop(file_path, None)  # 扫描并转换时读出的内容用完即释放
+            if self.input_archive is not None:
+                # 没有读取的 tar 成员（例如链接到重复内容）也要释放，顺序读取才能继续
+                self.input_archive.release(file_path)
+        return result, time.perf_counter() - start
+    
+    def _process_task(self, kind, file_path, sink, target_encoding_info, copy_unchanged):
+        """在工作线程中处理一个文件，返回 (类型, 文件, 计数项, 状态文字, 待提交条目)"""
+        relpath = os.path.relpath(self.get_output_file_path(file_path), self.get_output_root())
+        
+        original = self.duplicate_of.get(file_path)
+        if (kind == 'encoding' and original is not None and sink.supports_link
+                and original in self.encoding_results and original not in self.excluded_files
+                and self.error_policies.get(original) == self.error_policies.get(file_path)):
+            # 内容与之前的文件相同：不再转换，提交时链接那个文件的输出
+            return kind, file_path, 'duplicate', None, original
+        
+        if kind == 'encoding':
+            info = self.encoding_results[file_path]
+            source_encoding = info.get('best_encoding', 'utf-8')
+            # UTF-16/32 与 ASCII 不兼容，没有中文也需要转码
+            has_chinese = info.get('has_chinese', False) or source_encoding in UNICODE_ENCODINGS
+            file_ext = os.path.splitext(file_path)[1].lower()
             
-            # 进行简繁体转换
-            converted_content = self.convert_text_encoding(content, self.output_encoding_var.get())
+            if sink.in_place and (not has_chinese or file_ext in ['.doc', '.docx', '.rtf', '.odt']
+                                  or (target_encoding_info['charset'] == 'auto' and copy_unchanged
+                                      and same_codec(source_encoding, target_encoding_info['encoding']))):
+                # 原地转换时不需要改写的文件（文档不能原地转换为文本）
+                return kind, file_path, 'encoding_copy', "✓ 未修改", None
             
-            # 写入新编码到输出文件
-            target_encoding = target_encoding_info['encoding']
+            if (has_chinese and target_encoding_info['charset'] == 'auto'
+                    and file_ext not in ['.doc', '.docx', '.rtf', '.odt']
+                    and same_codec(source_encoding, target_encoding_info['encoding']) and copy_unchanged):
+                # 已经是目标编码且不需要规范化，直接复制，不需要转码
+                ok, entry = self.copy_file(file_path, relpath, sink)
+                return (kind, file_path, 'encoding_copy', "✓ 已复制 (已是目标编码)", entry) if ok else \
+                    (kind, file_path, None, "✗ 复制失败", None)
             
-            # 处理文档类型文件
-            file_ext = os.path.splitext(input_path)[1].lower()
-            if file_ext in ['.doc', '.docx', '.rtf', '.odt']:
-                # 文档类型转换为文本文件
-                output_path = os.path.splitext(output_path)[0] + '.txt'
+            if has_chinese:
+                # 需要转换编码
+                ok, entry = self.convert_and_save_file(file_path, relpath, sink, source_encoding,
+                                                       target_encoding_info)
+                if not ok:
+                    return kind, file_path, None, "✗ 转换失败", None
+                action_text = f"✓ 已转换 ({source_encoding}→{target_encoding_info['name']})"
+                if file_path in self.fallback_files:
+                    action_text += f" [后备编码 {self.fallback_files[file_path]}]"
+                normalized = format_normalize_stats(self.normalize_stats[file_path])
+                if normalized:
+                    action_text += f" [{normalized}]"
+                return kind, file_path, 'convert', action_text, entry
+            
+            ok, entry = self.copy_file(file_path, relpath, sink)
+            return (kind, file_path, 'encoding_copy', "✓ 已复制", entry) if ok else \
+                (kind, file_path, None, "✗ 复制失败", None)
+        
+        # 排除的编码文件和其他文件直接复制
+        ok, entry = self.copy_file(file_path, relpath, sink)
+        if not ok:
+            return kind, file_path, None, "✗ 复制失败", None
+        if kind == 'excluded':
+            return kind, file_path, 'excluded_copy', "✓ 已复制(排除)", entry
+        return kind, file_path, 'direct_copy', "✓ 已复制", entry
+    
+    def _finish_task(self, result, elapsed, sink, counts, total_files):
+        """按顺序提交一个文件的处理结果，更新计数和列表显示"""
+        kind, file_path, counter, action_text, entry = result
+        size = self.encoding_results[file_path].get('size', 0) if kind == 'encoding' else 0
+        self.schedule_stats['busy'] += elapsed
+        if counter == 'duplicate':
+            counter, action_text = self._link_duplicate(file_path, entry, sink)
+            entry = None
+            self.work_timing[2] += size if counter else 0
+        elif kind == 'encoding':
+            self.work_timing[0] += size
+            self.work_timing[1] += elapsed
+        
+        if entry is not None:
+            try:
+                sink.commit(entry)
+            except Exception:
+                counter = None
+                action_text = "✗ 写入失败"
+        
+        if counter:
+            counts['success'] += 1
+            counts[counter] += 1
+        else:
+            counts['fail'] += 1
+        if kind == 'encoding':
+            # 在处理线程中立即记录结果（界面刷新稍后进行），后面的重复文件按它链接
+            self.encoding_results.set_action(file_path, action_text)
+            self.outcome_counters[action_text] = counter
+        
+        # 更新文件状态
+        if kind == 'copy':
+            self.root.after(0, lambda fp=file_path, st=action_text: self.update_copy_file_status(fp, st))
+        else:
+            self.root.after(0, lambda fp=file_path, at=action_text: self.update_encoding_file_action(fp, at))
+        
+        progress = (counts['success'] + counts['fail']) / total_files * 100
+        self.root.after(0, lambda p=progress: self.progress_var.set(p))
+    
+    def _link_duplicate(self, file_path, original, sink):
+        """重复内容的文件直接链接原文件的输出，返回 (计数项, 状态文字)"""
+        action_text = self.encoding_results.action(original)
+        counter = self.outcome_counters.get(action_text)
+        if not counter:
+            return None, "✗ 失败 (相同内容的文件处理失败)"
+        root = self.get_output_root()
+        try:
+            method = sink.link(os.path.relpath(self.get_output_file_path(original), root),
+                               os.path.relpath(self.get_output_file_path(file_path), root))
+        except Exception:
+            return None, "✗ 链接失败"
+        self.dedup_links[method] += 1
+        if original in self.normalize_stats:
+            self.normalize_stats[file_path] = self.normalize_stats[original]
+        if original in self.fallback_files:
+            self.fallback_files[file_path] = self.fallback_files[original]
+        return counter, f"{action_text} [重复内容: {os.path.relpath(original, self.input_path.get())}]"
+    
+    def convert_and_save_file(self, input_path, relpath, sink, source_encoding, target_encoding_info):
+        """转换编码并写入输出，返回 (是否成功, 待提交条目)"""
+        # 处理文档类型文件
+        file_ext = os.path.splitext(input_path)[1].lower()
+        if file_ext in ['.doc', '.docx', '.rtf', '.odt']:
+            # 文档类型转换为文本文件
+            relpath = os.path.splitext(relpath)[0] + '.txt'
+        
+        target = None
+        try:
+            normalizer = self.create_normalizer()
             
-            with open(output_path, 'w', encoding=target_encoding) as f:
-                f.write(converted_content)
+            # 不需要简繁转换的文本文件直接流式转码（UTF-8 可以表示所有字符，无需处理无法编码的字符）
+            chunked = input_path in self.chunked_files
+            if chunked or (target_encoding_info['charset'] == 'auto'
+                           and file_ext not in ['.doc', '.docx', '.rtf', '.odt']):
+                target_encoding = target_encoding_info['encoding']
+                errors, convert = 'strict', None
+                if chunked:
+                    # 整文件转换超出内存预算：按行分块做简繁转换，无法编码的字符按设置处理
+                    option = self.output_encoding_var.get()
+                    convert = lambda text: self.convert_text_encoding(text, option)
+                    policy = self.get_error_policy(input_path)
+                    errors = ERROR_POLICIES[policy]['errors']
+                    if policy == 'fallback':
+                        coverage = CodecCoverage.get(target_encoding)
+                        if self.stream_has_unencodable(input_path, source_encoding, coverage, convert):
+                            target_encoding = FALLBACK_ENCODINGS.get(coverage.encoding, 'utf-8')
+                            self.fallback_files[input_path] = target_encoding
+                with self.open_input(input_path) as source:
+                    target = sink.create(relpath)
+                    transcode_stream(source, target, source_encoding, target_encoding, errors,
+                                     normalizer=normalizer, convert=convert)
+                self.normalize_stats[input_path] = normalizer.stats()
+                return True, sink.finish(relpath, target, self.get_input_mtime(input_path))
             
-            return True
+            # 读取原文件内容（不转换换行符，BOM 交给规范化处理）
+            content = self.read_file_content(input_path, bom_free_encoding(source_encoding), newline='')
+            bom, data, target_encoding = self.convert_content(content, normalizer, target_encoding_info['encoding'],
+                                                              self.get_error_policy(input_path))
+            if target_encoding != target_encoding_info['encoding']:
+                self.fallback_files[input_path] = target_encoding
+            
+            # 写入新编码到输出文件（大小已知，压缩包输出可以直接写入）
+            target = sink.create(relpath, len(bom) + len(data))
+            target.write(bom)
+            target.write(data)
+            
+            self.normalize_stats[input_path] = normalizer.stats()
+            return True, sink.finish(relpath, target, self.get_input_mtime(input_path))
             
         except Exception as e:
-            return False
+            if target is not None:
+                sink.discard(relpath, target)
+            return False, None
+    
+    def convert_content(self, content, normalizer, target_encoding, policy):
+        """规范化并简繁转换整个文本，按目标编码编码，返回 (BOM, 编码结果, 实际使用的编码)；
+        policy 为无法编码字符的处理策略，改用后备编码时返回后备编码"""
+        content = normalizer.feed(content, final=True)
+        
+        # 进行简繁体转换
+        converted_content = self.convert_text_encoding(content, self.output_encoding_var.get())
+        
+        # 无法编码字符的处理方式
+        errors = ERROR_POLICIES[policy]['errors']
+        if policy == 'fallback':
+            coverage = CodecCoverage.get(target_encoding)
+            if coverage.has_unencodable(converted_content):
+                target_encoding = FALLBACK_ENCODINGS.get(coverage.encoding, 'utf-8')
+        
+        data = converted_content.encode(bom_free_encoding(target_encoding), errors)
+        return normalizer.bom_bytes(target_encoding), data, target_encoding
     
-    def copy_file(self, input_path, output_path):
-        """复制文件"""
+    def stream_has_unencodable(self, input_path, source_encoding, coverage, convert):
+        """逐块检查转换后的文本是否有目标编码无法表示的字符（改用后备编码需要在写入前确定）"""
+        with self.open_input(input_path) as source:
+            return any(coverage.has_unencodable(text) for text, final in
+                       iter_text_chunks(source, source_encoding, self.create_normalizer(), convert))
+    
+    def copy_file(self, input_path, relpath, sink):
+        """复制文件，返回 (是否成功, 待提交条目)"""
+        target = None
         try:
-            shutil.copy2(input_path, output_path)
-            return True
+            if self.input_archive is None:
+                return True, sink.copy(input_path, relpath)
+            
+            # 压缩包中的成员直接从压缩包读出写入输出
+            with self.open_input(input_path) as source:
+                target = sink.create(relpath)
+                shutil.copyfileobj(source, target, TRANSCODE_BUFFER_SIZE)
+            return True, sink.finish(relpath, target, self.get_input_mtime(input_path))
         except Exception as e:
-            return False
+            if target is not None:
+                sink.discard(relpath, target)
+            return False, None
     
     def update_encoding_file_action(self, file_path, new_action):
         """更新编码文件操作状态显示"""
-        for item in self.encoding_tree.get_children():
-            if self.encoding_tree.item(item)['tags'][0] == file_path:
-                values = list(self.encoding_tree.item(item)['values'])
-                values[5] = new_action  # 操作列
-                self.encoding_tree.item(item, values=values)
-                break
+        self.encoding_results.set_action(file_path, new_action)
+        self.encoding_view.schedule_refresh()
                 
     def update_copy_file_status(self, file_path, new_status):
         """更新复制文件状态显示"""
-        for item in self.copy_tree.get_children():
-            if self.copy_tree.item(item)['tags'][0] == file_path:
-                values = list(self.copy_tree.item(item)['values'])
-                values[2] = new_status  # 状态列
-                self.copy_tree.item(item, values=values)
-                break
+        self.ensure_tab('copy')
+        self.copy_files.set_action(file_path, new_status)
+        self.copy_view.schedule_refresh()
+    
+    def process_report(self, total, success, fail, convert_count, encoding_copy_count,
+                       direct_copy_count, excluded_copy_count, target_encoding_info):
+        """处理统计"""
+        normalized_stats = [stats for stats in self.normalize_stats.values() if format_normalize_stats(stats)]
+        converted_bytes, seconds, duplicate_bytes = self.work_timing
+        return {
+            'input': self.input_path.get(),
+            'output': self.output_path.get(),
+            'output_root': self.get_output_root(),
+            'extensions': self.file_extensions_var.get(),
+            'target_name': target_encoding_info['name'],
+            'in_place': self.in_place_var.get(),
+            'counts': {'total': total, 'success': success, 'fail': fail, 'convert': convert_count,
+                       'encoding_copy': encoding_copy_count, 'direct_copy': direct_copy_count,
+                       'excluded_copy': excluded_copy_count},
+            'opencc': self.has_opencc and target_encoding_info['charset'] != 'auto',
+            # 换行符、BOM 和行尾空白的修改统计
+            'normalize': {
+                'files': len(normalized_stats),
+                'eol': sum(stats['eol'] for stats in normalized_stats),
+                'trailing': sum(stats['trailing'] for stats in normalized_stats),
+                'bom_added': sum(stats['bom'] == 'added' for stats in normalized_stats),
+                'bom_removed': sum(stats['bom'] == 'removed' for stats in normalized_stats),
+            },
+            'dedup': {'links': dict(self.dedup_links), 'bytes': duplicate_bytes,
+                      'saved': seconds * duplicate_bytes / max(converted_bytes, 1)},
+            'undo_dirs': [self.last_undo_dir] if self.in_place_var.get() and self.last_undo_dir else [],
+            # 并行效率 = 各文件处理耗时之和 / (用时 × 线程数)
+            'schedule': dict(self.schedule_stats, chunked=len(self.chunked_files),
+                             capacity=self.schedule_stats.get('wall', 0.0) * PROCESS_WORKERS),
+        }
     
     def processing_complete(self, total, success, fail, convert_count, encoding_copy_count, 
                           direct_copy_count, excluded_copy_count, target_encoding_info):
@@ -1573,30 +5751,14 @@ class EncodingUnifierGUI:
         self.progress_var.set(100)
         
         # 构建完成消息
-        message = f"处理完成!\n\n"
-        message += f"输入目录: {self.input_path.get()}\n"
-        message += f"输出目录: {self.output_path.get()}\n"
-        message += f"文件类型过滤: {self.file_extensions_var.get()}\n"
-        message += f"输出编码: {target_encoding_info['name']}\n\n"
-        message += f"处理统计:\n"
-        message += f"  总文件数: {total}\n"
-        message += f"  成功处理: {success}\n"
-        message += f"  处理失败: {fail}\n"
-        message += f"  编码转换: {convert_count}\n"
-        message += f"  编码文件复制: {encoding_copy_count}\n"
-        message += f"  其他文件复制: {direct_copy_count}\n"
-        
-        if excluded_copy_count > 0:
-            message += f"  用户排除复制: {excluded_copy_count}\n"
-        
-        if self.has_opencc and target_encoding_info['charset'] != 'auto':
-            message += f"\n简繁体转换: {'已启用' if convert_count > 0 else '无需转换'}\n"
-        
-        message += f"\n所有文件已保存到输出目录:\n{self.output_path.get()}"
+        message = format_process_summary(self.process_report(
+            total, success, fail, convert_count, encoding_copy_count,
+            direct_copy_count, excluded_copy_count, target_encoding_info))
         
         self.status_var.set(f"处理完成 - 成功: {success}, 失败: {fail}")
         
         # 显示详细结果
+        self.ensure_tab('summary')
         self.summary_text.delete(1.0, tk.END)
         self.summary_text.insert(tk.END, message)
         
@@ -1615,23 +5777,869 @@ class EncodingUnifierGUI:
     
     def clear_results(self):
         """清除结果"""
+        self.duplicate_of.clear()
+        self.dedup_stats = {}
+        self.binary_formats.clear()
         self.encoding_results.clear()
         self.copy_files.clear()
         self.excluded_files.clear()
-        self.encoding_tree.delete(*self.encoding_tree.get_children())
-        self.copy_tree.delete(*self.copy_tree.get_children())
+        self.error_policies.clear()
+        self.lossy_report = None
+        self.lossy_analysis_generation += 1
+        self.encoding_view.set_keys([])
+        self.encoding_view_synced = 0
+        self.copy_view_synced = 0
+        if self.copy_tree is not None:
+            self.copy_view.set_keys([])
         self.encoding_detail_text.delete(1.0, tk.END)
-        self.summary_text.delete(1.0, tk.END)
+        if self.summary_text is not None:
+            self.summary_text.delete(1.0, tk.END)
         self.progress_var.set(0)
         self.status_var.set("已清除结果")
         
         # 关闭预览窗口
         self.close_preview_window()
+        if self.preview_engine:
+            self.preview_engine.invalidate()
+
+class Setting:
+    """批处理模式下代替 tkinter 变量（不创建窗口）"""
+
+    def __init__(self, value=None):
+        self.value = value
+    
+    def get(self):
+        return self.value
+    
+    def set(self, value):
+        self.value = value
+    
+    def trace_add(self, mode, callback):
+        pass
+
+
+class BatchVariables:
+    """批处理模式下代替 tkinter 的变量类型"""
+    StringVar = BooleanVar = IntVar = DoubleVar = Setting
+
+
+class BatchRoot:
+    """批处理模式下代替根窗口：after() 的回调在当前线程立即执行"""
+
+    def after(self, ms, func):
+        func()
+
+
+class BatchSession(EncodingUnifierGUI):
+    """不显示界面的批处理：复用界面的扫描和处理流程，结果输出到终端或分片报告"""
+
+    def __init__(self, input_path, output_path, extensions=DEFAULT_EXTENSIONS, output_encoding="简体GB18030",
+                 in_place=False, dedup=True, shard=None):
+        self.root = BatchRoot()
+        self.init_state(BatchVariables)
+        self.progress_var = Setting(0)
+        self.status_var = Setting('')
+        self.input_path.set(os.path.abspath(input_path))
+        self.output_path.set(os.path.abspath(output_path) if output_path else '')
+        self.file_extensions_var.set(extensions)
+        self.output_encoding_var.set(output_encoding)
+        self.in_place_var.set(in_place)
+        self.dedup_var.set(dedup)
+        self.shard = shard
+        self.scan_result = None
+        self.process_result = None
+    
+    def run(self, plan=None, scan_only=False, pipeline=False):
+        """扫描（或加载扫描计划）并处理，返回 (扫描统计, 处理统计)；只扫描时处理统计为 None。
+        pipeline 时扫描和转换同时进行（见 _pipeline_thread）"""
+        if plan is not None:
+            self.apply_plan(*plan)
+        elif os.path.isfile(self.input_path.get()):
+            self.input_archive = ArchiveInput(self.input_path.get())
+        elif not os.path.isdir(self.input_path.get()):
+            raise ValueError(f"输入目录不存在: {self.input_path.get()}")
+        
+        if self.in_place_var.get() and self.input_archive is not None:
+            raise ValueError("原地转换不支持压缩包输入")
+        if not scan_only and not self.in_place_var.get() and not self.output_path.get():
+            raise ValueError("请指定输出目录或原地转换")
+        if self.shard and self.shard.count > 1 and is_archive_path(self.output_path.get()):
+            raise ValueError("分片执行时输出必须是目录（各分片写入同一个压缩包会互相覆盖）")
+        
+        if plan is not None:
+            self.scan_complete(self.get_file_extensions())
+        elif pipeline and not scan_only:
+            self._pipeline_thread(self.get_file_extensions())
+            if self.process_result is None:
+                raise ValueError(self.status_var.get() or "处理失败")
+            self.scan_result = self.scan_report()
+            return self.scan_result, self.process_result
+        else:
+            self._scan_files_thread(self.get_file_extensions())
+            if self.scan_result is None:
+                raise ValueError(self.status_var.get() or "扫描失败")
+        if not scan_only:
+            self._process_files_thread()
+        return self.scan_result, self.process_result
+    
+    def report_rows(self):
+        """分片报告中每个文件的检测结果和处理结果（路径相对输入目录）"""
+        root = self.input_path.get()
+        store = self.encoding_results
+        for row in store.rows():
+            file_path = store.path_of(row)
+            yield {'kind': 'encoding', 'path': os.path.relpath(file_path, root).replace(os.sep, '/'),
+                   'result': ResultView(store, row).to_dict(), 'action': store.action_of(row),
+                   'excluded': file_path in self.excluded_files}
+        for row in self.copy_files.rows():
+            yield {'kind': 'copy', 'path': os.path.relpath(self.copy_files.path_of(row), root).replace(os.sep, '/'),
+                   'size': self.copy_files.value(row, 'size'), 'action': self.copy_files.action_of(row)}
+    
+    def write_report(self, directory):
+        """写入本分片的报告，返回报告路径"""
+        shard = self.shard or Shard(1, 1)
+        os.makedirs(directory, exist_ok=True)
+        header = {
+            'version': SHARD_REPORT_VERSION,
+            'shard': {'index': shard.index, 'count': shard.count, 'by': shard.by},
+            'settings': {'input': self.input_path.get(), 'output': self.output_path.get(),
+                         'extensions': self.file_extensions_var.get(),
+                         'output_encoding': self.output_encoding_var.get(),
+                         'in_place': self.in_place_var.get(), 'dedup': self.dedup_var.get()},
+            'scan': self.scan_result,
+            'process': self.process_result,
+        }
+        path = shard_report_path(directory, shard)
+        write_jsonl(path, header, self.report_rows())
+        return path
+    
+    # 界面回调：只记录结果
+    def sync_file_views(self):
+        pass
+    
+    def scan_complete(self, target_extensions):
+        self.scan_result = self.scan_report()
+    
+    def update_encoding_file_action(self, file_path, new_action):
+        self.encoding_results.set_action(file_path, new_action)
+    
+    def update_copy_file_status(self, file_path, new_status):
+        self.copy_files.set_action(file_path, new_status)
+    
+    def processing_complete(self, *args):
+        self.process_result = self.process_report(*args)
+    
+    def report_error(self, title, message):
+        raise RuntimeError(message)
+
+
+class WatchSession(BatchSession):
+    """监视模式：完整处理一次后监视输入目录，把一段时间内的变化合并为一批，
+    只重新检测和转换受影响的文件，输出设置与普通批处理相同。
+    单独变化的文件不再与其他文件去重（去重只在完整扫描时进行）"""
+
+    def __init__(self, *args, polling=False, debounce=WATCH_DEBOUNCE, status_path=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.polling = polling
+        self.debounce = debounce
+        self.status_path = status_path
+        self.watcher = None
+        self.status = None
+    
+    def start_watch(self):
+        """检查设置并开始监视（在完整处理之前开始，处理期间的修改也不会遗漏）"""
+        input_path = self.input_path.get()
+        output_path = self.output_path.get()
+        if not os.path.isdir(input_path):
+            raise ValueError("监视模式的输入必须是目录")
+        if self.in_place_var.get():
+            raise ValueError("监视模式不支持原地转换（改写的文件会再次触发处理）")
+        if not output_path or is_archive_path(output_path):
+            raise ValueError("监视模式的输出必须是目录")
+        if os.path.commonpath([input_path, output_path]) == input_path:
+            raise ValueError("监视模式的输出目录不能位于输入目录中")
+        self.watcher = create_watcher(input_path, self.polling)
+        self.status = {
+            'backend': self.watcher.backend,
+            'input': input_path,
+            'output': output_path,
+            'pid': os.getpid(),
+            'started': time.time(),
+            'watched_dirs': self.watcher.watched_dirs,
+            'files': 0,
+            'batches': 0,
+            'totals': {'convert': 0, 'copy': 0, 'removed': 0, 'fail': 0},
+            'last_batch': None,
+            'updated': time.time(),
+        }
+    
+    def watch(self, stop=None, on_batch=None):
+        """处理变化直到 stop（threading.Event）被设置或按 Ctrl+C，每批处理后以状态调用 on_batch，返回最后的状态"""
+        self.write_status()
+        try:
+            while stop is None or not stop.is_set():
+                batch = collect_watch_events(self.watcher, self.debounce, timeout=0.5)
+                if batch is not None:
+                    self.handle_changes(*batch)
+                    if on_batch is not None:
+                        on_batch(self.status)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.watcher.close()
+        return self.status
+    
+    def handle_changes(self, changed, removed, first_event=None):
+        """处理一批变化：删除已删除文件的输出，重新检测并转换变化的文件，返回本批的统计"""
+        start = time.perf_counter()
+        changed, removed = self.expand_changes(changed, removed)
+        removed_count = sum(self.remove_file(fp) for fp in removed)
+        tasks = [task for task in map(self.redetect_file, sorted(changed)) if task is not None]
+        counts = Counter()
+        if tasks:
+            counts = self._run_tasks(sorted(tasks, key=self.task_size, reverse=True), self.open_output_sink(),
+                                     len(tasks), OUTPUT_ENCODINGS[self.output_encoding_var.get()])
+        handle_ms = (time.perf_counter() - start) * 1000
+        batch = {
+            'files': len(tasks),
+            'convert': counts['convert'],
+            'copy': counts['encoding_copy'] + counts['direct_copy'] + counts['excluded_copy'],
+            'removed': removed_count,
+            'fail': counts['fail'],
+            'handle_ms': handle_ms,
+            # 从第一个事件到处理完成（包括合并事件的等待）
+            'latency_ms': (time.monotonic() - first_event) * 1000 if first_event is not None else handle_ms,
+        }
+        status = self.status
+        status['batches'] += 1
+        for key in status['totals']:
+            status['totals'][key] += batch[key]
+        status['last_batch'] = batch
+        status['watched_dirs'] = self.watcher.watched_dirs if self.watcher else 0
+        self.write_status()
+        return batch
+    
+    def known_files_under(self, directory):
+        """已记录的位于目录中的文件"""
+        prefix = directory + os.sep
+        return {fp for store in (self.encoding_results, self.copy_files) for fp in store.keys()
+                if fp.startswith(prefix)}
+    
+    def expand_changes(self, changed, removed):
+        """把变化的目录展开为其中的文件，已删除的目录展开为记录过的文件；返回 (变化的文件, 删除的文件)"""
+        files = set()
+        gone = set()
+        for path in changed:
+            if os.path.isdir(path):
+                for root, dirs, filenames in os.walk(path):
+                    dirs[:] = [d for d in dirs if d != UNDO_DIR_NAME]
+                    files.update(os.path.join(root, filename) for filename in filenames)
+                # 事件队列溢出时对照整个目录，找出期间被删除的文件
+                gone.update(fp for fp in self.known_files_under(path) if fp not in files)
+            elif os.path.exists(path):
+                files.add(path)
+            else:
+                removed = removed | {path}
+        for path in removed:
+            if path in self.encoding_results or path in self.copy_files:
+                gone.add(path)
+            elif os.path.isdir(self.get_output_file_path(path)):
+                # 输出目录与输入目录结构相同：对应输出是目录说明删除的是目录
+                gone.update(self.known_files_under(path))
+        return files, gone - files
+    
+    def remove_file(self, file_path):
+        """输入文件已删除：删除记录和对应的输出，返回是否删除了记录"""
+        store = self.encoding_results if file_path in self.encoding_results else self.copy_files
+        if file_path not in store:
+            return False
+        del store[file_path]
+        self.duplicate_of.pop(file_path, None)
+        self.excluded_files.discard(file_path)
+        output_file = self.get_output_file_path(file_path)
+        try:
+            os.remove(output_file)
+        except FileNotFoundError:
+            pass
+        # 删除随之变空的输出目录
+        directory = os.path.dirname(output_file)
+        while directory != self.output_path.get() and not os.path.exists(self.get_input_dir(directory)):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+            directory = os.path.dirname(directory)
+        return True
+    
+    def get_input_dir(self, output_dir):
+        """输出目录对应的输入目录"""
+        return os.path.join(self.input_path.get(), os.path.relpath(output_dir, self.output_path.get()))
+    
+    def redetect_file(self, file_path):
+        """重新检测变化的文件，返回处理任务 (类型, 文件)；不属于本分片的文件返回 None"""
+        if not self.owns_file(file_path):
+            return None
+        self.duplicate_of.pop(file_path, None)
+        if os.path.splitext(file_path)[1].lower() in self.get_file_extensions():
+            encoding_info = self.detect_file_encoding(file_path)
+            # 文件类型可能改变（例如文本改写为二进制内容）
+            stale = self.encoding_results if encoding_info['file_type'] == 'binary' else self.copy_files
+            if file_path in stale:
+                del stale[file_path]
+            self.add_detection_result(file_path, encoding_info)
+            if file_path in self.copy_files:
+                return 'copy', file_path
+            return ('excluded' if file_path in self.excluded_files else 'encoding'), file_path
+        if file_path in self.encoding_results:
+            del self.encoding_results[file_path]
+        self.copy_files[file_path] = self.get_file_info(file_path)
+        return 'copy', file_path
+    
+    def write_status(self):
+        """把状态写入状态文件（先写临时文件再替换，读取方不会读到写了一半的内容）"""
+        self.status['files'] = len(self.encoding_results) + len(self.copy_files)
+        self.status['updated'] = time.time()
+        if not self.status_path:
+            return
+        temp_path = self.status_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.status, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.status_path)
+
+
+# 本地转换服务：常驻进程保留已导入的 chardet 和已加载词典的转换器，构建脚本转换大量小片段时不再每次启动
+SERVICE_HOST = '127.0.0.1'  # 只监听本机
+SERVICE_QUEUE_SIZE = 64  # 等待处理的请求数上限，队列满时立即返回 503
+SERVICE_MAX_BODY = 64 * 1024 * 1024  # 单个请求正文的最大字节数
+SERVICE_BATCH_LIMIT = 1000  # /batch 一次最多的条目数
+SERVICE_SNIPPET_NAME = 'snippet.txt'  # 按文本检测内容片段（文档类型只能按文件转换）
+SERVICE_WARMUP_TEXT = '计算机软件的發展'
+SERVICE_TOKEN_HEADER = 'X-ConvertCN-Token'  # 每次启动随机生成的令牌，所有请求都要在这个请求头中带上
+# 各路径接受的请求正文类型：浏览器中的网页不能不经预检发送这些类型，也不能设置令牌请求头
+SERVICE_CONTENT_TYPES = {'/detect': 'application/octet-stream', '/convert': 'application/octet-stream',
+                         '/convert-file': 'application/json', '/batch': 'application/json'}
+
+
+class ConversionService:
+    """本地转换服务 - 固定数量的工作线程共用已加载的转换器，请求放入有界队列依次处理；
+    检测和转换复用批处理的 detect_file_encoding、convert_text_encoding 和 convert_and_save_file"""
+
+    def __init__(self, output_encoding="简体GB18030", workers=PROCESS_WORKERS, queue_size=SERVICE_QUEUE_SIZE,
+                 token=None, root=None):
+        if output_encoding not in OUTPUT_ENCODINGS:
+            raise ValueError(f"未知的输出编码: {output_encoding}")
+        self.output_encoding = output_encoding
+        self.queue_size = queue_size
+        self.token = token or secrets.token_urlsafe(24)
+        self.root = os.path.realpath(root) if root else None  # 指定时按文件转换只能读写该目录下的文件
+        self.sessions = {}  # 输出编码选项 -> 使用该选项的 BatchSession（共用转换器缓存）
+        self.jobs = queue.Queue(queue_size)
+        self.counters = Counter()  # 请求数、条目数、失败和拒绝的请求数
+        self.busy = 0.0  # 工作线程处理请求的耗时合计
+        self.latency = 0.0  # 请求从进入队列到处理完成的耗时合计
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self.workers = [threading.Thread(target=self._worker, daemon=True) for _ in range(max(1, workers))]
+        for worker in self.workers:
+            worker.start()
+    
+    def session(self, option=None):
+        """输出编码选项对应的会话（首次使用时创建）"""
+        option = option or self.output_encoding
+        if option not in OUTPUT_ENCODINGS:
+            raise ValueError(f"未知的输出编码: {option}")
+        session = self.sessions.get(option)
+        if session is None:
+            with self._lock:
+                session = self.sessions.get(option)
+                if session is None:
+                    session = BatchSession('', '', output_encoding=option)
+                    if self.sessions:
+                        # 同一词典（如 s2t）只加载一次
+                        shared = next(iter(self.sessions.values()))
+                        session.opencc_converters = shared.opencc_converters
+                        session.parallel_converter = shared.parallel_converter
+                    self.sessions[option] = session
+        return session
+    
+    def warm_up(self):
+        """预先导入 chardet 并加载默认输出编码的转换器"""
+        detect_chardet(SERVICE_WARMUP_TEXT.encode('gb18030'))
+        self.session().convert_text_encoding(SERVICE_WARMUP_TEXT, self.output_encoding)
+    
+    def submit(self, func, *args):
+        """把请求放入队列，返回 Future；队列已满时抛出 queue.Full"""
+        future = futures.Future()
+        try:
+            self.jobs.put_nowait((func, args, future, time.perf_counter()))
+        except queue.Full:
+            with self._lock:
+                self.counters['rejected'] += 1
+            raise
+        return future
+    
+    def _worker(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            func, args, future, queued = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            start = time.perf_counter()
+            try:
+                future.set_result(func(*args))
+                failed = False
+            except Exception as e:
+                future.set_exception(e)
+                failed = True
+            end = time.perf_counter()
+            with self._lock:
+                self.counters['requests'] += 1
+                self.counters['failed'] += failed
+                self.busy += end - start
+                self.latency += end - queued
+    
+    def detect(self, data):
+        """检测一段内容的编码，返回检测结果"""
+        self.count_items(1)
+        return self.session().detect_file_encoding(SERVICE_SNIPPET_NAME, data)
+    
+    def convert(self, data, option=None, source_encoding=None):
+        """转换一段内容（未指定源编码时先检测），返回 (输出字节, 源编码, 实际使用的输出编码)"""
+        self.count_items(1)
+        session = self.session(option)
+        if not source_encoding:
+            info = session.detect_file_encoding(SERVICE_SNIPPET_NAME, data)
+            if info['file_type'] == 'binary':
+                raise ValueError(f"内容是二进制数据 ({info['binary_format']})")
+            source_encoding = info['best_encoding']
+            if source_encoding == 'unknown':
+                raise ValueError("无法检测内容的编码")
+        content = data.decode(bom_free_encoding(source_encoding))
+        target_encoding = OUTPUT_ENCODINGS[session.output_encoding_var.get()]['encoding']
+        bom, converted, target_encoding = session.convert_content(content, session.create_normalizer(),
+                                                                  target_encoding, session.get_error_policy(None))
+        return bom + converted, source_encoding, target_encoding
+    
+    def convert_file(self, input_path, output_path, option=None):
+        """转换一个文件（与批处理相同：检测编码、规范化、简繁转换、无法编码字符的处理），返回结果"""
+        self.count_items(1)
+        session = self.session(option)
+        input_path = self.check_path(input_path)
+        output_path = self.check_path(output_path)
+        info = session.detect_file_encoding(input_path)
+        if 'error' in info:
+            raise ValueError(info['error'])
+        if info['file_type'] == 'binary':
+            raise ValueError(f"文件是二进制数据 ({info['binary_format']})")
+        source_encoding = info['best_encoding']
+        if source_encoding == 'unknown':
+            raise ValueError("无法检测文件的编码")
+        target_info = OUTPUT_ENCODINGS[session.output_encoding_var.get()]
+        ok, entry = session.convert_and_save_file(input_path, os.path.basename(output_path),
+                                                  DirectoryOutput(os.path.dirname(output_path)),
+                                                  source_encoding, target_info)
+        fallback = session.fallback_files.pop(input_path, None)
+        session.normalize_stats.pop(input_path, None)
+        if not ok:
+            raise ValueError(f"转换失败: {input_path}")
+        if os.path.splitext(input_path)[1].lower() in ['.doc', '.docx', '.rtf', '.odt']:
+            output_path = os.path.splitext(output_path)[0] + '.txt'
+        return {'output': output_path, 'source_encoding': source_encoding,
+                'target_encoding': fallback or target_info['encoding'], 'has_chinese': info['has_chinese']}
+    
+    def check_path(self, path):
+        """按文件转换的路径：转为绝对路径，指定了根目录时必须位于根目录下（解析符号链接后比较）"""
+        path = os.path.abspath(path)
+        if self.root is not None:
+            real = os.path.realpath(path)
+            if os.path.commonpath([self.root, real]) != self.root:
+                raise PermissionError(f"路径不在服务的根目录下: {path}")
+        return path
+    
+    def process_batch(self, requests, option=None):
+        """批量请求：在一个工作线程中依次处理，每个条目单独返回结果或 {'error': ...}"""
+        if len(requests) > SERVICE_BATCH_LIMIT:
+            raise ValueError(f"批量请求最多 {SERVICE_BATCH_LIMIT} 个条目")
+        results = []
+        for request in requests:
+            try:
+                results.append(self.process_item(request, request.get('encoding', option)))
+            except (ValueError, LookupError, OSError) as e:
+                results.append({'error': str(e)})
+        return results
+    
+    def process_item(self, request, option):
+        """批量请求中的一个条目：op 为 detect、convert（data 为 base64 的内容，或 text 只做简繁转换）、convert-file"""
+        op = request.get('op', 'convert')
+        if op == 'detect':
+            return self.detect(base64.b64decode(request['data']))
+        if op == 'convert' and 'text' in request:
+            self.count_items(1)
+            return {'text': self.session(option).convert_text_encoding(request['text'], option or self.output_encoding)}
+        if op == 'convert':
+            data, source_encoding, target_encoding = self.convert(base64.b64decode(request['data']), option,
+                                                                  request.get('source'))
+            return {'data': base64.b64encode(data).decode('ascii'),
+                    'source_encoding': source_encoding, 'target_encoding': target_encoding}
+        if op == 'convert-file':
+            return self.convert_file(request['input'], request['output'], option)
+        raise ValueError(f"未知的操作: {op}")
+    
+    def count_items(self, count):
+        with self._lock:
+            self.counters['items'] += count
+    
+    def status(self):
+        """服务状态：队列、请求统计和已加载的转换器"""
+        with self._lock:
+            requests = self.counters['requests']
+            # 各会话共用同一个转换器缓存（键为 (选择的引擎, 配置)，值为 (实际引擎, 转换器)）
+            converters = {f"{backend}:{config}" for session in self.sessions.values()
+                          for (selected, config), (backend, converter) in list(session.opencc_converters.items())}
+            return {
+                'workers': len(self.workers),
+                'queue': self.jobs.qsize(),
+                'queue_size': self.queue_size,
+                'requests': requests,
+                'items': self.counters['items'],
+                'failed': self.counters['failed'],
+                'rejected': self.counters['rejected'],
+                'busy_seconds': self.busy,
+                'avg_ms': self.latency / requests * 1000 if requests else 0.0,
+                'uptime': time.time() - self.started,
+                'encodings': sorted(self.sessions),
+                'converters': sorted(converters),
+            }
+    
+    def close(self):
+        """处理完队列中的请求后结束工作线程"""
+        for worker in self.workers:
+            self.jobs.put(None)
+        for worker in self.workers:
+            worker.join()
+
+
+def create_service_server(service, port=0, host=SERVICE_HOST):
+    """创建转换服务的 HTTP 服务器（每个连接一个线程，只负责收发；检测和转换由服务的工作线程进行）。
+    POST /detect、/convert?encoding=&source=（正文为原始内容）、/convert-file、/batch（JSON）；GET /status"""
+    import socket
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import urlsplit, parse_qs
+    
+    class ServiceHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # 保持连接，连续的请求不必重新建立连接
+        disable_nagle_algorithm = True  # 响应头和正文分开写入，不关闭 Nagle 时每个请求要等对方的延迟确认（约 40 ms）
+        
+        def log_message(self, format, *args):
+            pass
+        
+        def send(self, status, body, content_type='application/json; charset=utf-8', headers=()):
+            if not isinstance(body, bytes):
+                body = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def check_request(self, path):
+            """拒绝来自浏览器中网页的请求（带 Origin）、没有正确令牌和正文类型不对的请求，拒绝时返回 False"""
+            if self.headers.get('Origin') is not None:
+                error = 403, "不接受来自浏览器网页的请求"
+            elif not hmac.compare_digest(self.headers.get(SERVICE_TOKEN_HEADER, ''), service.token):
+                error = 401, f"缺少或错误的令牌（请求头 {SERVICE_TOKEN_HEADER}）"
+            elif self.command == 'POST' and path in SERVICE_CONTENT_TYPES and \
+                    self.headers.get('Content-Type', '').split(';')[0].strip().lower() != SERVICE_CONTENT_TYPES[path]:
+                error = 415, f"{path} 的请求正文类型必须是 {SERVICE_CONTENT_TYPES[path]}"
+            else:
+                return True
+            self.close_connection = True  # 没有读取正文，不能继续使用这个连接
+            self.send(error[0], {'error': error[1]})
+            return False
+        
+        def do_GET(self):
+            if not self.check_request(urlsplit(self.path).path):
+                return
+            if urlsplit(self.path).path == '/status':
+                self.send(200, service.status())
+            else:
+                self.send(404, {'error': f"未知的路径: {self.path}"})
+        
+        def do_POST(self):
+            url = urlsplit(self.path)
+            if not self.check_request(url.path):
+                return
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            length = int(self.headers.get('Content-Length') or 0)
+            if length > SERVICE_MAX_BODY:
+                self.close_connection = True  # 没有读取正文，不能继续使用这个连接
+                self.send(413, {'error': f"请求正文超过 {format_size(SERVICE_MAX_BODY)}"})
+                return
+            body = self.rfile.read(length)
+            try:
+                if url.path == '/detect':
+                    future = service.submit(service.detect, body)
+                elif url.path == '/convert':
+                    future = service.submit(service.convert, body, query.get('encoding'), query.get('source'))
+                elif url.path == '/convert-file':
+                    request = json.loads(body)
+                    future = service.submit(service.convert_file, request['input'], request['output'],
+                                            request.get('encoding'))
+                elif url.path == '/batch':
+                    request = json.loads(body)
+                    future = service.submit(service.process_batch, request['requests'], request.get('encoding'))
+                else:
+                    self.send(404, {'error': f"未知的路径: {url.path}"})
+                    return
+                result = future.result()
+            except queue.Full:
+                self.send(503, {'error': "服务繁忙，请稍后重试"}, headers=[('Retry-After', '1')])
+                return
+            except (ValueError, LookupError, OSError) as e:
+                self.send(400, {'error': str(e)})
+                return
+            except Exception as e:
+                self.send(500, {'error': str(e)})
+                return
+            
+            if url.path == '/convert':
+                data, source_encoding, target_encoding = result
+                self.send(200, data, 'application/octet-stream',
+                          [('X-Source-Encoding', source_encoding), ('X-Target-Encoding', target_encoding)])
+            elif url.path == '/batch':
+                self.send(200, {'results': result})
+            else:
+                self.send(200, result)
+    
+    class ServiceServer(ThreadingHTTPServer):
+        # 默认的监听队列只有 5 个连接，同时到达的连接超过时会被内核丢弃或重置，应由服务的队列上限返回 503
+        request_queue_size = socket.SOMAXCONN
+    
+    return ServiceServer((host, port), ServiceHandler)
+
+
+def run_batch(args):
+    """命令行批处理（可分片、可使用扫描计划），返回退出码"""
+    shard = Shard.parse(args.shard, args.shard_by) if args.shard else None
+    plan = None
+    if args.plan:
+        # 扫描计划中保存了输入和设置，命令行指定的输出目录和输出编码优先
+        header, records = read_plan(args.plan)
+        for key, value in (('output', args.output and os.path.abspath(args.output)),
+                           ('output_encoding', args.encoding), ('extensions', args.extensions)):
+            if value:
+                header[key] = value
+        if args.in_place:
+            header['in_place'] = True
+        plan = header, records
+    elif not args.input:
+        raise ValueError("请指定输入目录 (--input) 或扫描计划 (--plan)")
+    if args.watch and (args.plan or args.scan_only):
+        raise ValueError("监视模式需要扫描并处理输入目录，不能使用扫描计划或只扫描")
+    
+    options = dict(in_place=args.in_place, dedup=not args.no_dedup, shard=shard)
+    if args.watch:
+        session = WatchSession(args.input, args.output, args.extensions or DEFAULT_EXTENSIONS,
+                               args.encoding or "简体GB18030", polling=args.poll,
+                               debounce=args.debounce / 1000, status_path=args.watch_status, **options)
+        session.start_watch()
+    else:
+        session = BatchSession(args.input or '', args.output, args.extensions or DEFAULT_EXTENSIONS,
+                               args.encoding or "简体GB18030", **options)
+    if args.memory_budget:
+        session.memory_budget = args.memory_budget * 1024 * 1024
+    scan, process = session.run(plan, scan_only=args.scan_only, pipeline=args.pipeline)
+    if shard:
+        print(f"分片 {shard.index}/{shard.count} ({SHARD_MODES[shard.by]})\n")
+    print(format_scan_summary(scan))
+    if args.save_plan:
+        write_jsonl(args.save_plan, session.plan_header(), session.plan_records())
+        print(f"扫描计划: {args.save_plan}")
+    if process is None:
+        return 0
+    print(format_process_summary(process))
+    if args.report_dir:
+        print(f"\n分片报告: {session.write_report(args.report_dir)}")
+    if args.watch:
+        print(f"\n正在监视输入目录 ({session.watcher.backend}, {session.watcher.watched_dirs} 个目录)，"
+              f"按 Ctrl+C 结束", flush=True)
+        status = session.watch(on_batch=lambda status: print(format_watch_status(status), flush=True))
+        return 1 if status['totals']['fail'] else 0
+    return 1 if process['counts']['fail'] else 0
+
+
+def run_rollback(args):
+    """撤销原地转换：未指定撤销目录时撤销输入目录中最近一次原地转换，返回退出码"""
+    undo_dir = args.rollback
+    if not undo_dir:
+        if not args.input or not os.path.isdir(args.input):
+            raise ValueError("请指定撤销目录 (--rollback UNDO_DIR) 或输入目录 (--input)")
+        runs = find_undo_runs(args.input)
+        if not runs:
+            raise ValueError(f"输入目录中没有原地转换的撤销记录: {args.input}")
+        undo_dir = runs[-1]
+    restored = rollback_in_place(undo_dir)
+    print(f"已撤销原地转换 {undo_dir} - 恢复 {restored} 个文件")
+    return 0
+
+
+def run_service(args):
+    """本地转换服务：预热后处理请求，直到按 Ctrl+C"""
+    start = time.perf_counter()
+    service = ConversionService(args.encoding or "简体GB18030", queue_size=args.queue_size,
+                                root=args.service_root)
+    service.warm_up()
+    server = create_service_server(service, args.serve)
+    host, port = server.server_address[:2]
+    if args.token_file:
+        # 令牌文件只有当前用户可读
+        fd = os.open(args.token_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(service.token + '\n')
+    print(f"转换服务已启动: http://{host}:{port} (预热 {(time.perf_counter() - start) * 1000:.0f} ms, "
+          f"{len(service.workers)} 个工作线程, 队列上限 {service.queue_size})")
+    print(f"令牌: {service.token}（每个请求都要带上请求头 {SERVICE_TOKEN_HEADER}）")
+    if service.root:
+        print(f"按文件转换只允许 {service.root} 下的文件")
+    print("POST /detect, /convert?encoding=输出编码, /convert-file, /batch; GET /status; 按 Ctrl+C 结束", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+    return 0
+
+
+def parse_arguments(argv=None):
+    """解析命令行参数，无参数时返回 None（直接启动界面，不导入 argparse）"""
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        return None
+    
+    import argparse
+    parser = argparse.ArgumentParser(description=f"文件编码统一工具 v{VERSION}")
+    parser.add_argument('--import-time', action='store_true',
+                        help='输出模块导入耗时报告 (基于 python -X importtime)')
+    parser.add_argument('--startup-time', action='store_true',
+                        help='窗口首次显示后输出启动耗时并退出')
+    
+    batch = parser.add_argument_group('批处理（不显示界面）')
+    batch.add_argument('--input', help='输入目录或压缩包，指定后不启动界面直接扫描并处理')
+    batch.add_argument('--output', help='输出目录或压缩包')
+    batch.add_argument('--extensions', help='需要检测编码的文件类型，逗号分隔（默认与界面相同）')
+    batch.add_argument('--encoding', choices=list(OUTPUT_ENCODINGS), help='输出编码（默认 简体GB18030）')
+    batch.add_argument('--in-place', action='store_true', help='原地转换（保存撤销记录）')
+    batch.add_argument('--rollback', nargs='?', const='', metavar='UNDO_DIR',
+                       help='撤销原地转换：恢复撤销目录中记录的文件（未指定时撤销 --input 目录中最近一次原地转换）')
+    batch.add_argument('--no-dedup', action='store_true', help='不合并重复内容')
+    batch.add_argument('--pipeline', action='store_true',
+                       help='扫描和转换同时进行，读出的内容直接用于转换，不再重新读取')
+    batch.add_argument('--memory-budget', type=int, metavar='MB',
+                       help='同时处理的文件估算内存占用的上限（默认物理内存的 1/4，最多 1024 MB）')
+    batch.add_argument('--shard', metavar='K/N', help='只处理 N 个分片中的第 K 个（K 从 1 开始）')
+    batch.add_argument('--shard-by', default='hash', choices=list(SHARD_MODES),
+                       help='分片方式: hash 按文件路径哈希, dir 按所在目录（同一目录的文件在同一分片）')
+    batch.add_argument('--report-dir', help='分片报告的保存目录（各分片可以写入同一共享目录）')
+    batch.add_argument('--merge', metavar='REPORT_DIR', help='合并目录中的分片报告，输出汇总统计')
+    batch.add_argument('--save-plan', metavar='PLAN', help='扫描后保存扫描计划')
+    batch.add_argument('--scan-only', action='store_true', help='只扫描不处理（配合 --save-plan）')
+    batch.add_argument('--plan', metavar='PLAN', help='加载扫描计划直接处理，不重新扫描')
+    batch.add_argument('--watch', action='store_true',
+                       help='处理后继续监视输入目录，只重新转换变化的文件（inotify，不可用时轮询）')
+    batch.add_argument('--poll', action='store_true', help='监视时使用轮询（网络文件系统上 inotify 收不到其他机器的修改）')
+    batch.add_argument('--debounce', type=int, default=int(WATCH_DEBOUNCE * 1000), metavar='MS',
+                       help=f'最后一次修改后等待多久再处理，期间的修改合并处理（默认 {int(WATCH_DEBOUNCE * 1000)} ms）')
+    batch.add_argument('--watch-status', metavar='FILE', help='监视状态（JSON）的保存路径，每批处理后更新')
+    
+    service = parser.add_argument_group('本地转换服务')
+    service.add_argument('--serve', type=int, metavar='PORT',
+                         help='在 127.0.0.1 的端口上提供检测和转换服务（0 为任意空闲端口），--encoding 为默认输出编码')
+    service.add_argument('--queue-size', type=int, default=SERVICE_QUEUE_SIZE, metavar='N',
+                         help=f'等待处理的请求数上限，超过时返回 503（默认 {SERVICE_QUEUE_SIZE}）')
+    service.add_argument('--token-file', metavar='FILE', help='把本次启动的令牌写入文件（只有当前用户可读），供构建脚本读取')
+    service.add_argument('--service-root', metavar='DIR', help='按文件转换（/convert-file）只允许读写该目录下的文件')
+    return parser.parse_args(argv)
+
+
+def print_import_time_report(top=20):
+    """用 -X importtime 重新导入本模块，输出耗时最多的模块"""
+    if getattr(sys, 'frozen', False):
+        print("打包版本不支持 -X importtime，请使用源码运行")
+        return
+    
+    import subprocess
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    module_name = os.path.splitext(os.path.basename(__file__))[0]
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module_name}'],
+                            cwd=script_dir, capture_output=True, text=True)
+    
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((int(self_us), int(cumulative_us), name.rstrip()))
+    if not rows:
+        print(result.stderr)
+        return
+    
+    total_us = next((row[1] for row in rows if row[2].strip() == module_name), rows[-1][1])
+    print(f"模块导入总耗时: {total_us / 1000:.1f} ms ({len(rows)} 个模块)\n")
+    print(f"耗时最多的 {top} 个模块 (自身耗时):")
+    print(f"{'自身(ms)':>10} {'累计(ms)':>10}  模块")
+    for self_us, cumulative_us, name in sorted(rows, reverse=True)[:top]:
+        print(f"{self_us / 1000:10.1f} {cumulative_us / 1000:10.1f}  {name.strip()}")
+    
+    lazy_modules = [value._name for value in globals().values() if isinstance(value, LazyModule)]
+    print(f"\n延迟导入的模块 (首次使用时加载): {', '.join(lazy_modules + ['opencc'])}")
+
 
 def main():
+    args = parse_arguments()
+    if args and args.import_time:
+        print_import_time_report()
+        return
+    if args and (args.merge or args.input or args.plan or args.serve is not None or args.rollback is not None):
+        try:
+            if args.serve is not None:
+                sys.exit(run_service(args))
+            if args.rollback is not None:
+                sys.exit(run_rollback(args))
+            if args.input or args.plan:
+                sys.exit(run_batch(args))
+            merged_path = os.path.join(args.merge, 'merged.jsonl')
+            scan, process = merge_shard_reports(args.merge, merged_path)
+            print(format_scan_summary(scan))
+            print(format_process_summary(process))
+            print(f"\n合并报告: {merged_path}")
+        except (OSError, ValueError, RuntimeError) as e:
+            print(f"错误: {e}", file=sys.stderr)
+            sys.exit(2)
+        return
+    
+    import_time = time.perf_counter() - _START_TIME
     root = tk.Tk()
     app = EncodingUnifierGUI(root)
+    
+    if args and args.startup_time:
+        # 等待窗口绘制完成后统计耗时
+        root.update()
+        window_time = time.perf_counter() - _START_TIME
+        print(f"首个窗口显示耗时: {window_time * 1000:.1f} ms (模块导入 {import_time * 1000:.1f} ms)")
+        root.destroy()
+        return
+    
     root.mainloop()
 
 if __name__ == "__main__":
+    if getattr(sys, 'frozen', False):
+        # 打包后的程序需要支持进程池子进程的启动
+        import multiprocessing
+        multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""压缩包输出：提交顺序最前面的条目直接写入压缩包，内容与输出到目录相同；直接写入失败的 zip 条目被删除"""
+
+import os
+import sys
+import tarfile
+import tempfile
+import zipfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import encoding_gui_4 as app  # noqa: E402
+
+TEXT = "计算机软件的发展非常迅速，简体中文的文件通常使用同一种编码。\n"
+
+
+def read_archive(path):
+    if path.endswith(".zip"):
+        with zipfile.ZipFile(path) as archive:
+            assert archive.testzip() is None
+            return {name: archive.read(name) for name in archive.namelist()}
+    with tarfile.open(path) as archive:
+        # 重复内容的文件是硬链接条目
+        return {member.name: archive.extractfile(member).read() for member in archive
+                if member.isfile() or member.islnk()}
+
+
+def read_directory(root):
+    result = {}
+    for dirpath, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(dirpath, name)
+            with open(path, "rb") as f:
+                result[os.path.relpath(path, root).replace(os.sep, "/")] = f.read()
+    return result
+
+
+@pytest.fixture
+def spooled(monkeypatch):
+    """记录每次创建的输出是否写入临时缓冲"""
+    created = []
+    create = app.ArchiveOutput.create
+
+    def spy(self, relpath, size=None):
+        f = create(self, relpath, size)
+        created.append((relpath.replace(os.sep, "/"), isinstance(f, tempfile.SpooledTemporaryFile)))
+        return f
+    monkeypatch.setattr(app.ArchiveOutput, "create", spy)
+    return created
+
+
+@pytest.mark.parametrize("name, encoding, direct", [
+    ("out.zip", "UTF-8(无BOM)", True),  # 流式转码，大小未知
+    ("out.zip", "繁体UTF-8", True),
+    ("out.tar.gz", "UTF-8(无BOM)", False),  # tar 头部需要大小，流式转码的结果只能先缓冲
+    ("out.tar.gz", "繁体UTF-8", True),  # 整文件简繁转换，写入前已知大小
+])
+def test_archive_matches_directory(tmp_path, name, encoding, direct, spooled):
+    pytest.importorskip("chardet")
+    source = tmp_path / "in"
+    (source / "sub").mkdir(parents=True)
+    (source / "big.txt").write_bytes((TEXT * 3000).encode("gbk"))
+    for i in range(6):
+        (source / "sub" / f"{i}.txt").write_bytes((TEXT * (i + 1)).encode("gbk"))
+    (source / "sub" / "dup.txt").write_bytes((TEXT * 3).encode("gbk"))
+    (source / "utf8.md").write_bytes(TEXT.encode("utf-8"))
+    (source / "image.bin").write_bytes(bytes(range(256)) * 8)
+
+    expected_dir = tmp_path / "dir"
+    app.BatchSession(str(source), str(expected_dir), output_encoding=encoding).run()
+    archive = tmp_path / name
+    _, process = app.BatchSession(str(source), str(archive), output_encoding=encoding).run()
+    assert process["counts"]["fail"] == 0
+    assert read_archive(str(archive)) == read_directory(expected_dir)
+
+    # 最大的文件先处理，开始时没有更早的条目：直接写入压缩包而不是临时缓冲
+    assert spooled[0] == ("big.txt", not direct)
+
+
+def test_tar_direct_needs_known_size(tmp_path):
+    sink = app.ArchiveOutput(str(tmp_path / "out.tar.gz"))
+    sink.set_head("a")
+    sink.start_task("a", 1700000000, 10)
+    f = sink.create("a.txt")  # 流式转码的大小未知，tar 只能先缓冲
+    assert not isinstance(f, app.TarEntryWriter)
+    f.write(b"streamed")
+    entry = sink.finish("a.txt", f, 1700000000)
+    sink.commit(entry)
+
+    sink.set_head("b")
+    sink.start_task("b", 1700000000, 10)
+    data = TEXT.encode("utf-8")
+    f = sink.create("b.txt", len(data))
+    assert isinstance(f, app.TarEntryWriter)
+    f.write(data[:10])
+    f.write(data[10:])
+    assert sink.finish("b.txt", f, 1700000000) is None
+    sink.close()
+    assert read_archive(str(tmp_path / "out.tar.gz")) == {"a.txt": b"streamed", "b.txt": data}
+
+
+def test_failed_direct_zip_entry_is_removed(tmp_path):
+    path = str(tmp_path / "out.zip")
+    sink = app.ArchiveOutput(path)
+    sink.set_head("a")
+    sink.start_task("a", 1700000000, 1 << 20)
+    f = sink.create("a.txt")
+    f.write(os.urandom(1 << 20))
+    sink.discard("a.txt", f)  # 转换到一半失败
+
+    sink.set_head("b")
+    sink.start_task("b", 1700000000, 10)
+    f = sink.create("b.txt")
+    f.write(b"ok")
+    assert sink.finish("b.txt", f, 1700000000) is None
+    sink.close()
+    assert read_archive(path) == {"b.txt": b"ok"}
+    assert os.path.getsize(path) < 1024
+
+
+def test_only_head_writes_directly(tmp_path):
+    sink = app.ArchiveOutput(str(tmp_path / "out.zip"))
+    sink.set_head("a")
+    sink.start_task("b", 1700000000, 10)
+    spooled = sink.create("b.txt")  # 还有更早的条目没有写入
+    spooled.write(b"second")
+    entry = sink.finish("b.txt", spooled, 1700000000)
+
+    sink.start_task("a", 1700000000, 10)
+    f = sink.create("a.txt")
+    f.write(b"first")
+    assert sink.finish("a.txt", f, 1700000000) is None
+    sink.commit(entry)
+    sink.close()
+    with zipfile.ZipFile(str(tmp_path / "out.zip")) as archive:
+        assert archive.namelist() == ["a.txt", "b.txt"]
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""内容去重：大小和快速哈希相同时用强哈希确认，之前的文件无法重新读取时不中断扫描"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import encoding_gui_4 as app  # noqa: E402
+
+TEXT = "计算机软件的发展非常迅速，简体中文的文件通常使用同一种编码。\n"
+
+
+def test_duplicates_confirmed_by_strong_hash(tmp_path):
+    data = TEXT.encode("gbk")
+    for name in ("a.txt", "b.txt"):
+        (tmp_path / name).write_bytes(data)
+    index = app.ContentIndex()
+    assert index.add(str(tmp_path / "a.txt"), data) is None
+    assert index.add(str(tmp_path / "b.txt"), data) == str(tmp_path / "a.txt")
+    assert (index.total_bytes, index.unique_bytes) == (2 * len(data), len(data))
+
+
+def test_unreadable_first_file_does_not_match(tmp_path):
+    data = TEXT.encode("gbk")
+    index = app.ContentIndex()
+    assert index.add(str(tmp_path / "deleted.txt"), data) is None  # 登记后被删除
+    (tmp_path / "b.txt").write_bytes(data)
+    (tmp_path / "c.txt").write_bytes(data)
+    assert index.add(str(tmp_path / "b.txt"), data) is None
+    # 之后内容相同的文件与可以读取的文件去重
+    assert index.add(str(tmp_path / "c.txt"), data) == str(tmp_path / "b.txt")
+    assert index.unique_bytes == 2 * len(data)
+
+
+def test_scan_uses_input_opener_and_survives_read_errors(tmp_path):
+    pytest.importorskip("chardet")
+    source = tmp_path / "in"
+    source.mkdir()
+    data = TEXT.encode("gbk")
+    for name in ("a.txt", "b.txt", "c.txt"):
+        (source / name).write_bytes(data)
+
+    session = app.BatchSession(str(source), "")
+    opened = []
+
+    def opener(path, mode):
+        if path in opened:
+            # 第一次读取后文件变得无法读取（例如网络共享断开）
+            raise PermissionError(path)
+        opened.append(path)
+        return open(path, mode)
+    session.input_opener = opener
+    scan, _ = session.run(scan_only=True)
+    assert scan["encoding_files"] == 3
+    # 确认第二个文件与第一个相同时重新读取第一个文件失败：第二个文件单独检测，第三个文件与第二个去重
+    first, second, third = opened
+    assert session.duplicate_of == {third: second}
+    assert session.encoding_results[second]["best_encoding"] == "gb18030"
+    assert session.encoding_results[first]["best_encoding"] == "gb18030"
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""chardet 逐块检测：检测器得出结论后停止，结果与检测整个缓冲区相同"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import encoding_gui_4 as app  # noqa: E402
+
+chardet = pytest.importorskip("chardet")
+
+TEXT = "计算机软件的发展非常迅速，简体中文的文件通常使用同一种编码。\n"
+
+
+# chardet 7 检查的字节数有上限，达到后设置 done；更早的版本只在遇到 BOM 等能确定编码时设置
+LIMITED = int(chardet.__version__.split(".")[0]) >= 7
+
+
+@pytest.mark.parametrize("data, stops", [
+    ((TEXT * 6000).encode("utf-8"), LIMITED),
+    ((TEXT * 6000).encode("gbk"), LIMITED),
+    (b"\xef\xbb\xbf" + (TEXT * 6000).encode("utf-8"), True),
+    (b"plain ascii text\n" * 20000, LIMITED),
+])
+def test_stops_when_done(data, stops):
+    result, checked = app.detect_chardet(data)
+    assert (checked < len(data)) == stops
+    assert result["encoding"] == chardet.detect(data)["encoding"]
+
+
+def test_small_buffer_checked_completely():
+    data = TEXT.encode("gbk")
+    result, checked = app.detect_chardet(data)
+    assert checked == len(data)
+    assert result == chardet.detect(data)
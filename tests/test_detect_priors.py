@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""目录编码先验：检测结果与不使用先验时一致，包括与先验冲突时退回完整检测"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import encoding_gui_4 as app  # noqa: E402
+
+pytest.importorskip("chardet")
+
+TEXT = "计算机软件的发展非常迅速，简体中文的文件通常使用同一种编码。\n"
+
+
+def summary(result):
+    return result["best_encoding"], result["has_chinese"], result["chardet_encoding"]
+
+
+def test_skipped_encoding_that_decodes_falls_back_to_full_search(monkeypatch):
+    session = app.BatchSession("", "")
+    priors = app.EncodingPriors()
+    directory = os.path.join("项目", "src")
+    gbk_files = [(TEXT * (i + 1)).encode("gbk") for i in range(app.ENCODING_PRIOR_MIN_FILES + 2)]
+    for i, data in enumerate(gbk_files):
+        session.detect_file_encoding(os.path.join(directory, f"{i}.txt"), data, priors)
+    chardet_encoding = app.detect_chardet(gbk_files[0])[0]["encoding"]
+    prior, skip = priors.get(directory, chardet_encoding)
+    assert prior == "gb18030" and "utf-8" in skip
+
+    # UTF-8 文件的 chardet 结果与目录中的 GBK 文件相同，按 gb18030 也能解码且得到最高分：
+    # 不能因为先验跳过 utf-8
+    data = ("软件发展" * 20 + "\n").encode("utf-8")
+    assert app.scan_decoded(data, "gb18030") == (True, False)
+    monkeypatch.setattr(app, "detect_chardet",
+                        lambda raw_data: ({"encoding": chardet_encoding, "confidence": 0.99}, len(raw_data)))
+    with_priors = session.detect_file_encoding(os.path.join(directory, "utf8.txt"), data, priors)
+    without_priors = session.detect_file_encoding(os.path.join(directory, "utf8.txt"), data)
+    assert summary(with_priors) == summary(without_priors)
+    assert with_priors["best_encoding"] == "utf-8"
+
+
+def test_priors_match_full_detection_on_mixed_directory(tmp_path):
+    # 一个目录以 GBK 为主，夹杂 UTF-8、BIG5、纯 ASCII 和无法解码的文件；另一个目录全是 UTF-8
+    files = {}
+    for i in range(20):
+        files[os.path.join("gbk", f"{i:02d}.txt")] = (TEXT * (i + 1)).encode("gbk")
+    files[os.path.join("gbk", "utf8.txt")] = TEXT.encode("utf-8")
+    files[os.path.join("gbk", "utf8_gb18030.txt")] = ("软件发展" * 20 + "\n").encode("utf-8")
+    files[os.path.join("gbk", "big5.txt")] = "電腦軟體的發展非常迅速。\n".encode("big5")
+    files[os.path.join("gbk", "ascii.txt")] = b"plain ascii text\n"
+    files[os.path.join("gbk", "broken.txt")] = TEXT.encode("gbk") + b"\xff\xfe\x80"
+    for i in range(12):
+        files[os.path.join("utf8", f"{i:02d}.txt")] = (TEXT * (i + 2)).encode("utf-8")
+    files[os.path.join("utf8", "gbk.txt")] = TEXT.encode("gbk")
+    for relpath, data in files.items():
+        path = tmp_path / relpath
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(data)
+
+    session = app.BatchSession(str(tmp_path), "")
+    priors = app.EncodingPriors()
+    for relpath in sorted(files):
+        path = str(tmp_path / relpath)
+        with_priors = session.detect_file_encoding(path, priors=priors)
+        without_priors = session.detect_file_encoding(path)
+        assert summary(with_priors) == summary(without_priors), relpath
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""原地转换：只改写需要转换的文件并保留权限和修改时间，撤销后恢复为原来的内容"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import encoding_gui_4 as app  # noqa: E402
+
+pytest.importorskip("chardet")
+
+TEXT = "计算机软件的发展非常迅速，简体中文的文件通常使用同一种编码。\n"
+MTIME_NS = 1_600_000_000_123_456_789
+
+
+def make_tree(root):
+    files = {
+        "gbk.txt": (TEXT * 3).encode("gbk"),
+        os.path.join("src", "a.c"): ("/* " + TEXT + " */\n").encode("gbk"),
+        os.path.join("src", "run.py"): ("# " + TEXT).encode("gbk"),
+        # 已经是目标编码或不需要转换的文件保持不变
+        "utf8.txt": (TEXT * 2).encode("utf-8"),
+        "ascii.txt": b"plain ascii text\n",
+        "image.bin": bytes(range(256)),
+    }
+    for relpath, data in files.items():
+        path = root / relpath
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(data)
+    os.chmod(root / "src" / "run.py", 0o750)
+    for relpath in files:
+        os.utime(root / relpath, ns=(MTIME_NS, MTIME_NS))
+    return files
+
+
+def snapshot(root):
+    result = {}
+    for dirpath, dirs, names in os.walk(root):
+        dirs[:] = [d for d in dirs if d != app.UNDO_DIR_NAME]
+        for name in names:
+            path = os.path.join(dirpath, name)
+            stat = os.stat(path)
+            with open(path, "rb") as f:
+                result[os.path.relpath(path, root)] = (f.read(), stat.st_mode, stat.st_mtime_ns, stat.st_ino)
+    return result
+
+
+def test_in_place_and_rollback(tmp_path):
+    files = make_tree(tmp_path)
+    before = snapshot(tmp_path)
+
+    session = app.BatchSession(str(tmp_path), "", output_encoding="UTF-8(无BOM)", in_place=True)
+    _, process = session.run()
+    assert process["counts"]["fail"] == 0
+    after = snapshot(tmp_path)
+    assert set(after) == set(before)
+
+    converted = {"gbk.txt", os.path.join("src", "a.c"), os.path.join("src", "run.py")}
+    for relpath, (data, mode, mtime_ns, inode) in after.items():
+        if relpath in converted:
+            assert data == files[relpath].decode("gbk").encode("utf-8"), relpath
+            assert inode != before[relpath][3], relpath
+        else:
+            # 不需要转换的文件没有被改写
+            assert (data, inode) == (before[relpath][0], before[relpath][3]), relpath
+        assert mode == before[relpath][1], relpath
+        assert mtime_ns == before[relpath][2], relpath
+
+    runs = app.find_undo_runs(str(tmp_path))
+    assert len(runs) == 1
+    assert app.rollback_in_place(runs[0]) == len(converted)
+    restored = snapshot(tmp_path)
+    assert {relpath: value[:3] for relpath, value in restored.items()} == \
+        {relpath: value[:3] for relpath, value in before.items()}
+    assert app.find_undo_runs(str(tmp_path)) == []
+    assert not (tmp_path / app.UNDO_DIR_NAME).exists()
+
+
+def test_rollback_command_line(tmp_path, capsys):
+    make_tree(tmp_path)
+    before = snapshot(tmp_path)
+    for _ in range(2):
+        app.BatchSession(str(tmp_path), "", output_encoding="UTF-8(无BOM)", in_place=True).run()
+        app.BatchSession(str(tmp_path), "", output_encoding="简体GB18030", in_place=True).run()
+    runs = app.find_undo_runs(str(tmp_path))
+    assert len(runs) == 4
+
+    # 指定撤销目录时只撤销这一次；未指定时撤销 --input 目录中最近一次
+    assert app.run_rollback(app.parse_arguments(["--rollback", runs[-1]])) == 0
+    assert app.run_rollback(app.parse_arguments(["--input", str(tmp_path), "--rollback"])) == 0
+    assert app.find_undo_runs(str(tmp_path)) == runs[:2]
+    assert capsys.readouterr().out.count("恢复 4 个文件") == 2
+    for undo_dir in reversed(runs[:2]):
+        app.rollback_in_place(undo_dir)
+    assert {relpath: value[0] for relpath, value in snapshot(tmp_path).items()} == \
+        {relpath: value[0] for relpath, value in before.items()}
+
+    with pytest.raises(ValueError):
+        app.run_rollback(app.parse_arguments(["--input", str(tmp_path), "--rollback"]))
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""换行符、BOM 和行尾空白的规范化：结果和统计与分块方式无关，CRLF 被块边界拆开时不会变成两个换行"""
+
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import encoding_gui_4 as app  # noqa: E402
+
+TEXT = "第一行  \r\n第二行\t\r第三行\n\n  \r\n最后一行 \t"
+
+
+def feed_chunks(normalizer, text, sizes):
+    """按给定的块大小依次处理，返回拼接后的结果"""
+    parts, start = [], 0
+    for size in sizes:
+        parts.append(normalizer.feed(text[start:start + size]))
+        start += size
+    parts.append(normalizer.feed(text[start:], final=True))
+    return "".join(parts)
+
+
+@pytest.mark.parametrize("eol, trim, expected, stats", [
+    ("preserve", False, TEXT, {"eol": 0, "trailing": 0, "bom": ""}),
+    ("lf", False, "第一行  \n第二行\t\n第三行\n\n  \n最后一行 \t", {"eol": 3, "trailing": 0, "bom": ""}),
+    ("crlf", False, "第一行  \r\n第二行\t\r\n第三行\r\n\r\n  \r\n最后一行 \t", {"eol": 3, "trailing": 0, "bom": ""}),
+    ("lf", True, "第一行\n第二行\n第三行\n\n\n最后一行", {"eol": 3, "trailing": 4, "bom": ""}),
+    ("preserve", True, "第一行\r\n第二行\r第三行\n\n\r\n最后一行", {"eol": 0, "trailing": 4, "bom": ""}),
+])
+def test_normalize_any_chunking(eol, trim, expected, stats):
+    # 整块处理和在每个位置切成两块（包括 \r 和 \n 之间、行尾空白中间）的结果和统计都相同
+    for split in range(len(TEXT) + 1):
+        normalizer = app.TextNormalizer(eol=eol, trim_trailing=trim)
+        assert feed_chunks(normalizer, TEXT, [split]) == expected, split
+        assert normalizer.stats() == stats, split
+    normalizer = app.TextNormalizer(eol=eol, trim_trailing=trim)
+    assert feed_chunks(normalizer, TEXT, [1] * len(TEXT)) == expected
+    assert normalizer.stats() == stats
+
+
+def test_crlf_split_across_read_buffers():
+    # 流式转码时 \r 在一个读取块的末尾，\n 在下一块的开头
+    data = ("软件\r\n" * 50).encode("gbk")
+    for buffer_size in (1, 3, 5, 7, 64):
+        target = io.BytesIO()
+        normalizer = app.TextNormalizer(eol="lf")
+        app.transcode_stream(io.BytesIO(data), target, "gbk", "utf-8",
+                             normalizer=normalizer, buffer_size=buffer_size)
+        assert target.getvalue() == ("软件\n" * 50).encode("utf-8"), buffer_size
+        assert normalizer.stats()["eol"] == 50
+
+
+@pytest.mark.parametrize("source, bom, target, expected_bom, stats_bom", [
+    ("utf-8-sig", "auto", "utf-8", False, "removed"),
+    ("utf-8-sig", "preserve", "utf-8", True, ""),
+    ("utf-8-sig", "strip", "utf-8-sig", False, "removed"),
+    ("utf-8", "add", "utf-8", True, "added"),
+    ("utf-8", "auto", "utf-8-sig", True, "added"),
+    ("utf-8-sig", "add", "gb18030", False, "removed"),
+])
+def test_bom(source, bom, target, expected_bom, stats_bom):
+    data = "计算机软件\n".encode(source)
+    output = io.BytesIO()
+    normalizer = app.TextNormalizer(bom=bom)
+    app.transcode_stream(io.BytesIO(data), output, "utf-8", target, normalizer=normalizer, buffer_size=2)
+    body = "计算机软件\n".encode(app.bom_free_encoding(target))
+    assert output.getvalue() == (b"\xef\xbb\xbf" if expected_bom else b"") + body
+    assert normalizer.stats()["bom"] == stats_bom
+
+
+def test_passthrough():
+    assert app.TextNormalizer().passthrough
+    assert app.TextNormalizer(bom="preserve").passthrough
+    assert not app.TextNormalizer(eol="lf").passthrough
+    assert not app.TextNormalizer(bom="strip").passthrough
+    assert not app.TextNormalizer(trim_trailing=True).passthrough
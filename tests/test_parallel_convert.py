@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""大文件分块并行简繁转换：切分边界不能拆开词组，结果与串行转换一致"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import encoding_gui_4 as app  # noqa: E402
+
+pytest.importorskip("opencc")
+
+PHRASE = "菲利克斯．米达麦亚"  # STPhrases 中含分隔符“．”的词条
+CHUNK_CHARS = 1000
+
+
+def make_text(repeat=6):
+    """没有换行的文本，第一个块的目标切分位置正好落在词条的“．”上"""
+    filler = "计算机软件的发展，" * (CHUNK_CHARS // 9 + 1)
+    head = filler[:CHUNK_CHARS - PHRASE.index("．")]
+    block = head + PHRASE + filler[:CHUNK_CHARS - len(head) - len(PHRASE)]
+    return block * repeat
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    # 内置 Trie 引擎把编译后的词典写入缓存目录，子进程继承环境变量
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    monkeypatch.setenv("LOCALAPPDATA", str(tmp_path))
+    return tmp_path
+
+
+def test_boundary_excludes_dictionary_separators():
+    pattern = app.chunk_boundary_pattern("s2t")
+    assert pattern is not None
+    assert not pattern.search("．")
+    assert pattern.search("，")
+
+
+def test_split_keeps_phrase_on_chunk_boundary():
+    text = make_text()
+    chunks = app.split_text_chunks(text, CHUNK_CHARS, app.chunk_boundary_pattern("s2t"))
+    assert len(chunks) > 1
+    assert "".join(chunks) == text
+    assert sum(chunk.count(PHRASE) for chunk in chunks) == text.count(PHRASE)
+
+
+@pytest.mark.parametrize("backend", ["opencc", "trie"])
+def test_parallel_matches_serial(backend, cache_dir):
+    text = make_text()
+    converter = app.create_converter(backend, "s2t")
+    parallel = app.ParallelConverter(max_workers=2, min_chars=0, chunk_chars=CHUNK_CHARS)
+    try:
+        assert parallel.convert(backend, "s2t", text, converter) == converter.convert(text)
+    finally:
+        parallel.shutdown()
+    assert "菲利克斯．米達麥亞" in converter.convert(text)
+
+
+def test_pool_uses_spawn():
+    # 进程池在多线程的进程中创建，不能 fork
+    parallel = app.ParallelConverter(max_workers=2)
+    try:
+        assert parallel._get_pool()._mp_context.get_start_method() == "spawn"
+    finally:
+        parallel.shutdown()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""扫描计划：保存、读取后加载与扫描结果相同，保留排除的文件、单独设置的处理策略和重复内容"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import encoding_gui_4 as app  # noqa: E402
+
+pytest.importorskip("chardet")
+
+TEXT = "计算机软件的发展非常迅速，简体中文的文件通常使用同一种编码。\n"
+
+
+def make_tree(root):
+    files = {
+        "z.txt": (TEXT * 2).encode("gbk"),
+        # 扫描时先遇到上层目录的 z.txt，按路径排序时子目录中内容相同的文件在前面
+        os.path.join("a", "dup.txt"): (TEXT * 2).encode("gbk"),
+        os.path.join("b", "dup.txt"): (TEXT * 2).encode("gbk"),
+        os.path.join("a", "excluded.txt"): TEXT.encode("gbk"),
+        os.path.join("a", "lossy.txt"): "繁體 ♥ 中文\n".encode("utf-8"),
+        "utf8.md": TEXT.encode("utf-8"),
+        "image.png": b"\x89PNG\r\n\x1a\n" + bytes(64),
+    }
+    for relpath, data in files.items():
+        path = root / relpath
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(data)
+    return files
+
+
+def outputs(root):
+    result = {}
+    for dirpath, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(dirpath, name)
+            with open(path, "rb") as f:
+                result[os.path.relpath(path, root)] = f.read()
+    return result
+
+
+def test_plan_round_trip(tmp_path):
+    source = tmp_path / "in"
+    make_tree(source)
+    session = app.BatchSession(str(source), str(tmp_path / "scanned"), output_encoding="简体GBK")
+    session.run(scan_only=True)
+    excluded = str(source / "a" / "excluded.txt")
+    lossy = str(source / "a" / "lossy.txt")
+    session.excluded_files.add(excluded)
+    session.error_policies[lossy] = "replace"
+    assert session.duplicate_of == {str(source / "a" / "dup.txt"): str(source / "z.txt"),
+                                    str(source / "b" / "dup.txt"): str(source / "z.txt")}
+
+    plan_path = str(tmp_path / "in.plan.jsonl")
+    app.write_jsonl(plan_path, session.plan_header(), session.plan_records())
+    header, records = app.read_plan(plan_path)
+    loaded = app.BatchSession("", "")
+    loaded.apply_plan(header, records)
+
+    assert loaded.plan_header() == session.plan_header()
+    assert loaded.plan_records() == session.plan_records()
+    assert [record.get("duplicate_of") for record in session.plan_records() if record["path"].endswith("dup.txt")
+            or record["path"] == "z.txt"] == [None, "a/dup.txt", "a/dup.txt"]
+    assert loaded.excluded_files == {excluded}
+    assert loaded.error_policies == {lossy: "replace"}
+    # 计划中的重复内容指向按路径排序的第一个文件，加载后它作为原文件（处理时排在前面）
+    first = str(source / "a" / "dup.txt")
+    assert loaded.duplicate_of == {str(source / "b" / "dup.txt"): first, str(source / "z.txt"): first}
+
+    # 加载计划后处理的输出与扫描后直接处理相同
+    session._process_files_thread()
+    loaded.output_path.set(str(tmp_path / "loaded"))
+    loaded._process_files_thread()
+    assert loaded.process_result["counts"] == session.process_result["counts"]
+    scanned = outputs(tmp_path / "scanned")
+    assert outputs(tmp_path / "loaded") == scanned
+    assert scanned[os.path.join("a", "excluded.txt")] == TEXT.encode("gbk")
+
+
+def test_read_plan_rejects_other_files(tmp_path):
+    path = tmp_path / "other.jsonl"
+    path.write_text('{"format": "something-else", "version": 1}\n', encoding="utf-8")
+    with pytest.raises(ValueError):
+        app.read_plan(str(path))
+    path.write_text('{"format": "%s", "version": 99}\n' % app.PLAN_FORMAT, encoding="utf-8")
+    with pytest.raises(ValueError, match="版本"):
+        app.read_plan(str(path))
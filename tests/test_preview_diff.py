@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""预览差异：换行数量改变时原文和转换结果按行对齐，高亮原文中可见的行时使用对应的转换后行号"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import encoding_gui_4 as app  # noqa: E402
+
+BEFORE = "\n".join(["头发", "第一行", "", "", "后来", "干燥", "皇后", "结束"])
+# 转换时去掉了两个空行，之后的行号比原文少 2
+AFTER = "\n".join(["頭髮", "第一行", "后来", "干燥", "皇后", "结束"])
+
+
+def test_after_line_range():
+    diff = app.PreviewDiff(BEFORE, AFTER, "utf-8")
+    assert [diff.before_line_index(line) for line in range(diff.line_count)] == [0, 1, 4, 5, 6, 7]
+    assert diff.after_line_range(4, 8) == (2, 6)
+    assert diff.after_line_range(0, 2) == (0, 2)
+    assert diff.after_line_range(2, 4) == (0, 0)  # 删除的空行没有对应的行
+    assert diff.after_line_range(-1, 3) == (0, 2)
+
+
+def test_after_line_range_one_to_one():
+    diff = app.PreviewDiff("头发\n后来", "頭髮\n後來", "utf-8")
+    assert diff.after_line_range(0, 2) == (0, 2)
+
+
+class FakeText:
+    """只提供可见行计算所需接口的文本框：从 top 行开始显示 rows 行"""
+
+    def __init__(self, top, rows):
+        self.top = top
+        self.rows = rows
+
+    def winfo_height(self):
+        return self.rows * 10
+
+    def index(self, position):
+        y = int(position.split(",")[1])
+        return f"{self.top + y // 10}.0"
+
+
+class FakePreview:
+    highlight_visible_preview_lines = app.EncodingUnifierGUI.highlight_visible_preview_lines
+
+    def __init__(self, diff, before_text, after_text):
+        self.preview_diff = diff
+        self.before_text = before_text
+        self.after_text = after_text
+        self.ranges = []
+
+    def highlight_preview_lines(self, first, last):
+        self.ranges.append((first, last))
+
+
+def test_visible_before_lines_mapped_to_after_lines():
+    diff = app.PreviewDiff(BEFORE, AFTER, "utf-8")
+    # 原文滚动到第 5 行（“后来”）开始的 4 行，转换结果停在开头
+    preview = FakePreview(diff, FakeText(5, 3), FakeText(1, 2))
+    preview.highlight_visible_preview_lines()
+    before_range, after_range = preview.ranges
+    assert before_range == (2, 6)
+    assert [diff.before_lines[diff.before_line_index(line)] for line in range(*before_range)] == ["后来", "干燥", "皇后", "结束"]
+    assert after_range == (0, 3)
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""本地转换服务：拒绝没有令牌、来自浏览器网页或正文类型不对的请求，按文件转换限制在根目录下"""
+
+import http.client
+import json
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import encoding_gui_4 as app  # noqa: E402
+
+pytest.importorskip("chardet")
+
+
+@pytest.fixture
+def server(tmp_path):
+    root = tmp_path / "root"
+    (root / "in").mkdir(parents=True)
+    (root / "in" / "a.txt").write_bytes("计算机软件\n".encode("gbk"))
+    service = app.ConversionService("UTF-8(无BOM)", workers=1, root=str(root))
+    server = app.create_service_server(service)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        yield service, server.server_address[1], root
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+        service.close()
+
+
+def post(port, path, body, headers):
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    try:
+        connection.request("POST", path, body, headers)
+        response = connection.getresponse()
+        return response.status, json.loads(response.read() or b"null")
+    finally:
+        connection.close()
+
+
+def convert_file_body(root, output):
+    return json.dumps({"input": str(root / "in" / "a.txt"), "output": str(output)})
+
+
+def test_rejects_simple_cross_site_request(server, tmp_path):
+    service, port, root = server
+    output = tmp_path / "pwned" / "x.txt"
+    status, _ = post(port, "/convert-file", convert_file_body(root, output), {"Content-Type": "text/plain"})
+    assert status == 401
+    assert not output.parent.exists()
+
+
+def test_rejects_origin_even_with_token(server):
+    service, port, root = server
+    headers = {"Content-Type": "application/json", "Origin": "http://example.com",
+               app.SERVICE_TOKEN_HEADER: service.token}
+    status, _ = post(port, "/convert-file", convert_file_body(root, root / "out" / "a.txt"), headers)
+    assert status == 403
+    assert not (root / "out").exists()
+
+
+def test_rejects_wrong_content_type(server):
+    service, port, root = server
+    headers = {"Content-Type": "text/plain", app.SERVICE_TOKEN_HEADER: service.token}
+    status, _ = post(port, "/convert-file", convert_file_body(root, root / "out" / "a.txt"), headers)
+    assert status == 415
+    status, _ = post(port, "/convert", "软件".encode("gbk"), headers)
+    assert status == 415
+
+
+def test_convert_file_inside_root(server, tmp_path):
+    service, port, root = server
+    headers = {"Content-Type": "application/json", app.SERVICE_TOKEN_HEADER: service.token}
+    status, result = post(port, "/convert-file", convert_file_body(root, root / "out" / "a.txt"), headers)
+    assert status == 200, result
+    assert (root / "out" / "a.txt").read_bytes() == "计算机软件\n".encode("utf-8")
+
+    outside = tmp_path / "outside" / "a.txt"
+    status, _ = post(port, "/convert-file", convert_file_body(root, outside), headers)
+    assert status == 400
+    assert not outside.parent.exists()
+
+    # 批量请求中的按文件转换同样受根目录限制
+    body = json.dumps({"requests": [{"op": "convert-file", "input": str(root / "in" / "a.txt"),
+                                     "output": str(outside)}]})
+    status, result = post(port, "/batch", body, headers)
+    assert status == 200 and "error" in result["results"][0]
+    assert not outside.parent.exists()
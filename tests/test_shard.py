@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""分片执行：每个文件恰好属于一个分片，合并报告时检查分片齐全且不重复"""
+
+import json
+import os
+import shutil
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import encoding_gui_4 as app  # noqa: E402
+
+TEXT = "计算机软件的发展非常迅速，简体中文的文件通常使用同一种编码。\n"
+PATHS = [f"{top}/{sub}/{name}" for top in ("src", "doc", "中文目录", "a b")
+         for sub in ("x", "y", "深层/目录")
+         for name in ("main.c", "说明.txt", "README", ".hidden", "a" * 40)] + ["top.txt", "顶层.md"]
+
+
+@pytest.mark.parametrize("by", list(app.SHARD_MODES))
+@pytest.mark.parametrize("count", [1, 2, 3, 7, 16])
+def test_owns_partitions_every_path_once(by, count):
+    shards = [app.Shard(index, count, by) for index in range(1, count + 1)]
+    owners = {path: [shard.index for shard in shards if shard.owns(path)] for path in PATHS}
+    assert all(len(indexes) == 1 for indexes in owners.values()), owners
+    if by == "dir":
+        # 同一目录的文件在同一分片
+        by_dir = {}
+        for path, (index,) in owners.items():
+            by_dir.setdefault(path.rpartition("/")[0], set()).add(index)
+        assert all(len(indexes) == 1 for indexes in by_dir.values())
+
+
+def test_owns_uses_forward_slashes():
+    shard = app.Shard(2, 5)
+    assert shard.owns(os.path.join("src", "x", "main.c")) == shard.owns("src/x/main.c")
+
+
+@pytest.mark.parametrize("text", ["0/3", "4/3", "1/0", "1", "a/b"])
+def test_parse_rejects_invalid(text):
+    with pytest.raises(ValueError):
+        app.Shard.parse(text)
+
+
+@pytest.fixture
+def reports(tmp_path):
+    """三个分片分别处理同一输入目录并写入报告，同时返回不分片时的统计"""
+    pytest.importorskip("chardet")
+    source = tmp_path / "in"
+    for i, path in enumerate(PATHS):
+        target = source / path.replace("/", os.sep)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes((TEXT * (i % 4 + 1)).encode("gbk" if i % 2 else "utf-8"))
+    report_dir = tmp_path / "reports"
+    for index in (1, 2, 3):
+        session = app.BatchSession(str(source), str(tmp_path / "out"), shard=app.Shard(index, 3))
+        session.run()
+        session.write_report(str(report_dir))
+    full = app.BatchSession(str(source), str(tmp_path / "full"))
+    return report_dir, full.run()
+
+
+def test_merge_matches_unsharded(reports, tmp_path):
+    report_dir, (full_scan, full_process) = reports
+    merged_path = tmp_path / "merged.jsonl"
+    scan, process = app.merge_shard_reports(str(report_dir), str(merged_path))
+    assert scan["encoding_files"] + scan["copy_files"] == len(PATHS)
+    assert scan["encoding_counts"] == full_scan["encoding_counts"]
+    assert process["counts"] == full_process["counts"]
+    with open(merged_path, encoding="utf-8") as f:
+        f.readline()
+        paths = [json.loads(line)["path"] for line in f]
+    assert sorted(paths) == sorted(PATHS)
+
+
+def test_merge_rejects_missing_shard(reports):
+    report_dir, _ = reports
+    os.remove(app.shard_report_path(str(report_dir), app.Shard(2, 3)))
+    with pytest.raises(ValueError, match=r"缺少 \[2\]"):
+        app.merge_shard_reports(str(report_dir))
+
+
+def test_merge_rejects_duplicate_shard(reports):
+    report_dir, _ = reports
+    # 同一分片运行了两次（例如重试后另存的报告）
+    shutil.copy(app.shard_report_path(str(report_dir), app.Shard(1, 3)),
+                report_dir / "shard-00001-of-00003-retry.jsonl")
+    with pytest.raises(ValueError, match=r"重复 \[1\]"):
+        app.merge_shard_reports(str(report_dir))
+
+
+def test_merge_rejects_different_settings(reports, tmp_path):
+    report_dir, _ = reports
+    path = app.shard_report_path(str(report_dir), app.Shard(3, 3))
+    with open(path, encoding="utf-8") as f:
+        header, rows = json.loads(f.readline()), f.read()
+    header["settings"]["output_encoding"] = "UTF-8(无BOM)"
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(header, ensure_ascii=False) + "\n" + rows)
+    with pytest.raises(ValueError, match="设置"):
+        app.merge_shard_reports(str(report_dir))
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""内容嗅探：压缩文件和 NUL 很多的数据按二进制跳过，没有 BOM 的 UTF-16/32 文本不当作二进制"""
+
+import gzip
+import os
+import struct
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import encoding_gui_4 as app  # noqa: E402
+
+TEXT = "计算机软件的发展非常迅速 (version 1.2)，简体中文的文件通常使用同一种编码。\r\nprint('hello')\n"
+
+
+def head(data):
+    return data[:app.SNIFF_BYTES]
+
+
+def test_gzip():
+    data = gzip.compress((TEXT * 100).encode("utf-8"))
+    assert app.sniff_content(head(data)) == ("binary", "gzip")
+
+
+@pytest.mark.parametrize("data", [
+    bytes(4096),
+    # 小整数组成的二进制记录：NUL 很多，但不在 UTF-16/32 高位字节的固定位置
+    b"".join(struct.pack("<IHBB", i * 7919 % 65536, i % 300, i % 3, 0) for i in range(1000)),
+    b"".join(struct.pack("<dI", i / 3, i) for i in range(500)),
+])
+def test_nul_dense_binary(data):
+    assert app.sniff_content(head(data)) == ("binary", "NUL")
+
+
+@pytest.mark.parametrize("encoding", ["utf-16-le", "utf-16-be", "utf-32-le", "utf-32-be"])
+def test_unicode_without_bom(encoding):
+    data = (TEXT * 200).encode(encoding)
+    assert app.sniff_content(head(data)) == ("text", encoding)
+    # 截断在字符中间的开头（SNIFF_BYTES 不是字符宽度的整数倍时）同样能识别
+    assert app.sniff_content(data[:app.SNIFF_BYTES - 1]) == ("text", encoding)
+
+
+@pytest.mark.parametrize("encoding", ["utf-16-le", "utf-16-be", "utf-32-le", "utf-32-be"])
+def test_unicode_with_bom(encoding):
+    data = "\ufeff".encode(encoding) + (TEXT * 200).encode(encoding)
+    assert app.sniff_content(head(data)) == ("text", encoding)
+
+
+def test_utf16le_without_bom_detected_as_utf16():
+    # 嗅探结果直接用于检测，不交给 chardet 和试解码
+    pytest.importorskip("chardet")
+    session = app.BatchSession("", "")
+    data = (TEXT * 200).encode("utf-16-le")
+    result = session.detect_file_encoding("a.txt", data, sniffed=app.sniff_content(head(data)))
+    assert result["best_encoding"] == "utf-16-le"
+    assert result["has_chinese"]
+
+
+@pytest.mark.parametrize("data", [
+    (TEXT * 200).encode("utf-8"),
+    (TEXT * 200).encode("gbk"),
+    "繁體中文\f分頁\x1b[0m\n".encode("big5") * 100,
+    b"",
+])
+def test_ordinary_text(data):
+    assert app.sniff_content(head(data)) == ("text", None)
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""内置 Trie 简繁转换引擎与 OpenCC 的转换结果一致"""
+
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import encoding_gui_4 as app  # noqa: E402
+
+opencc = pytest.importorskip("opencc")
+
+SENTENCES = [
+    "计算机软件的发展非常迅速，简体中文转换为繁体中文时需要处理词组，例如头发、发展、干燥、干部、后来、皇后、里面、公里。",
+    "計算機軟件的發展非常迅速，繁體中文轉換為簡體中文時需要處理詞組，例如頭髮、發展、乾燥、幹部、後來、皇后、裡面、公里。",
+    "菲利克斯．米达麦亚与乔治．布希 mixed ASCII text 123\r\n“引号”《书名》（括号）——破折号……",
+    "",
+]
+
+
+def make_corpus(config, count=8000):
+    """固定的测试文本：常用句子加上词典词条、词条片段和转换结果，覆盖词条重叠和最长匹配"""
+    rng = random.Random(2025)
+    keys, values = [], []
+    for group in app.opencc_dictionary_files(config):
+        for source in group:
+            mapping = app.read_opencc_dictionary(source)
+            keys.extend(mapping)
+            values.extend(mapping.values())
+    separators = ["\n", "\r\n", "，", " ", "-", "．", "abc", ""]
+    parts = list(SENTENCES)
+    for _ in range(count):
+        choice = rng.random()
+        key = rng.choice(keys)
+        if choice < 0.5:
+            parts.append(key)
+        elif choice < 0.7:
+            parts.append(key[rng.randrange(len(key)):])
+        else:
+            parts.append(rng.choice(values))
+        parts.append(rng.choice(separators))
+    return "".join(parts)
+
+
+@pytest.mark.parametrize("config", ["s2t", "t2s"])
+def test_trie_matches_opencc(config, tmp_path):
+    text = make_corpus(config)
+    expected = opencc.OpenCC(config).convert(text)
+    # 第一次编译词典写入缓存，第二次从缓存加载（内存映射），结果都要与 OpenCC 相同
+    assert app.TrieConverter(config, cache_dir=str(tmp_path)).convert(text) == expected
+    assert app.TrieConverter(config, cache_dir=str(tmp_path)).convert(text) == expected
+
+
+@pytest.mark.parametrize("config", ["s2t", "t2s"])
+def test_trie_matches_opencc_per_sentence(config, tmp_path):
+    converter = app.TrieConverter(config, cache_dir=str(tmp_path))
+    reference = opencc.OpenCC(config)
+    for sentence in SENTENCES:
+        assert converter.convert(sentence) == reference.convert(sentence)
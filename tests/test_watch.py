@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""监视模式：按合成的事件处理新建、删除和目录移动，输出目录与重新完整处理的结果相同"""
+
+import os
+import shutil
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import encoding_gui_4 as app  # noqa: E402
+
+pytest.importorskip("chardet")
+
+TEXT = "计算机软件的发展非常迅速，简体中文的文件通常使用同一种编码。\n"
+
+
+def tree(root):
+    result = {}
+    for dirpath, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(dirpath, name)
+            with open(path, "rb") as f:
+                result[os.path.relpath(path, root)] = f.read()
+    return result
+
+
+def directories(root):
+    return {os.path.relpath(dirpath, root) for dirpath, _, _ in os.walk(root)}
+
+
+@pytest.fixture
+def session(tmp_path):
+    source = tmp_path / "in"
+    for relpath, data in {
+        "a.txt": TEXT.encode("gbk"),
+        os.path.join("src", "main.c"): ("/* " + TEXT + " */").encode("gbk"),
+        os.path.join("src", "lib", "util.h"): ("// " + TEXT).encode("utf-8"),
+        os.path.join("src", "lib", "logo.bin"): bytes(range(256)),
+    }.items():
+        path = source / relpath
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+    session = app.WatchSession(str(source), str(tmp_path / "out"), polling=True)
+    session.start_watch()
+    session.run()
+    yield session
+    session.watcher.close()
+
+
+def full_output(session, tmp_path):
+    """重新完整处理一次的输出"""
+    app.BatchSession(session.input_path.get(), str(tmp_path / "full")).run()
+    return tree(tmp_path / "full")
+
+
+def test_create(session, tmp_path):
+    source = tmp_path / "in"
+    (source / "new.txt").write_bytes(TEXT.encode("big5", "replace"))
+    (source / "src" / "新建").mkdir()
+    (source / "src" / "新建" / "b.txt").write_bytes(TEXT.encode("gb18030"))
+    (source / "src" / "新建" / "data.bin").write_bytes(b"\x00\x01" * 10)
+
+    batch = session.handle_changes({str(source / "new.txt"), str(source / "src" / "新建")}, set())
+    assert (batch["files"], batch["removed"], batch["fail"]) == (3, 0, 0)
+    assert batch["convert"] + batch["copy"] == 3
+    assert tree(tmp_path / "out") == full_output(session, tmp_path)
+    assert session.status["files"] == 7
+
+
+def test_delete(session, tmp_path):
+    source = tmp_path / "in"
+    os.remove(source / "a.txt")
+    shutil.rmtree(source / "src" / "lib")
+
+    # 删除目录时只收到目录本身的事件，目录中的文件由输出目录和已记录的文件推断
+    batch = session.handle_changes(set(), {str(source / "a.txt"), str(source / "src" / "lib")})
+    assert (batch["files"], batch["removed"]) == (0, 3)
+    assert tree(tmp_path / "out") == full_output(session, tmp_path)
+    assert directories(tmp_path / "out") == {".", "src"}
+    assert set(session.encoding_results.keys()) == {str(source / "src" / "main.c")}
+    assert not session.copy_files
+
+
+def test_move_directory(session, tmp_path):
+    source = tmp_path / "in"
+    os.rename(source / "src" / "lib", source / "lib2")
+
+    # 目录移动：原位置收到 IN_MOVED_FROM（不存在），新位置收到 IN_MOVED_TO（目录）
+    batch = session.handle_changes({str(source / "lib2")}, {str(source / "src" / "lib")})
+    assert (batch["files"], batch["removed"], batch["fail"]) == (2, 2, 0)
+    assert tree(tmp_path / "out") == full_output(session, tmp_path)
+    assert not (tmp_path / "out" / "src" / "lib").exists()
+    assert session.status["totals"]["removed"] == 2
+
+
+def test_modify_then_delete_in_one_batch(session, tmp_path):
+    source = tmp_path / "in"
+    (source / "a.txt").write_bytes((TEXT * 2).encode("gbk"))
+    (source / "src" / "main.c").unlink()
+    batch = session.handle_changes({str(source / "a.txt")}, {str(source / "src" / "main.c")})
+    assert (batch["files"], batch["removed"]) == (1, 1)
+    assert tree(tmp_path / "out") == full_output(session, tmp_path)
+
+
+class FakeWatcher:
+    """按预先给定的批次返回事件的监视器"""
+
+    def __init__(self, batches):
+        self.batches = list(batches)
+
+    def poll(self, timeout):
+        return self.batches.pop(0) if self.batches else []
+
+
+def test_collect_merges_events_for_the_same_path():
+    watcher = FakeWatcher([[("a", True), ("b", True)], [("a", False)], [("c", False), ("c", True)]])
+    changed, removed, _ = app.collect_watch_events(watcher, debounce=0.01, max_delay=1)
+    assert (changed, removed) == ({"b", "c"}, {"a"})
+    assert app.collect_watch_events(FakeWatcher([]), debounce=0.01, timeout=0.05) is None